@@ -1,35 +1,59 @@
 # -*- coding: utf-8 -*-
 
-import tarfile
-import zipfile
 import io
 import os
-import shutil
-import collections
-import bisect
-import abc
-import fnmatch
 import sys
+import bisect
+import importlib
 
-import decoutils
-
-if sys.version_info[0] == 2: #pragma no cover
-    import __builtin__ as builtins
-else: #pragma no cover
-    import builtins
+from ._compat import builtins, _path_classes
+from .plugins import (EngineDescriptor, _Probe, _resolve, iter_entry_points,
+                      _is_buffer_archive, _tar_header_ok)
     
 __version__ = '0.1.0'
 
 _auto_engine = []
 
-if sys.version_info[0] >= 3 and sys.version_info[1] >= 6: #pragma no cover
-    _path_classes = (str, bytes, os.PathLike)
-else: #pragma no cover
-    _path_classes = (str, bytes)
-
-
-@decoutils.decorator_with_args
-def register_auto_engine(func, priority=50, prepend=False):
+# Public names defined in submodules. They are imported on first
+# access, so that `import arlib` does not import tarfile, zipfile etc.
+_lazy_attributes = {
+    'Archive': 'archive',
+    'TarArchive': 'tar',
+    'ZipArchive': 'zip',
+    'DirArchive': 'directory',
+    'IndexedReader': 'seekable',
+    'BlockCache': 'cache',
+    'get_block_cache': 'cache',
+    'set_block_cache': 'cache',
+    'MemberTable': 'table',
+    'HTTPRangeFile': 'remote',
+    'BufferArchive': 'buffer',
+    'HandleCache': 'handles',
+    'get_handle_cache': 'handles',
+    'set_handle_cache': 'handles',
+}
+
+
+def __getattr__(name):
+    module = _lazy_attributes.get(name)
+    if module is None:
+        raise AttributeError("module 'arlib' has no attribute "+repr(name))
+    value = getattr(importlib.import_module('.'+module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attributes))
+
+
+if sys.version_info[:2] < (3, 7): #pragma no cover
+    # module __getattr__ is not supported, import everything eagerly
+    for _name in list(_lazy_attributes):
+        __getattr__(_name)
+
+
+def register_auto_engine(func=None, priority=50, prepend=False):
     """Register automatic engine determing function
     
     Two possible signatures:
@@ -63,48 +87,196 @@ def register_auto_engine(func, priority=50, prepend=False):
       arguments). The second version will return a decorator wrap.
 
     """
+    if func is None:
+        return lambda func: register_auto_engine(func, priority, prepend)
     p = [x[0] for x in _auto_engine]
     if prepend: #pragma no cover
         i = bisect.bisect_left(p, priority)
     else:
         i = bisect.bisect_right(p, priority)
     _auto_engine.insert(i, (priority, func))
+    return func
+
+
+def register_engine(descriptor, priority=None, prepend=False):
+    """Register an engine by its descriptor
+
+    Unlike functions registered by :func:`register_auto_engine`, which
+    are called on every :func:`auto_engine` call, the determination
+    function of a descriptor is only called if the magic numbers,
+    extensions, modes etc. declared by the descriptor match.
+
+    Args:
+
+      descriptor (EngineDescriptor): Descriptor of the engine.
+
+      priority (int, float, NoneType): Priority, see
+        :func:`register_auto_engine`. Default to the priority of the
+        descriptor.
+
+      prepend (bool): See :func:`register_auto_engine`.
+
+    Return:
+
+      EngineDescriptor: The input descriptor.
+    """
+    if priority is None:
+        priority = descriptor.priority
+    return register_auto_engine(descriptor, priority, prepend)
+
+
+def engine_descriptors():
+    """Get the registered engine descriptors, including plugins
+
+    Return:
+
+      list[EngineDescriptor]: Descriptors in the order they are tried
+      by :func:`auto_engine`.
+    """
+    load_plugins()
+    return [x for _, x in _auto_engine if isinstance(x, EngineDescriptor)]
+
+
+_plugins_loaded = False
+
+def load_plugins(force=False):
+    """Register the engines published in the :code:`arlib.engines`
+    entry point group
+
+    Entry points should refer to an :class:`EngineDescriptor` (or to
+    an engine determination function, which is registered by
+    :func:`register_auto_engine`). It is called automatically by the
+    first :func:`auto_engine` call.
+
+    Args:
+
+      force (bool): Load the entry points again even if they have been
+        loaded already.
+    """
+    global _plugins_loaded
+    if _plugins_loaded and not force:
+        return
+    _plugins_loaded = True
+    registered = [x for _, x in _auto_engine]
+    for name, target in iter_entry_points():
+        try:
+            obj = _resolve(target)
+        except Exception as e:
+            import warnings
+            warnings.warn('Cannot load arlib engine plugin '+name+': '
+                          +str(e))
+            continue
+        if any(obj is x for x in registered):
+            continue
+        if isinstance(obj, EngineDescriptor):
+            register_engine(obj)
+        else:
+            register_auto_engine(obj)
+
+
+def _read_head_tail(path, head, tail):
+    # Return the first `head` and the last `tail` bytes of a path or a
+    # seekable binary file object, leaving the position unchanged.
+    if isinstance(path, _path_classes):
+        with builtins.open(path, 'rb') as f:
+            return _read_head_tail(f, head, tail)
+    pos = path.tell()
+    try:
+        path.seek(0)
+        first = path.read(head)
+        size = path.seek(0, os.SEEK_END)
+        path.seek(max(0, size-tail))
+        last = path.read(tail)
+    finally:
+        path.seek(pos)
+    return first, last
+
+
+def _maybe_tar(path):
+    """Check magic numbers of a tar file without importing :mod:`tarfile`
+    """
+    block, _ = _read_head_tail(path, 512, 0)
+    if (block[:2] == b'\x1f\x8b' or block[:3] == b'BZh' or
+        block[:6] == b'\xfd7zXZ\x00'):
+        return True
+    return _tar_header_ok(block)
+
+
+def _maybe_zip(path):
+    """Check magic numbers of a zip file without importing :mod:`zipfile`
+    """
+    # the end of central directory record is in the last 64 KiB
+    first, last = _read_head_tail(path, 4, 65557)
+    return first == b'PK\x03\x04' or b'PK\x05\x06' in last
+
+
+def _loaded_instance(path, module, cls):
+    # Check isinstance without importing the module: an instance can
+    # only exist if the module has been imported already.
+    module = sys.modules.get(module)
+    return module is not None and isinstance(path, getattr(module, cls))
+
+
+def _name_matches(path, suffixes):
+    if not isinstance(path, _path_classes):
+        return False
+    path = os.fsdecode(path)
+    return any(path.endswith(x) for x in suffixes)
 
 
-@register_auto_engine
 def auto_engine_tar(path, mode):
     if 'r' in mode:
-        if isinstance(path, tarfile.TarFile):
+        if _loaded_instance(path, 'tarfile', 'TarFile'):
             if path.mode != 'r':
                 raise ValueError('Mode of TarFile object is not compatible'
                                  ' with the mode argument.')
+            from .tar import TarArchive
+            return TarArchive
+
+        if (isinstance(path, io.IOBase) and path.readable() and
+            path.seekable() and _maybe_tar(path)):
+            import tarfile
+            pos = path.tell()
+            try:
+                tarfile.open(fileobj=path, mode='r').close()
+            except tarfile.TarError:
+                return None
+            finally:
+                path.seek(pos)
+            from .tar import TarArchive
             return TarArchive
         
         if isinstance(path, _path_classes):
             path = os.path.abspath(path)
-            if os.path.isfile(path) and tarfile.is_tarfile(path):
-                return TarArchive
+            if os.path.isfile(path) and _maybe_tar(path):
+                import tarfile
+                if tarfile.is_tarfile(path):
+                    from .tar import TarArchive
+                    return TarArchive
     else:
-        if isinstance(path, tarfile.TarFile): #pragma no cover
+        if _loaded_instance(path, 'tarfile', 'TarFile'): #pragma no cover
             if path.mode not in ['a', 'w', 'x']:
                 raise ValueError('Mode of TarFile object is not compatible'
                                  ' with the mode argument.')
+            from .tar import TarArchive
             return TarArchive
         
-        if isinstance(path, _path_classes):
-            if any(fnmatch.fnmatch(path, x) for x in
-                   ['*.tar', '*.tgz', '*.tar.gz', '*.tar.bz2', '*.tar.xz']):
-                return TarArchive
+        # compression suffixes of the mode, e.g. 'w|gz', are tarfile's
+        if (_name_matches(path, ['.tar', '.tgz', '.tar.gz', '.tar.bz2',
+                                 '.tar.xz']) or len(mode) > 1 and
+            mode[1] in ':|'):
+            from .tar import TarArchive
+            return TarArchive
     return None
     
 
-@register_auto_engine
 def auto_engine_zip(path, mode):
     if 'r' in mode:
-        if isinstance(path, zipfile.ZipFile):
+        if _loaded_instance(path, 'zipfile', 'ZipFile'):
             if path.mode != 'r':
                 raise ValueError('Mode of ZipFile object is not compatible'
                                  ' with the mode argument.')
+            from .zip import ZipArchive
             return ZipArchive
 
         if (sys.version_info[0] >= 3 and sys.version_info[1] >= 1 and
@@ -114,33 +286,71 @@ def auto_engine_zip(path, mode):
             if not path.readable():
                 raise ValueError('Opened file is not readable, but the mode'
                                  'argument is '+mode)
-            if zipfile.is_zipfile(path):
-                return ZipArchive
+            if path.seekable() and _maybe_zip(path):
+                import zipfile
+                if zipfile.is_zipfile(path):
+                    from .zip import ZipArchive
+                    return ZipArchive
             
         if isinstance(path, _path_classes):
-            if os.path.isfile(path) and zipfile.is_zipfile(path):
-                return ZipArchive
+            if os.path.isfile(path) and _maybe_zip(path):
+                import zipfile
+                if zipfile.is_zipfile(path):
+                    from .zip import ZipArchive
+                    return ZipArchive
     else:
-        if isinstance(path, zipfile.ZipFile):
+        if _loaded_instance(path, 'zipfile', 'ZipFile'):
             if path.mode not in ['a', 'w', 'x']:
                 raise ValueError('Mode of ZipFile object is not compatible'
                                  ' with the mode argument.')
+            from .zip import ZipArchive
             return ZipArchive
             
-        if isinstance(path, _path_classes):
-            if fnmatch.fnmatch(path, '*.zip'):
-                return ZipArchive
+        if _name_matches(path, ['.zip']):
+            from .zip import ZipArchive
+            return ZipArchive
+    return None
+
+
+def auto_engine_buffer(path, mode):
+    if 'r' in mode and _is_buffer_archive(path):
+        from .buffer import BufferArchive
+        return BufferArchive
     return None
 
 
-@register_auto_engine
 def auto_engine_dir(path, mode):
     if 'r' in mode:
         if isinstance(path, _path_classes):
             if os.path.isdir(path):
+                from .directory import DirArchive
                 return DirArchive
     return None
 
+
+register_engine(EngineDescriptor(
+    'tar', 'arlib.tar:TarArchive', detect=auto_engine_tar,
+    magic=[b'\x1f\x8b', b'BZh', b'\xfd7zXZ\x00', (257, b'ustar')],
+    sniff=_tar_header_ok,
+    extensions=['.tar', '.tgz', '.tar.gz', '.tar.bz2', '.tar.xz'],
+    modes='rwax', object_types=['tarfile:TarFile'], streaming=True,
+    random_access=False, mode_suffixes=True))
+
+register_engine(EngineDescriptor(
+    'zip', 'arlib.zip:ZipArchive', detect=auto_engine_zip,
+    magic=[b'PK\x03\x04'], tail_magic=[b'PK\x05\x06'],
+    extensions=['.zip'], modes='rwax', object_types=['zipfile:ZipFile']))
+
+register_engine(EngineDescriptor(
+    'dir', 'arlib.directory:DirArchive', detect=auto_engine_dir,
+    directory=True))
+
+register_engine(EngineDescriptor(
+    'buffer', 'arlib.buffer:BufferArchive', detect=auto_engine_buffer,
+    object_types=['builtins:bytes', 'builtins:bytearray',
+                  'builtins:memoryview', 'mmap:mmap']))
+
+
 def auto_engine(path, mode='r'):
     """Automatically determine engine type from file properties and file
     mode using the registered determining functions
@@ -162,7 +372,13 @@ def auto_engine(path, mode='r'):
       :func:`is_archive`
 
     """
+    load_plugins()
+    probe = _Probe(path)
+    engine = None
     for _, func in _auto_engine:
+        if (isinstance(func, EngineDescriptor) and
+            not func.may_match(probe, mode)):
+            continue
         engine = func(path, mode)
         if engine is not None:
             break
@@ -233,15 +449,10 @@ def assert_is_archive(path, mode):
         raise ValueError(str(path)+' cannot be opened as a valid archive '
                          'with '+mode)
 
-if sys.version_info[0] > 2 and sys.version_info[1] > 3: # pragma no cover
-    base_cls = abc.ABC
-else: #pragma no cover
-    base_cls = object
-    
-class Archive(base_cls):
 
-    """Common-interface to different type of archive files manipulation
-    
+def open(path, mode='r', engine=None, *args, **kwargs):
+    """Open an archive file
+
     Args:
 
       path (path-like, file-like): Path of the archive to read or write
@@ -262,427 +473,191 @@ class Archive(base_cls):
         * None: Automatically determine engines by file properties and
           mode
 
+      trace (path-like): Path of a trace file recording the cost of
+        every member read, written when the archive is closed. Read
+        modes only, see :mod:`arlib.trace`.
+
       kwargs : Additional keyword arguments passed to the underlying
         engine constructor
 
     Note:
 
-      The constructor of a concrete engine should take at least one
-      positional argument `path` and one optional argument `mode` with
-      default value to `r`.
-
-    """
-    __metaclass__ = abc.ABCMeta
-
-    @property
-    @abc.abstractmethod
-    def member_names(self):
-        """Get list of names of the members (i.e. files contained in the
-        archive)
-
-        Return:
-
-          list[str]: list of member names
-        """
-        pass
-
-    @abc.abstractmethod
-    def open_member(self, name, mode='r', **kwargs):
-        """Open a member file contained in the archive
-
-        Args:
-
-          name (str): name of the member file to open
-
-          mode (str): The mode to open the member, same as in
-            :func:`open`. Default to 'r'.
-
-          kwargs: Additional keyword arguments that will be passed
-            to the underlying function.
-
-        Return:
-
-          file-like: A opened file object associated with the member
-          file
-
-        """
-        pass
-
-    def validate_member_name(self, name):
-        names = self.member_names
-        name.replace('\\', '/')
-        assert len(name) > 0
-        if name in names:
-            return name
-        elif name[-1] != '/' and name+'/' in names:
-            return name + '/'
-        else:
-            raise ValueError(name+' is not a valid member name.')
-        
-
-    def member_is_dir(self, name):
-        """Check if a specific member is a directory
-
-        Args:
-        
-          name (str): Member name.
-
-        Returns:
-
-        bool: True if the member is a directory, False otherwise.
-        """
-        name = self.validate_member_name(name)
-        return name.endswith('/')
-
-
-    def member_is_file(self, name):
-        """Check if a specific member is a regular file
-
-        Args:
-        
-          name (str): Member name.
-
-        Returns:
-
-        bool: True if the member is a regular file, False otherwise.
-
-        """
-        return not self.member_is_dir(name)
-
-
-    def extract(self, path=None, members=None): #pragma no cover
-        """Extract members to a location
-
-        Args:
-
-          path (path-like): Location of the extracted files.
-
-          members (Seq[str]): Members to extract, specified by a list
-            of names.
-
-        """
-        if path is None: #pragma no cover
-            path = '.'
-        if members is None:
-            members = self.member_names
-        else:
-            members = [self.validate_member_name(x) for x in members]
-        for name in members:
-            fname = os.path.join(path, name)
-            if self.member_is_dir(name):
-                if not os.path.isdir(fname):
-                    os.makedirs(fname)
-            else:
-                parent = os.path.dirname(fname)
-                if not os.path.isdir(parent):
-                    os.makedirs(parent)
-                with self.open_member(name, 'rb') as src, builtins.open(fname, 'wb') as dst:
-                    shutil.copyfileobj(src, dst)
+      If a :class:`~arlib.handles.HandleCache` is installed by
+      :func:`~arlib.handles.set_handle_cache`, archives opened for
+      reading by path are returned to the cache when closed, and
+      opening the same path again reuses the opened archive. Traced
+      archives are not cached.
     
-        
-    def close(self):
-        """Release resources such as closing files etc
-        """
-        pass
-
-    def __enter__(self):
-        """Context manager enter function
-
-        Return:
-
-          Archive: The archive object itself
-        """
-        return self
-
-    def __exit__(self, type, value, traceback):
-        """Context manager exit function
-
-        Call self.close() then return True
-        """
-        self.close()
-        
-        
-class TarArchive(Archive):
-    """Archive engine for *tar* files using the `tarfile` module
-
-    Args:
-
-      path (path-like): Path to the archive
-
-      mode (str): The mode to open the member, same as in
-        :func:`open`.
-
-      kwargs : Other keyword arguments that will be passed to the
-        underlying function.
-
     """
-    def __init__(self, path, mode='r', **kwargs):
-        self._need_close = True
-        if isinstance(path, tarfile.TarFile):
-            self._file = path
-            self._need_close = False
-        elif (isinstance(path, io.IOBase) or
-              sys.version_info[0] == 2 and isinstance(path, file)):
-            self._file = tarfile.open(fileobj=path, mode=mode, **kwargs)
-        else:
-            self._file = tarfile.open(name=path, mode=mode, **kwargs)
+    trace = kwargs.pop('trace', None)
+    if trace is not None:
+        from .trace import open_traced
+        return open_traced(path, mode, engine, trace, *args, **kwargs)
+    if mode == 'r' and not args and isinstance(path, _path_classes):
+        from .handles import get_handle_cache
+        cache = get_handle_cache()
+        if cache is not None:
+            key = cache.key(path, engine, kwargs)
+            if key is not None:
+                return cache.acquire(key, lambda: _open(path, mode, engine,
+                                                        **kwargs))
+    return _open(path, mode, engine, **kwargs)
+
+
+def _open(path, mode, engine, **kwargs):
+    if engine is None:
+        engine = auto_engine(path, mode)
+        if engine is None:
+            raise RuntimeError('Cannot automatically determine engine for '
+                               'path:', path, ' mode:', mode)
+    from .archive import Archive
+    assert issubclass(engine, Archive)
+    return engine(path, mode, **kwargs)
 
-    @property
-    def member_names(self):
-        names = self._file.getnames()
-        # normalize names so that name of members which are
-        # directories will be appended with a '/'
-        names = [x+'/' if self._file.getmember(x).isdir() else x
-                for x in names]
-        return names
 
+def _open_indexed(path, mode, engine, kwargs):
+    # Open an archive and parse its member index, in a worker thread
+    ar = open(path, mode, engine, **kwargs)
+    try:
+        ar.member_names
+    except BaseException:
+        ar.close()
+        raise
+    return ar
 
-    def open_member(self, name, mode='r'):
-        """Open member file contained in the tar archive
 
-        Args:
+def open_many(paths, mode='r', engine=None, workers=4, **kwargs):
+    """Open many archives in parallel
 
-          name (str): Name of the member to open
+    Engine determination, opening of the files and parsing of the
+    member indexes run in a thread pool, a few archives ahead of the
+    consumer. Combined with a :class:`~arlib.handles.HandleCache`,
+    the number of open files stays bounded and archives opened again
+    later are reused.
 
-          mode (str): The mode argument to open. Same as in :func:`open`.
+    Args:
 
-        Return:
+      paths (Iterable[path-like]): Paths of the archives.
 
-          file-like: The opened file object associated with the member
-          file.
+      mode (str): The mode to open the archives. Default to 'r'.
 
-        Note:
+      engine (type): Engine of the archives, determined for every
+        archive by :func:`auto_engine` if None.
 
-          Members of tar archive cannot be opened in write mode.
-        """
-        mode = mode.lower()
-        if 'r' not in mode: #pragma no cover
-            raise ValueError('members of tar archive can not be opened in'
-                             ' write mode')
-        if self.member_is_dir(name):
-            raise ValueError('directory member cannot be opened.')
-        
-        f = self._file.extractfile(name)
-        if 'b' not in mode:
-            if sys.version_info[0] >= 3:
-                f = io.TextIOWrapper(f)
-            else: #pragma no cover
-                raise ValueError('I do not know how to wrap binary file'
-                                 ' object to text io.')
-        return f
-
-
-    def extract(self, path=None, members=None):
-        """Extract members to a location
-
-        Args:
-
-          path (path-like): Location of the extracted files.
-
-          members (Seq[str]): Members to extract, specified by a list
-            of names.
-
-        """
-        if members is not None:
-            info = []
-            for name in members:
-                name = self.validate_member_name(name)
-                if name.endswith('/'):
-                    name = name[:-1]
-                info.append(self._file.getmember(name))
-            members = info
-        if path is None: #pragma no cover
-            path = '.'
-        self._file.extractall(path, members)
+      workers (int): Number of threads opening archives.
 
-    
-    def close(self):
-        if self._need_close:
-            self._file.close()
+      kwargs: Additional keyword arguments passed to the engine
+        constructor.
 
+    Return:
 
-class ZipArchive(Archive):
-    """Archive engine for *zip* files using the `zipfile` module
+      iterator: Iterator of the opened archives, in the order of
+      :code:`paths`. The consumer must close every archive.
     """
+    import collections
+    import concurrent.futures
+    workers = max(workers, 1)
+    paths = iter(paths)
+    pending = collections.deque()
+    pool = concurrent.futures.ThreadPoolExecutor(workers)
+    try:
+        for path in paths:
+            pending.append(pool.submit(_open_indexed, path, mode, engine,
+                                       kwargs))
+            if len(pending) > 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            if not future.cancel():
+                try:
+                    future.result().close()
+                except Exception:
+                    pass
+        pool.shutdown(wait=True)
+
+
+def convert(src, dst, engine=None, workers=2, max_bytes=64*1024*1024,
+            **kwargs):
+    """Convert an archive to another format
+
+    Members are streamed from :code:`src` to :code:`dst` without
+    extracting them to disk. Decompression of upcoming members and
+    compression of zip members run in a thread pool while members
+    are written in order; compressed tar files are decompressed in
+    archive order by a single thread. Zip members converted to a zip
+    file are copied without being decompressed when they already have
+    the compression requested for :code:`dst`.
 
-    def __init__(self, path, *args, **kwargs):
-        self._need_close = True
-        if isinstance(path, zipfile.ZipFile):
-            self._file = path
-            self._need_close = False
-        else:
-            self._file = zipfile.ZipFile(path, *args, **kwargs)
-
-    @property
-    def member_names(self):
-        names = self._file.namelist()
-        return names
-
-
-    def open_member(self, name, mode='r', **kwargs):
-        """Open a member file in the zip archive
-
-        Args:
-
-          name (str): Name of the member file
-
-          mode (str): The mode argument to open. Same as in :func:`open`.
-
-          kwargs: Additional keyword arguments that will be passed
-            to :func:`zipfile.ZipFile.open`
-
-        
-        Return:
-
-          file-like: The opened file object associated with the member
-          file.
-        """
-        if 'r' in mode:
-            name = self.validate_member_name(name)
-            if name.endswith('/'):
-                raise ValueError('Directory member cannot be opened in'
-                                 ' read mode.')
-        assert 'r' in mode or 'w' in mode
-        mode2 = 'r' if 'r' in mode else 'w'
-        f = self._file.open(name, mode2)
-        if 'b' not in mode:
-            f = io.TextIOWrapper(f)
-        return f
-
-
-    def extract(self, path=None, members=None):
-        """Extract members to a location
-
-        Args:
+    Args:
 
-          path (path-like): Location of the extracted files.
+      src (path-like, file-like, Archive): The archive to convert,
+        either opened or a path opened with :func:`open`.
 
-          members (Seq[str]): Members to extract, specified by a list
-            of names.
+      dst (path-like, file-like): Path of the new archive.
 
-        """
-        if members is not None:
-            members = [self.validate_member_name(x) for x in members]
-        self._file.extractall(path, members)
+      engine (type): Engine of the new archive. Determined by
+        :func:`auto_engine` if None.
 
+      workers (int): Number of threads reading and compressing
+        members.
 
-    def close(self):
-        if self._need_close:
-            self._file.close()
+      max_bytes (int): Budget for the total size of the members in
+        flight. Members larger than half of it are streamed one at a
+        time.
 
+      kwargs: Additional keyword arguments passed to the engine of
+        :code:`dst`, e.g. :code:`compression=zipfile.ZIP_DEFLATED`.
 
-class DirArchive(Archive):
-    """Archive engine that treat a directory as an archive using `pathlib`
-    module
     """
-    def __init__(self, path, mode='r'):
-        self._file = os.path.abspath(path)
-        
-
-    @property
-    def member_names(self):
-        names = []
-        for p, dirs, files in os.walk(self._file):
-            dirnames = [os.path.relpath(os.path.join(p, x), self._file)+'/'
-                        for x in dirs]
-            names += dirnames
-            fnames = [os.path.relpath(os.path.join(p, x), self._file)
-                      for x in files]
-            names += fnames
-            names = [x.replace('\\', '/') for x in names]
-        return names
-
-    
-    def open_member(self, name, mode='r', **kwargs):
-        """Open a member in the directory
+    from .archive import Archive
+    if isinstance(src, Archive):
+        source = src
+    else:
+        source = open(src)
+    try:
+        with open(dst, 'w', engine, **kwargs) as dest:
+            source._convert_to(dest, workers=workers, max_bytes=max_bytes)
+    finally:
+        if source is not src:
+            source.close()
 
-        Args:
 
-          name (str): Name of the member file
+def search(paths, pattern, members=None, workers=4, processes=False,
+           chunk_size=1024*1024, overlap=4096):
+    """Search the members of several archives for a regular expression
 
-          mode (str): The mode argument to open. Same as in :func:`open`.
+    Every archive is opened and searched by a worker, see
+    :meth:`Archive.search`.
 
-          kwargs: Additional keyword arguments that will be passed
-            to :func:`open`
-        
-        Return:
+    Args:
 
-          file-like: The opened file object associated with the member
-          file.
+      paths (Iterable[path-like]): Paths of the archives.
 
-        """
-        if 'r' in mode:
-            name = self.validate_member_name(name)
-            if name.endswith('/'):
-                raise ValueError('Directory member cannot be opened.')
-        path = os.path.join(self._file, name)
-        return builtins.open(path, mode, **kwargs)
+      pattern (bytes, str, re.Pattern): Regular expression matched
+        against the binary content of the members.
 
-    
-    def extract(self, path=None, members=None):
-        """Extract members to a location
+      members (Seq[str]): Names of the members to search in every
+        archive. Default to all regular file members.
 
-        Args:
+      workers (int): Number of workers.
 
-          path (path-like): Location of the extracted files.
+      processes (bool): Whether the workers are processes instead of
+        threads, so that matching runs in parallel as well as
+        decompression. The pattern must be picklable.
 
-          members (Seq[str]): Members to extract, specified by a list
-            of names.
+      chunk_size (int): Number of bytes scanned at a time.
 
-        """
-        if path is None: #pragma no cover
-            path = '.'
-        if os.path.samefile(self._file, path): #pragma no cover
-            return
-        
-        if members is None:
-            members = self.member_names
-        else:
-            members = [self.validate_member_name(x) for x in members]
-        for name in members:
-            fname = os.path.join(path, name)
-            if self.member_is_dir(name):
-                if not os.path.isdir(fname):
-                    os.makedirs(fname)
-            else:
-                parent = os.path.dirname(fname)
-                if not os.path.isdir(parent):
-                    os.makedirs(parent)
-                shutil.copyfile(os.path.join(self._file, name), fname)
-            
-        
+      overlap (int): Number of bytes shared by consecutive chunks,
+        at least 1. Matches longer than :code:`overlap` crossing a
+        chunk boundary may be missed or cut short.
 
-def open(path, mode='r', engine=None, *args, **kwargs):
-    """Open an archive file
-
-    Args:
-
-      path (path-like, file-like): Path of the archive to read or write
-
-      mode (str): The mode to open the member, same as in
-        :func:`open`. Default to 'r'.
-      
-      engine (type): Class object of a specific subclass Archive which
-        implements the logic of processing a specific type of
-        Archive. Provided implements:
-
-        * ZipArchive: zip file archive using the `zipfile` module
-    
-        * TarArchive: tar file archive using the `tarfile` module
-
-        * DirArchive: directory as an archive using the `pathlib` module
-
-        * None: Automatically determine engines by file properties and
-          mode
+    Return:
 
-      kwargs : Additional keyword arguments passed to the underlying
-        engine constructor
-    
+      iterator: Iterator of :code:`(path, name, offset, data)` tuples,
+      in the order of :code:`paths`.
     """
-    if engine is None:
-        engine = auto_engine(path, mode)
-        if engine is None:
-            raise RuntimeError('Cannot automatically determine engine for '
-                               'path:', path, ' mode:', mode)
-    assert issubclass(engine, Archive)
-    return engine(path, mode, **kwargs)
+    from .grep import search_paths
+    return search_paths(paths, pattern, members, workers, processes,
+                        chunk_size, overlap)
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""Names shared by the engine modules which differ across Python versions
+"""
+
+import os
+import sys
+
+if sys.version_info[0] == 2: #pragma no cover
+    import __builtin__ as builtins
+else: #pragma no cover
+    import builtins
+
+if sys.version_info[0] >= 3 and sys.version_info[1] >= 6: #pragma no cover
+    _path_classes = (str, bytes, os.PathLike)
+else: #pragma no cover
+    _path_classes = (str, bytes)
@@ -0,0 +1,1062 @@
+# -*- coding: utf-8 -*-
+"""The :class:`Archive` base class of all engines
+"""
+
+import io
+import os
+import abc
+import sys
+import collections
+
+from ._compat import builtins, _path_classes
+from .seekable import IndexedReader, StreamDecoder
+from .cache import get_block_cache
+from .table import MemberTable
+
+
+def _check_seekable(seekable, mode):
+    if seekable not in (None, False, 'indexed'):
+        raise ValueError('seekable must be None, False or "indexed", got '
+                         +repr(seekable))
+    if seekable == 'indexed' and 'r' not in mode:
+        raise ValueError('seekable can only be used in read mode')
+
+
+def _file_identity(path):
+    st = os.stat(path)
+    return (os.path.realpath(path), st.st_size, st.st_mtime)
+
+
+_COPY_CHUNK = 1024 * 1024
+
+_SPOOL_SIZE = 16 * 1024 * 1024
+
+_buffer_classes = (bytes, bytearray, memoryview)
+
+
+class _IterReader(io.RawIOBase):
+    """Binary file object reading the chunks of an iterable"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+        self._offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._offset == len(self._buffer):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buffer = memoryview(bytes(chunk))
+            self._offset = 0
+        n = min(len(b), len(self._buffer) - self._offset)
+        b[:n] = self._buffer[self._offset:self._offset+n]
+        self._offset += n
+        return n
+
+
+def _open_source(source):
+    # Return (fileobj, size, need_close) for the content of a member
+    # to write, size is None if unknown
+    if isinstance(source, _buffer_classes):
+        data = bytes(source)
+        return io.BytesIO(data), len(data), True
+    if isinstance(source, _path_classes):
+        f = builtins.open(source, 'rb')
+        return f, os.fstat(f.fileno()).st_size, True
+    if not hasattr(source, 'read'):
+        return io.BufferedReader(_IterReader(source), _COPY_CHUNK), None, True
+    size = None
+    if source.seekable():
+        pos = source.tell()
+        size = source.seek(0, os.SEEK_END) - pos
+        source.seek(pos)
+    return source, size, False
+
+
+def _hash_source(source):
+    # Return (digest, source) where non-seekable streams are replaced
+    # by a spooled copy, so that they can be read again
+    import hashlib
+    h = hashlib.blake2b()
+    if isinstance(source, _buffer_classes):
+        h.update(source)
+        return h.digest(), source
+    if isinstance(source, _path_classes):
+        with builtins.open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(_COPY_CHUNK), b''):
+                h.update(chunk)
+        return h.digest(), source
+    if not hasattr(source, 'read'):
+        source = _IterReader(source)
+    elif source.seekable():
+        pos = source.tell()
+        for chunk in iter(lambda: source.read(_COPY_CHUNK), b''):
+            h.update(chunk)
+        source.seek(pos)
+        return h.digest(), source
+    import tempfile
+    spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE)
+    for chunk in iter(lambda: source.read(_COPY_CHUNK), b''):
+        h.update(chunk)
+        spool.write(chunk)
+    spool.seek(0)
+    return h.digest(), spool
+
+_MIN_EXTRACT_CHUNK = 64 * 1024
+
+_MAX_EXTRACT_CHUNK = 16 * 1024 * 1024
+
+
+def _extract_chunk_size(size, path, chunk_size=None, max_memory=None):
+    """Get the size of the chunks copying a member to a file
+
+    Args:
+
+      size (int): Size of the member, negative if unknown.
+
+      path (path-like): Destination directory.
+
+      chunk_size (int, NoneType): Requested chunk size, None to adapt
+        it to the member size and the block size of the file system.
+
+      max_memory (int, NoneType): Upper bound of the chunk size.
+
+    Return:
+
+      int: Chunk size in bytes.
+    """
+    if chunk_size is None:
+        try:
+            block = os.statvfs(path).f_bsize
+        except (AttributeError, OSError): #pragma no cover
+            block = 4096
+        if size < 0:
+            chunk_size = _COPY_CHUNK
+        else:
+            # about 16 syscalls per member, in whole file system blocks
+            chunk_size = min(max(size // 16, _MIN_EXTRACT_CHUNK),
+                             _MAX_EXTRACT_CHUNK)
+        chunk_size = max(chunk_size // block, 1) * block
+    if max_memory is not None:
+        chunk_size = min(chunk_size, max_memory)
+    return max(chunk_size, 1)
+
+
+def _match_member_name(name, names):
+    # Normalize a member name against a container of the member names,
+    # a directory may be named without its trailing '/'
+    assert len(name) > 0
+    if name in names:
+        return name
+    elif name[-1] != '/' and name+'/' in names:
+        return name + '/'
+    else:
+        raise ValueError(name+' is not a valid member name.')
+
+
+def _member_path(path, name):
+    # Destination of a member below path. Empty, '.' and '..'
+    # components are dropped like zipfile does, so that no member is
+    # written outside of path.
+    parts = [x for x in name.split('/') if x not in ('', '.', '..')]
+    if parts:
+        parts[0] = os.path.splitdrive(parts[0])[1] or parts[0]
+    return os.path.join(path, *parts)
+
+
+def _copy_to_file(src, fname, size, buffer):
+    """Copy a binary file object to a new file through a reusable buffer
+
+    Args:
+
+      src (file-like): Source file object.
+
+      fname (path-like): Path of the file to write.
+
+      size (int): Expected size of the content, the file is allocated
+        beforehand when it is positive and the platform supports
+        :func:`os.posix_fallocate`.
+
+      buffer (memoryview): Buffer of the chunks.
+    """
+    readinto = getattr(src, 'readinto', None)
+    with builtins.open(fname, 'wb', buffering=0) as dst:
+        if size > 0 and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(dst.fileno(), 0, size)
+            except OSError: #pragma no cover
+                pass
+        while True:
+            if readinto is not None:
+                n = readinto(buffer)
+            else: #pragma no cover
+                data = src.read(len(buffer))
+                n = len(data)
+                buffer[:n] = data
+            if not n:
+                break
+            chunk = buffer[:n]
+            while chunk:
+                chunk = chunk[dst.write(chunk):]
+        # the content may be shorter than announced
+        dst.truncate()
+
+
+if sys.version_info[0] > 2 and sys.version_info[1] > 3: # pragma no cover
+    base_cls = abc.ABC
+else: #pragma no cover
+    base_cls = object
+    
+class Archive(base_cls):
+
+    """Common-interface to different type of archive files manipulation
+    
+    Args:
+
+      path (path-like, file-like): Path of the archive to read or write
+
+      mode (str): The mode to open the member, same as in
+        :func:`open`. Default to 'r'.
+      
+      engine (type): Class object of a specific subclass Archive which
+        implements the logic of processing a specific type of
+        Archive. Provided implements:
+
+        * ZipArchive: zip file archive using the `zipfile` module
+    
+        * TarArchive: tar file archive using the `tarfile` module
+
+        * DirArchive: directory as an archive using the `pathlib` module
+
+        * None: Automatically determine engines by file properties and
+          mode
+
+      kwargs : Additional keyword arguments passed to the underlying
+        engine constructor
+
+    Note:
+
+      The constructor of a concrete engine should take at least one
+      positional argument `path` and one optional argument `mode` with
+      default value to `r`.
+
+    """
+    __metaclass__ = abc.ABCMeta
+
+    @property
+    @abc.abstractmethod
+    def member_names(self):
+        """Get list of names of the members (i.e. files contained in the
+        archive)
+
+        Return:
+
+          list[str]: list of member names
+        """
+        pass
+
+    @abc.abstractmethod
+    def open_member(self, name, mode='r', **kwargs):
+        """Open a member file contained in the archive
+
+        Args:
+
+          name (str): name of the member file to open
+
+          mode (str): The mode to open the member, same as in
+            :func:`open`. Default to 'r'.
+
+          kwargs: Additional keyword arguments that will be passed
+            to the underlying function. Concrete engines also accept
+            :code:`seekable`: None (default) returns the file object
+            of the underlying module, while :code:`'indexed'` returns
+            a :class:`~arlib.seekable.IndexedReader` which records
+            decoder checkpoints while reading, so that backward seeks
+            in compressed members do not decode from the beginning.
+            When a block cache is installed by
+            :func:`~arlib.cache.set_block_cache`, None also returns an
+            :class:`~arlib.seekable.IndexedReader` which looks blocks
+            up in the cache. False always returns the file object of
+            the underlying module.
+
+        Return:
+
+          file-like: A opened file object associated with the member
+          file
+
+        """
+        pass
+
+    def _indexed_reader(self, name, **kwargs):
+        """Create an :class:`~arlib.seekable.IndexedReader` for a member
+
+        The default implementation decodes the member through
+        :meth:`open_member` and has no checkpoints, so that going
+        backward beyond the cached blocks reopens the member. Concrete
+        engines override it to decode directly from the archive file.
+
+        Args:
+
+          name (str): Name of a regular file member.
+
+          kwargs: Additional keyword arguments that will be passed to
+            the :class:`~arlib.seekable.IndexedReader` constructor.
+
+        Return:
+
+          IndexedReader: Binary file object of the member.
+        """
+        return IndexedReader(StreamDecoder(
+            lambda: self.open_member(name, 'rb', seekable=False)), **kwargs)
+
+    def _archive_identity(self):
+        """Identify the content of the archive for the block cache
+
+        Return:
+
+          tuple, NoneType: Hashable identity of the archive, or None
+          if members of the archive should not be cached.
+        """
+        return None
+
+    def _member_cache_key(self, name):
+        identity = self._archive_identity()
+        if identity is None:
+            return None
+        return identity + (name,)
+
+    def _block_cache_options(self, name):
+        cache = get_block_cache()
+        if cache is None:
+            return None
+        key = self._member_cache_key(name)
+        if key is None:
+            return None
+        return {'cache': cache, 'cache_key': key}
+
+    def _open_indexed(self, name, mode):
+        f = self._indexed_reader(name,
+                                 **(self._block_cache_options(name) or {}))
+        if 'b' not in mode:
+            f = io.TextIOWrapper(io.BufferedReader(f))
+        return f
+
+    def _iter_member_info(self):
+        """Iterate over the metadata of all members
+
+        Return:
+
+          iterator: Iterator of :code:`(name, size, compressed_size,
+          offset, data_offset, mtime, is_dir)` tuples, see
+          :class:`~arlib.table.MemberTable`. The default
+          implementation only knows the names.
+        """
+        for name in self.member_names:
+            yield (name, -1, -1, -1, -1, float('nan'), name.endswith('/'))
+
+    def member_table(self):
+        """Get the metadata of all members as a columnar table
+
+        Return:
+
+          MemberTable: One row per member, in the order of
+          :attr:`member_names`.
+        """
+        return MemberTable.from_records(self._iter_member_info())
+
+    def shard(self, num_shards, shard_id, by='count'):
+        """Get the regular file members assigned to one of several workers
+
+        Members are ordered by their offset in the archive file (or
+        kept in the order of :attr:`member_names` if offsets are not
+        known) and cut into :code:`num_shards` contiguous ranges, so
+        every worker reads a sequential region of the archive.
+
+        Args:
+
+          num_shards (int): Number of shards.
+
+          shard_id (int): Index of the shard to return, from 0 to
+            :code:`num_shards-1`.
+
+          by (str): :code:`'count'` to balance the number of members
+            per shard, or :code:`'bytes'` to balance the number of
+            bytes stored in the archive (compressed size if known,
+            otherwise size).
+
+        Return:
+
+          list[str]: Names of the members of the shard, ordered by
+          offset.
+        """
+        if not 0 <= shard_id < num_shards:
+            raise ValueError('shard_id must be in [0, num_shards), got '
+                             +str(shard_id))
+        if by not in ('count', 'bytes'):
+            raise ValueError('by must be "count" or "bytes", got '+repr(by))
+        table = self.member_table()
+        rows = [i for i, x in enumerate(table['is_dir']) if not x]
+        offsets = table['offset']
+        if all(offsets[i] >= 0 for i in rows):
+            rows.sort(key=lambda i: offsets[i])
+        if by == 'count':
+            begin = len(rows) * shard_id // num_shards
+            end = len(rows) * (shard_id+1) // num_shards
+            return [table.name(i) for i in rows[begin:end]]
+        sizes = table['compressed_size']
+        fallback = table['size']
+        weights = [max(sizes[i] if sizes[i] >= 0 else fallback[i], 0)
+                   for i in rows]
+        total = float(sum(weights)) or 1.0
+        names = []
+        start = 0
+        for i, weight in zip(rows, weights):
+            # assign each member by the position of its midpoint
+            k = int((start + weight / 2.0) * num_shards / total)
+            if min(k, num_shards-1) == shard_id:
+                names.append(table.name(i))
+            start += weight
+        return names
+
+    def validate_member_name(self, name):
+        return _match_member_name(name, self.member_names)
+        
+
+    def member_is_dir(self, name):
+        """Check if a specific member is a directory
+
+        Args:
+        
+          name (str): Member name.
+
+        Returns:
+
+        bool: True if the member is a directory, False otherwise.
+        """
+        name = self.validate_member_name(name)
+        return name.endswith('/')
+
+
+    def read_members(self, names=None):
+        """Read the content of members
+
+        Members are opened with :meth:`open_member`, so they go
+        through the block cache if one is installed.
+
+        Args:
+
+          names (Seq[str]): Names of regular file members to read.
+            Default to all regular file members.
+
+        Return:
+
+          iterator: Iterator of :code:`(name, data)` tuples. Engines
+          may yield the members in a different order than
+          :code:`names` if that is cheaper for the archive format.
+        """
+        if names is None:
+            names = [x for x in self.member_names if not x.endswith('/')]
+        for name in names:
+            with self.open_member(name, 'rb') as f:
+                yield name, f.read()
+
+
+    def _read_member_data(self, name):
+        """Read the whole content of a member, may be called from worker
+        threads
+        """
+        with self.open_member(name, 'rb') as f:
+            return f.read()
+
+
+    def prefetch(self, names=None, depth=4, workers=2,
+                 max_bytes=64*1024*1024):
+        """Read members ahead of the consumer in background threads
+
+        Reading and decompression of upcoming members overlap with the
+        processing of the current one. Members are yielded in the
+        order of :code:`names`. Members of compressed tar files are
+        read by a single thread, so that the archive is decompressed
+        in one forward pass when :code:`names` are in archive order.
+
+        Args:
+
+          names (Seq[str]): Names of regular file members to read.
+            Default to all regular file members.
+
+          depth (int): Maximum number of members read ahead.
+
+          workers (int): Number of background threads.
+
+          max_bytes (int): Budget for the total size of the members
+            read ahead but not yet yielded. A member larger than the
+            budget is still read, but only when nothing else is
+            pending.
+
+        Return:
+
+          iterator: Iterator of :code:`(name, data)` tuples.
+        """
+        table = self.member_table()
+        if names is None:
+            names = [x for x, is_dir in zip(table.names(), table['is_dir'])
+                     if not is_dir]
+        sizes = dict(zip(table.names(), table['size']))
+        names = iter(names)
+        if self._is_solid():
+            # members of a compressed stream are decoded in archive order
+            workers = 1
+        import concurrent.futures
+        pool = concurrent.futures.ThreadPoolExecutor(max(workers, 1))
+        pending = collections.deque()
+        pending_bytes = 0
+        name = next(names, None)
+        try:
+            while True:
+                while name is not None and len(pending) < depth:
+                    size = max(int(sizes.get(name, 0)), 0)
+                    if pending and pending_bytes + size > max_bytes:
+                        break
+                    future = pool.submit(self._read_member_data, name)
+                    pending.append((name, size, future))
+                    pending_bytes += size
+                    name = next(names, None)
+                if not pending:
+                    break
+                done, size, future = pending.popleft()
+                pending_bytes -= size
+                yield done, future.result()
+        finally:
+            for _, _, future in pending:
+                future.cancel()
+            pool.shutdown(wait=True)
+
+
+    def add_members(self, members, dedup=False, workers=None):
+        """Write many members at once
+
+        With :code:`dedup`, the content of the members is hashed with
+        BLAKE2 in a thread pool while members are being written, and
+        every member whose content was already written is stored as a
+        duplicate of the first one: a hardlink entry in tar files,
+        and a copy of the already compressed bytes in zip files, so
+        each unique payload is compressed only once.
+
+        Args:
+
+          members (dict, Iterable[tuple]): Maps member names to their
+            content, or :code:`(name, content)` pairs. The content is
+            a bytes-like object, the path (str or path-like) of a
+            file, a binary file object read from its current
+            position, or an iterable (e.g. a generator) of
+            bytes-like chunks. The size of file objects and iterables
+            may be given with :code:`(name, content, size)` triples,
+            which saves engines needing the size before the data
+            from buffering the content. Names ending with
+            :code:`'/'` or with a None content are written as
+            directories.
+
+          dedup (bool): Whether to store members with identical
+            content only once. Members are hashed at most
+            :code:`2*workers` ahead of the one being written, so
+            :code:`members` may be a generator of streams.
+
+          workers (int, NoneType): Number of threads hashing the
+            content. Default to the default of
+            :class:`concurrent.futures.ThreadPoolExecutor`.
+
+        Return:
+
+          dict: Maps the name of every member written as a duplicate
+          to the name of the first member with the same content.
+        """
+        if isinstance(members, dict):
+            members = members.items()
+        members = (tuple(x) + (None,) * (3 - len(x)) for x in members)
+        duplicates = {}
+        first = {}
+        pool = None
+        window = 0
+        if dedup:
+            import concurrent.futures
+            if workers is None:
+                # default of ThreadPoolExecutor
+                workers = min(32, (os.cpu_count() or 1) + 4)
+            pool = concurrent.futures.ThreadPoolExecutor(workers)
+            # members are hashed a bounded number ahead of the writer,
+            # so that spooled copies of streams do not pile up
+            window = 2 * workers
+        pending = collections.deque()
+
+        def write_next():
+            (name, source, known_size), future = pending.popleft()
+            if source is None or name.endswith('/'):
+                self._write_dir(name)
+                return
+            digest = None
+            original = source
+            if future is not None:
+                digest, source = future.result()
+            try:
+                if digest in first:
+                    duplicates[name] = first[digest]
+                    self._write_duplicate(name, first[digest], source)
+                    return
+                f, size, need_close = _open_source(source)
+                if size is None:
+                    size = known_size
+                try:
+                    self._write_member(name, f, size)
+                finally:
+                    if need_close:
+                        f.close()
+                if digest is not None:
+                    first[digest] = name
+            finally:
+                if source is not original:
+                    source.close()
+
+        try:
+            for name, source, known_size in members:
+                future = None
+                if pool is not None and not (source is None or
+                                             name.endswith('/')):
+                    future = pool.submit(_hash_source, source)
+                pending.append(((name, source, known_size), future))
+                while len(pending) > window:
+                    write_next()
+            while pending:
+                write_next()
+        finally:
+            if pool is not None:
+                for _, future in pending:
+                    if future is not None:
+                        future.cancel()
+                pool.shutdown(wait=True)
+                # spooled copies of the members left unwritten
+                for (_, source, _), future in pending:
+                    if (future is not None and not future.cancelled() and
+                        future.exception() is None and
+                        future.result()[1] is not source):
+                        future.result()[1].close()
+        return duplicates
+
+
+    def _write_member(self, name, fileobj, size):
+        """Write a regular file member
+
+        Args:
+
+          name (str): Name of the member.
+
+          fileobj (file-like): Binary file object of the content.
+
+          size (int, NoneType): Size of the content, or None if
+            unknown.
+        """
+        import shutil
+        with self.open_member(name, 'wb') as f:
+            shutil.copyfileobj(fileobj, f, _COPY_CHUNK)
+
+
+    def _write_dir(self, name):
+        """Write a directory member"""
+        raise NotImplementedError('{} does not support writing directory'
+                                  ' members'.format(type(self).__name__))
+
+
+    def _write_duplicate(self, name, original, source):
+        """Write a member with the same content as a member already
+        written
+
+        The default implementation writes :code:`source` again.
+
+        Args:
+
+          name (str): Name of the new member.
+
+          original (str): Name of the member with the same content.
+
+          source: Content of the member, as in :meth:`add_members`.
+        """
+        f, size, need_close = _open_source(source)
+        try:
+            self._write_member(name, f, size)
+        finally:
+            if need_close:
+                f.close()
+
+
+    def copy_members(self, dest, names=None):
+        """Copy members to another archive opened for writing
+
+        Members are copied without being decompressed and compressed
+        again when the formats allow it: members of zip files are
+        copied to zip files as raw compressed bytes, keeping their
+        compression method, CRC and modification time. Members of tar
+        files are copied to tar files with their header, e.g.
+        permissions, owner and symbolic links, while hardlinks are
+        resolved to regular files. Other members are decompressed and
+        written with the compression of :code:`dest`.
+
+        Args:
+
+          dest (Archive): Archive opened in write or append mode.
+
+          names (Seq[str]): Names of the members to copy. Default to
+            all members.
+        """
+        if names is None:
+            names = self.member_names
+        else:
+            names = [self.validate_member_name(x) for x in names]
+        sizes = dict((x[0], x[1]) for x in self._iter_member_info())
+        for name in names:
+            size = sizes.get(name, -1)
+            self._copy_member(dest, name, size if size >= 0 else None)
+
+
+    def _copy_member(self, dest, name, size, recompress=False):
+        """Copy a member to :code:`dest`
+
+        The default implementation decompresses the member and writes
+        it with :meth:`_write_member` of :code:`dest`. Engines
+        override it to copy raw data to archives of the same format.
+
+        Args:
+
+          dest (Archive): Archive opened for writing.
+
+          name (str): Validated name of the member.
+
+          size (int, NoneType): Size of the member, or None if
+            unknown.
+
+          recompress (bool): Whether the member must be written with
+            the compression of :code:`dest`, as by :func:`arlib.convert`.
+            Raw data is then only copied if it is compressed the same
+            way.
+        """
+        if name.endswith('/'):
+            dest._write_dir(name)
+            return
+        with self.open_member(name, 'rb', seekable=False) as f:
+            dest._write_member(name, f, size)
+
+
+    def _can_copy_raw(self, dest, recompress=False):
+        """Whether :meth:`_copy_member` copies members to :code:`dest`
+        without decompressing them, see :meth:`_copy_member` for
+        :code:`recompress`
+        """
+        return False
+
+
+    def _prepare_member(self, name, data):
+        """Prepare a member for writing, called from worker threads
+
+        Engines override it to compress the member in the calling
+        thread, so that several members are compressed in parallel.
+
+        Args:
+
+          name (str): Name of the member.
+
+          data (bytes): Content of the member.
+
+        Return:
+
+          object: Argument of :meth:`_write_prepared`.
+        """
+        return name, data
+
+
+    def _write_prepared(self, prepared):
+        """Write a member returned by :meth:`_prepare_member`"""
+        name, data = prepared
+        self._write_member(name, io.BytesIO(data), len(data))
+
+
+    def _convert_to(self, dest, workers=2, max_bytes=64*1024*1024):
+        """Copy all members to :code:`dest` through a pipeline
+
+        Members are read and prepared for writing (i.e. decompressed
+        and compressed again) by :code:`workers` threads, and written
+        in archive order by the calling thread. Members of compressed
+        tar files are read in archive order by the calling thread, and
+        only prepared by the workers. At most
+        :code:`max_bytes` of member content are in flight, members
+        larger than half of it are streamed without being loaded in
+        memory.
+        """
+        if self._can_copy_raw(dest, recompress=True):
+            self.copy_members(dest)
+            return
+        table = self.member_table()
+        sizes = dict(zip(table.names(), table['size']))
+
+        def task(name, data=None):
+            if data is None:
+                data = self._read_member_data(name)
+            return dest._prepare_member(name, data)
+
+        # members of a compressed stream are decoded in archive order
+        solid = self._is_solid()
+
+        import concurrent.futures
+        pool = concurrent.futures.ThreadPoolExecutor(max(workers, 1))
+        pending = collections.deque()
+        pending_bytes = [0]
+
+        def write_next():
+            name, size, future = pending.popleft()
+            pending_bytes[0] -= size
+            if future is None:
+                dest._write_dir(name)
+            else:
+                dest._write_prepared(future.result())
+
+        try:
+            for name in self.member_names:
+                size = int(sizes.get(name, -1))
+                if name.endswith('/'):
+                    pending.append((name, 0, None))
+                elif size < 0 or 2 * size > max_bytes:
+                    while pending:
+                        write_next()
+                    self._copy_member(dest, name, size if size >= 0
+                                      else None, recompress=True)
+                else:
+                    while pending and (len(pending) > 2 * workers or
+                                       pending_bytes[0] + size > max_bytes):
+                        write_next()
+                    if solid:
+                        future = pool.submit(task, name,
+                                             self._read_member_data(name))
+                    else:
+                        future = pool.submit(task, name)
+                    pending.append((name, size, future))
+                    pending_bytes[0] += size
+            while pending:
+                write_next()
+        finally:
+            for _, _, future in pending:
+                if future is not None:
+                    future.cancel()
+            pool.shutdown(wait=True)
+
+
+    def _member_read_lock(self):
+        """Lock to hold while reading members from several threads
+
+        Return:
+
+          lock-like, NoneType: The lock, or None if members can be
+          read concurrently.
+        """
+        return None
+
+
+    def _is_solid(self):
+        """Whether members are parts of a single compressed stream, so
+        they are cheap to read only in archive order
+        """
+        return False
+
+
+    def search(self, pattern, members=None, workers=2,
+               chunk_size=1024*1024, overlap=4096):
+        """Search members for a regular expression
+
+        Members are decompressed and scanned in chunks by a thread
+        pool, see :mod:`arlib.grep`. Members of compressed tar files
+        are scanned in archive order by a single thread.
+
+        Args:
+
+          pattern (bytes, str, re.Pattern): Regular expression matched
+            against the binary content of the members. A :code:`str`
+            pattern is encoded in UTF-8. Use :func:`re.escape` to
+            search for a literal string.
+
+          members (Seq[str]): Names of the members to search. Default
+            to all regular file members.
+
+          workers (int): Number of threads.
+
+          chunk_size (int): Number of bytes scanned at a time.
+
+          overlap (int): Number of bytes shared by consecutive
+            chunks, at least 1. Matches longer than :code:`overlap`
+            crossing a chunk boundary may be missed or cut short.
+
+        Return:
+
+          iterator: Iterator of :code:`(name, offset, data)` tuples,
+          where :code:`offset` is the position of the match
+          :code:`data` in the member. Members are in the order of
+          :code:`members`, matches of a member are ordered by offset.
+
+        Examples:
+
+          >>> import arlib, os
+          >>> path = os.path.join(os.path.dirname(arlib.__file__),
+          ...                     'grep.py')
+          >>> with arlib.open(os.path.dirname(path)) as ar:
+          ...     matches = list(ar.search(b'def scan', ['grep.py']))
+          >>> [x[0] for x in matches]
+          ['grep.py']
+
+        """
+        from .grep import search_archive
+        return search_archive(self, pattern, members, workers, chunk_size,
+                              overlap)
+
+
+    def _member_crc(self, name):
+        """Get the CRC-32 of a member recorded in the archive, or None"""
+        return None
+
+
+    def verify(self, members=None, workers=2, digests=None,
+               algorithm='sha256'):
+        """Check the integrity of members
+
+        Every member is read once and checked against the CRC-32
+        recorded by the format, for zip files, and against the digest
+        listed in :code:`digests`, if any. Members are checked by a
+        thread pool, except for compressed tar files which are read
+        in archive order. See :mod:`arlib.verify`.
+
+        Args:
+
+          members (Seq[str]): Names of the members to check. Default
+            to all regular file members.
+
+          workers (int): Number of threads.
+
+          digests (dict, path-like, file-like, NoneType): Expected
+            hexadecimal digests of members, as a dict mapping member
+            names to digests, or a manifest in the format of
+            :code:`sha256sum`, see :func:`~arlib.verify.read_manifest`.
+            If :code:`members` is None, names of the manifest missing
+            from the archive are failures.
+
+          algorithm (str): Name of the :mod:`hashlib` algorithm of
+            the digests.
+
+        Return:
+
+          VerifyReport: The failures, number of members and bytes
+          checked, and throughput.
+        """
+        from .verify import verify_archive
+        return verify_archive(self, members, workers, digests, algorithm)
+
+
+    def member_is_file(self, name):
+        """Check if a specific member is a regular file
+
+        Args:
+        
+          name (str): Member name.
+
+        Returns:
+
+        bool: True if the member is a regular file, False otherwise.
+
+        """
+        return not self.member_is_dir(name)
+
+
+    def extract(self, path=None, members=None, chunk_size=None,
+                max_memory=None):
+        """Extract members to a location
+
+        Members are copied in chunks through one buffer reused for all
+        members. Unless given, the chunk size adapts to the size of
+        each member and to the block size of the destination file
+        system, between 64 KiB and 16 MiB, and output files are
+        allocated beforehand where :func:`os.posix_fallocate` is
+        available.
+
+        Args:
+
+          path (path-like): Location of the extracted files.
+
+          members (Seq[str]): Members to extract, specified by a list
+            of names.
+
+          chunk_size (int): Size of the chunks copied at a time.
+
+          max_memory (int): Upper bound of the memory used for
+            buffering the content of members, whatever the engine.
+
+        """
+        if path is None: #pragma no cover
+            path = '.'
+        # name -> (size, is_dir), so that members are checked in
+        # constant time
+        info = dict((x[0], (x[1], x[6])) for x in self._iter_member_info())
+        if members is None:
+            members = self.member_names
+        else:
+            members = [_match_member_name(x, info) for x in members]
+        buffer = None
+        for name in members:
+            fname = _member_path(path, name)
+            size, is_dir = info.get(name, (-1, name.endswith('/')))
+            if is_dir:
+                if not os.path.isdir(fname):
+                    os.makedirs(fname)
+                continue
+            parent = os.path.dirname(fname)
+            if not os.path.isdir(parent):
+                os.makedirs(parent)
+            n = _extract_chunk_size(size, parent, chunk_size, max_memory)
+            if buffer is None or len(buffer) < n:
+                buffer = memoryview(bytearray(n))
+            with self.open_member(name, 'rb', seekable=False) as src:
+                _copy_to_file(src, fname, size, buffer[:n])
+
+    def close(self):
+        """Release resources such as closing files etc
+
+        Archives opened through a :class:`~arlib.handles.HandleCache`
+        are returned to the cache instead, and closed when they are
+        evicted. The trace of archives opened with :code:`trace` is
+        written when they are closed.
+        """
+        cache = self.__dict__.get('_handle_cache')
+        if cache is not None:
+            cache.release(self)
+            return
+        self._close()
+        tracer = self.__dict__.get('_tracer')
+        if tracer is not None:
+            self._tracer = None
+            tracer.close()
+
+    def _close(self):
+        """Close the resources of the engine, see :meth:`close`"""
+        pass
+
+    def __enter__(self):
+        """Context manager enter function
+
+        Return:
+
+          Archive: The archive object itself
+        """
+        return self
+
+    def __exit__(self, type, value, traceback):
+        """Context manager exit function
+
+        Call self.close() then return True
+        """
+        self.close()
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""Engine for archives held in memory
+
+:class:`BufferArchive` reads a zip or tar archive from a
+:code:`bytes`, :code:`bytearray`, :code:`memoryview` or
+:class:`mmap.mmap` object without wrapping it in :class:`io.BytesIO`.
+The format is detected from the magic numbers of the buffer. Members
+stored without compression are slices of the buffer: they are opened
+as seekable file objects over the slice and exposed without any copy
+by :meth:`BufferArchive.member_view`. Compressed members are decoded
+straight from the buffer.
+
+"""
+
+import io
+import os
+import zipfile
+
+from .archive import Archive, _check_seekable
+from .plugins import _buffer_format
+from .seekable import _FileRange
+from .zip import ZipArchive
+from .tar import TarArchive
+
+
+class _BufferFile(io.RawIOBase):
+    """Seekable binary file object reading a memoryview"""
+
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += len(self._view)
+        elif whence != os.SEEK_SET:
+            raise ValueError('invalid whence ({})'.format(whence))
+        if offset < 0:
+            raise ValueError('negative seek position {}'.format(offset))
+        self._pos = offset
+        return offset
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            end = len(self._view)
+        else:
+            end = min(self._pos + n, len(self._view))
+        data = self._view[self._pos:end].tobytes()
+        self._pos = max(self._pos, end)
+        return data
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, b):
+        data = self._view[self._pos:self._pos+len(b)]
+        n = len(data)
+        memoryview(b).cast('B')[:n] = data
+        self._pos += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super(_BufferFile, self).close()
+
+
+def _as_view(buffer):
+    view = memoryview(buffer)
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    return view
+
+
+class BufferArchive(Archive):
+    """Archive engine for zip and tar archives held in memory
+
+    Instantiating this class returns an instance of a subclass
+    implementing the format of the buffer, which is a
+    :class:`~arlib.ZipArchive` or a :class:`~arlib.TarArchive` as
+    well. :func:`arlib.open` selects this engine for buffers holding
+    an archive; :code:`bytes` are told apart from paths by their magic
+    number and NUL bytes.
+
+    Args:
+
+      buffer (bytes-like): Content of the archive, any object
+        supporting the buffer protocol, e.g. :code:`bytes`,
+        :code:`bytearray`, :code:`memoryview` or
+        :class:`mmap.mmap`. It must not be modified while the archive
+        is open.
+
+      mode (str): Must be a read mode, e.g. :code:`'r'`. Tar read
+        modes such as :code:`'r:gz'` are also accepted.
+
+      kwargs: Other keyword arguments passed to the engine of the
+        format.
+
+    Note:
+
+      The buffer is exported until the archive and the member files
+      are closed and the views returned by :meth:`member_view` are
+      released, so e.g. an :class:`mmap.mmap` cannot be closed before.
+
+    Examples:
+
+      >>> import io, zipfile
+      >>> f = io.BytesIO()
+      >>> with zipfile.ZipFile(f, 'w') as zf:
+      ...     zf.writestr('a.txt', 'hello')
+      >>> with BufferArchive(f.getvalue()) as ar:
+      ...     print(ar.member_names, bytes(ar.member_view('a.txt')))
+      ['a.txt'] b'hello'
+
+    """
+    def __new__(cls, buffer, mode='r', **kwargs):
+        if cls is BufferArchive:
+            fmt = _buffer_format(buffer)
+            if fmt == 'zip':
+                cls = _BufferZipArchive
+            elif fmt == 'tar':
+                cls = _BufferTarArchive
+            else:
+                raise ValueError('buffer does not hold a zip or tar archive')
+        return super(BufferArchive, cls).__new__(cls)
+
+    def __init__(self, buffer, mode='r', **kwargs):
+        if 'r' not in mode:
+            raise ValueError('BufferArchive can only be opened in read mode')
+        self._view = _as_view(buffer)
+        self._buffer_file = _BufferFile(self._view)
+        super(BufferArchive, self).__init__(self._buffer_file, mode, **kwargs)
+
+    def _stored_span(self, name):
+        """Get the location of a member stored without compression
+
+        Args:
+
+          name (str): Name of the member.
+
+        Return:
+
+          tuple, NoneType: :code:`(offset, size)` of the member data
+          in the buffer, or None if the member is compressed, encrypted
+          or not a regular file.
+        """
+        raise NotImplementedError
+
+    def member_view(self, name):
+        """Get the content of a member without copying it
+
+        Args:
+
+          name (str): Name of the member, which must be stored without
+            compression.
+
+        Return:
+
+          memoryview: Read-only slice of the buffer holding the content
+          of the member.
+        """
+        name = self.validate_member_name(name)
+        span = self._stored_span(name)
+        if span is None:
+            raise ValueError('member {} is not stored without compression'
+                             .format(name))
+        offset, size = span
+        return self._view[offset:offset+size].toreadonly()
+
+    def open_member(self, name, mode='r', seekable=None, **kwargs):
+        """Open a member file in the archive
+
+        Members stored without compression are opened as seekable file
+        objects over their slice of the buffer, whatever the value of
+        :code:`seekable`. Other members are opened by the engine of the
+        format, see :meth:`ZipArchive.open_member` and
+        :meth:`TarArchive.open_member`.
+        """
+        _check_seekable(seekable, mode)
+        if 'r' in mode and not kwargs:
+            name = self.validate_member_name(name)
+            span = self._stored_span(name)
+            if span is not None:
+                offset, size = span
+                f = _BufferFile(self._view[offset:offset+size])
+                if 'b' not in mode:
+                    f = io.TextIOWrapper(io.BufferedReader(f))
+                return f
+        return super(BufferArchive, self).open_member(name, mode, seekable,
+                                                      **kwargs)
+
+    def _read_member_data(self, name):
+        span = self._stored_span(self.validate_member_name(name))
+        if span is None:
+            return super(BufferArchive, self)._read_member_data(name)
+        offset, size = span
+        return self._view[offset:offset+size].tobytes()
+
+    def _raw_source(self):
+        # an independent reader per caller, no lock needed
+        return _FileRange(_BufferFile(self._view[:]), close=True)
+
+    def _close(self):
+        super(BufferArchive, self)._close()
+        self._buffer_file.close()
+        self._view.release()
+
+
+class _BufferZipArchive(BufferArchive, ZipArchive):
+    def _stored_span(self, name):
+        info = self._file.getinfo(name)
+        if (name.endswith('/') or info.flag_bits & 0x1 or
+            info.compress_type != zipfile.ZIP_STORED):
+            return None
+        source = self._raw_source()
+        try:
+            return self._data_offset(source, info), info.file_size
+        finally:
+            source.close()
+
+
+class _BufferTarArchive(BufferArchive, TarArchive):
+    def _stored_span(self, name):
+        if name.endswith('/') or self._compression() != '':
+            return None
+        info = self._member_info(name)
+        if info.islnk():
+            info = self._member_info(info.linkname)
+        if not info.isreg() or info.issparse():
+            return None
+        return info.offset_data, info.size
+
+    def _raw_source(self):
+        return super(_BufferTarArchive, self)._raw_source(), 0
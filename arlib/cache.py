@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""Process-wide cache of decompressed member blocks
+
+When a cache is installed with :func:`set_block_cache`, members opened
+for reading with :meth:`arlib.Archive.open_member` are decoded in
+blocks, and every block is looked up in the cache before it is
+decompressed. Blocks are keyed by (archive identity, member name,
+block index), where the archive identity includes the size and
+modification time of the archive file, so a rewritten archive never
+hits stale blocks.
+
+"""
+
+import os
+import hashlib
+import threading
+import collections
+
+
+_block_cache = None
+
+
+def set_block_cache(cache):
+    """Install the process-wide block cache
+
+    Args:
+
+      cache (BlockCache, NoneType): The cache to use, or None to
+        disable caching.
+
+    Return:
+
+      BlockCache, NoneType: The previously installed cache.
+    """
+    global _block_cache
+    previous = _block_cache
+    _block_cache = cache
+    return previous
+
+
+def get_block_cache():
+    """Get the process-wide block cache
+
+    Return:
+
+      BlockCache, NoneType: The installed cache, or None if caching is
+      disabled.
+    """
+    return _block_cache
+
+
+class _DiskTier(object):
+    """LRU store of blocks as files in a local directory"""
+
+    def __init__(self, directory, max_bytes):
+        self._dir = directory
+        self._max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self._dir, digest)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def pop(self, key):
+        size = self._entries.pop(key, None)
+        if size is None:
+            return None
+        self._bytes -= size
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.remove(path)
+        except (IOError, OSError): #pragma no cover
+            return None
+        return data
+
+    def put(self, key, data):
+        if len(data) > self._max_bytes:
+            return
+        if key in self._entries:
+            return
+        with open(self._path(key), 'wb') as f:
+            f.write(data)
+        self._entries[key] = len(data)
+        self._bytes += len(data)
+        while self._bytes > self._max_bytes:
+            old, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            try:
+                os.remove(self._path(old))
+            except (IOError, OSError): #pragma no cover
+                pass
+
+    def clear(self):
+        for key in list(self._entries):
+            try:
+                os.remove(self._path(key))
+            except (IOError, OSError): #pragma no cover
+                pass
+        self._entries.clear()
+        self._bytes = 0
+
+
+class BlockCache(object):
+    """Size-bounded cache of decompressed blocks
+
+    Args:
+
+      max_bytes (int): Maximum total size of the blocks held in
+        memory. Default to 256 MiB.
+
+      policy (str): Eviction policy, :code:`'lru'` (least recently
+        used, default) or :code:`'arc'` (adaptive replacement cache,
+        which resists being flushed by a single scan over a large
+        archive).
+
+      spill_dir (str, NoneType): If given, blocks evicted from memory
+        are written to files in this directory, and are read back
+        instead of being decompressed again.
+
+      spill_bytes (int): Maximum total size of the blocks in
+        :code:`spill_dir`. Default to 1 GiB.
+
+    Examples:
+
+      >>> cache = BlockCache(max_bytes=10)
+      >>> cache.put(('a.zip', 'x', 0), b'12345')
+      >>> cache.get(('a.zip', 'x', 0))
+      b'12345'
+      >>> cache.get(('a.zip', 'x', 1)) is None
+      True
+      >>> cache.hits, cache.misses
+      (1, 1)
+
+    """
+    def __init__(self, max_bytes=256*1024*1024, policy='lru',
+                 spill_dir=None, spill_bytes=1024*1024*1024):
+        if policy not in ('lru', 'arc'):
+            raise ValueError('policy must be "lru" or "arc", got '
+                             +repr(policy))
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self._lock = threading.Lock()
+        self._disk = None
+        if spill_dir is not None:
+            self._disk = _DiskTier(spill_dir, spill_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self._reset()
+
+    def _reset(self):
+        # t1/t2 hold resident blocks, b1/b2 the sizes of recently
+        # evicted keys (ghosts). With the LRU policy only t1 is used.
+        self._t1 = collections.OrderedDict()
+        self._t2 = collections.OrderedDict()
+        self._b1 = collections.OrderedDict()
+        self._b2 = collections.OrderedDict()
+        self._t1_bytes = self._t2_bytes = 0
+        self._b1_bytes = self._b2_bytes = 0
+        self._p = 0
+
+    @property
+    def nbytes(self):
+        """Total size of the blocks held in memory"""
+        return self._t1_bytes + self._t2_bytes
+
+    def __len__(self):
+        return len(self._t1) + len(self._t2)
+
+    def stats(self):
+        """Get the counters of the cache
+
+        Return:
+
+          dict: Numbers of hits, misses, hits served by the disk tier
+          and evictions from memory, number and total size of blocks
+          in memory, and number of blocks on disk.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'disk_hits': self.disk_hits,
+                    'evictions': self.evictions, 'blocks': len(self),
+                    'bytes': self.nbytes,
+                    'disk_blocks': len(self._disk) if self._disk else 0}
+
+    def get(self, key):
+        """Look up a block
+
+        Args:
+
+          key (tuple): Hashable key of the block.
+
+        Return:
+
+          bytes, NoneType: The block, or None on a miss.
+        """
+        with self._lock:
+            data = self._t1.pop(key, None)
+            if data is not None:
+                if self.policy == 'arc':
+                    self._t1_bytes -= len(data)
+                    self._t2[key] = data
+                    self._t2_bytes += len(data)
+                else:
+                    self._t1[key] = data
+                self.hits += 1
+                return data
+            data = self._t2.get(key)
+            if data is not None:
+                self._t2.move_to_end(key)
+                self.hits += 1
+                return data
+            if self._disk is not None:
+                data = self._disk.pop(key)
+                if data is not None:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self._insert(key, data)
+                    return data
+            self.misses += 1
+            return None
+
+    def put(self, key, data):
+        """Insert a block
+
+        Blocks larger than :attr:`max_bytes` are not cached.
+
+        Args:
+
+          key (tuple): Hashable key of the block.
+
+          data (bytes): Content of the block.
+        """
+        data = bytes(data)
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._t1 or key in self._t2:
+                return
+            self._insert(key, data)
+
+    def _insert(self, key, data):
+        size = len(data)
+        if self.policy == 'lru':
+            self._t1[key] = data
+            self._t1_bytes += size
+        elif key in self._b1:
+            ratio = max(self._b2_bytes / float(max(self._b1_bytes, 1)), 1)
+            self._p = min(self.max_bytes, self._p + ratio*size)
+            self._b1_bytes -= self._b1.pop(key)
+            self._t2[key] = data
+            self._t2_bytes += size
+        elif key in self._b2:
+            ratio = max(self._b1_bytes / float(max(self._b2_bytes, 1)), 1)
+            self._p = max(0, self._p - ratio*size)
+            self._b2_bytes -= self._b2.pop(key)
+            self._t2[key] = data
+            self._t2_bytes += size
+        else:
+            self._t1[key] = data
+            self._t1_bytes += size
+        while self.nbytes > self.max_bytes:
+            self._evict()
+        self._trim_ghosts()
+
+    def _evict(self):
+        if self._t1 and (self.policy == 'lru' or not self._t2 or
+                         self._t1_bytes > self._p):
+            key, data = self._t1.popitem(last=False)
+            self._t1_bytes -= len(data)
+            if self.policy == 'arc':
+                self._b1[key] = len(data)
+                self._b1_bytes += len(data)
+        else:
+            key, data = self._t2.popitem(last=False)
+            self._t2_bytes -= len(data)
+            self._b2[key] = len(data)
+            self._b2_bytes += len(data)
+        self.evictions += 1
+        if self._disk is not None:
+            self._disk.put(key, data)
+
+    def _trim_ghosts(self):
+        while self._b1 and self._t1_bytes + self._b1_bytes > self.max_bytes:
+            self._b1_bytes -= self._b1.popitem(last=False)[1]
+        while self._b2 and (self.nbytes + self._b1_bytes + self._b2_bytes
+                            > 2*self.max_bytes):
+            self._b2_bytes -= self._b2.popitem(last=False)[1]
+
+    def clear(self):
+        """Remove all blocks, in memory and on disk, and reset the counters
+        """
+        with self._lock:
+            self._reset()
+            if self._disk is not None:
+                self._disk.clear()
+            self.hits = self.misses = self.disk_hits = self.evictions = 0
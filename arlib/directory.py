@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Engine treating a directory as an archive
+"""
+
+import os
+import shutil
+
+from ._compat import builtins
+from .archive import (Archive, _check_seekable, _file_identity,
+                      _COPY_CHUNK)
+from .seekable import IndexedReader, SliceDecoder, _FileRange
+
+
+class DirArchive(Archive):
+    """Archive engine that treat a directory as an archive using `pathlib`
+    module
+    """
+    def __init__(self, path, mode='r'):
+        self._file = os.path.abspath(path)
+        
+
+    @property
+    def member_names(self):
+        names = []
+        for p, dirs, files in os.walk(self._file):
+            # sort so that the order does not depend on the file
+            # system, e.g. for :meth:`Archive.shard`
+            dirs.sort()
+            files.sort()
+            dirnames = [os.path.relpath(os.path.join(p, x), self._file)+'/'
+                        for x in dirs]
+            names += dirnames
+            fnames = [os.path.relpath(os.path.join(p, x), self._file)
+                      for x in files]
+            names += fnames
+            names = [x.replace('\\', '/') for x in names]
+        return names
+
+    
+    def open_member(self, name, mode='r', seekable=None, **kwargs):
+        """Open a member in the directory
+
+        Args:
+
+          name (str): Name of the member file
+
+          mode (str): The mode argument to open. Same as in :func:`open`.
+
+          seekable (str, bool, NoneType): None, False or
+            :code:`'indexed'`. Files in a directory are seekable
+            already, so :code:`'indexed'` returns the file object
+            opened by :func:`open`. See :meth:`Archive.open_member`.
+
+          kwargs: Additional keyword arguments that will be passed
+            to :func:`open`
+        
+        Return:
+
+          file-like: The opened file object associated with the member
+          file.
+
+        """
+        _check_seekable(seekable, mode)
+        if 'r' in mode:
+            name = self.validate_member_name(name)
+            if name.endswith('/'):
+                raise ValueError('Directory member cannot be opened.')
+            if (seekable is None and not kwargs and
+                self._block_cache_options(name) is not None):
+                return self._open_indexed(name, mode)
+        path = os.path.join(self._file, name)
+        return builtins.open(path, mode, **kwargs)
+
+
+    def _iter_member_info(self):
+        for name in self.member_names:
+            st = os.stat(os.path.join(self._file, name))
+            is_dir = name.endswith('/')
+            size = 0 if is_dir else st.st_size
+            yield (name, size, size, -1, -1, st.st_mtime, is_dir)
+
+
+    def _member_cache_key(self, name):
+        return _file_identity(os.path.join(self._file, name))
+
+
+    def _indexed_reader(self, name, **kwargs):
+        path = os.path.join(self._file, name)
+        size = os.path.getsize(path)
+        source = _FileRange(builtins.open(path, 'rb'), close=True)
+        return IndexedReader(SliceDecoder(source, 0, size), size=size,
+                             **kwargs)
+
+    
+    def _write_member(self, name, fileobj, size):
+        path = os.path.join(self._file, name)
+        parent = os.path.dirname(path)
+        if not os.path.isdir(parent):
+            os.makedirs(parent)
+        with builtins.open(path, 'wb') as f:
+            shutil.copyfileobj(fileobj, f, _COPY_CHUNK)
+
+
+    def _write_dir(self, name):
+        path = os.path.join(self._file, name)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+
+    def _write_duplicate(self, name, original, source):
+        path = os.path.join(self._file, name)
+        parent = os.path.dirname(path)
+        if not os.path.isdir(parent):
+            os.makedirs(parent)
+        try:
+            os.link(os.path.join(self._file, original), path)
+        except (OSError, AttributeError): #pragma no cover
+            # existing file, or no hardlinks on this file system
+            super(DirArchive, self)._write_duplicate(name, original, source)
+
+    
+    def extract(self, path=None, members=None, chunk_size=None,
+                max_memory=None):
+        """Extract members to a location
+
+        Files are copied by :func:`shutil.copyfile`, which copies in
+        the kernel where the platform allows it, so no chunk goes
+        through Python and :code:`chunk_size` and :code:`max_memory`
+        are accepted for compatibility only.
+
+        Args:
+
+          path (path-like): Location of the extracted files.
+
+          members (Seq[str]): Members to extract, specified by a list
+            of names.
+
+        """
+        if path is None: #pragma no cover
+            path = '.'
+        if os.path.samefile(self._file, path): #pragma no cover
+            return
+        
+        if members is None:
+            members = self.member_names
+        else:
+            members = [self.validate_member_name(x) for x in members]
+        for name in members:
+            fname = os.path.join(path, name)
+            if self.member_is_dir(name):
+                if not os.path.isdir(fname):
+                    os.makedirs(fname)
+            else:
+                parent = os.path.dirname(fname)
+                if not os.path.isdir(parent):
+                    os.makedirs(parent)
+                shutil.copyfile(os.path.join(self._file, name), fname)
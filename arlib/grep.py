@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Search of regular expressions in archive members
+
+Members are decompressed and scanned in chunks, so memory use does not
+depend on the size of the members. Consecutive chunks overlap by
+:code:`overlap` bytes, so a match crossing a chunk boundary is found
+as long as it is not longer than :code:`overlap` bytes. Longer
+matches crossing a boundary may be missed or cut short, so the
+overlap should be at least the length of the longest expected match.
+
+Decompression with :mod:`zlib`, :mod:`bz2` and :mod:`lzma` releases
+the GIL, so threads decompress members in parallel, while matching
+with :mod:`re` holds it. For CPU bound searches over many archives,
+:func:`arlib.search` can use processes instead.
+
+"""
+
+import re
+import collections
+
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+DEFAULT_OVERLAP = 4096
+
+
+def _compile(pattern, flags=0):
+    # Compile a pattern matching bytes
+    if hasattr(pattern, 'finditer'):
+        if isinstance(pattern.pattern, bytes):
+            return pattern
+        flags = pattern.flags & ~re.UNICODE
+        pattern = pattern.pattern
+    if not isinstance(pattern, bytes):
+        pattern = pattern.encode('utf-8')
+    return re.compile(pattern, flags)
+
+
+def _check_overlap(overlap):
+    if overlap < 1:
+        raise ValueError('overlap must be at least 1, got {}'
+                         .format(overlap))
+
+
+def scan(read, pattern, chunk_size=DEFAULT_CHUNK_SIZE,
+         overlap=DEFAULT_OVERLAP):
+    """Find the non-overlapping matches of a pattern in a stream
+
+    Args:
+
+      read (callable): Function taking a number of bytes and returning
+        at most that many bytes of the stream, and :code:`b''` at the
+        end of the stream, e.g. the :code:`read` method of a binary
+        file object.
+
+      pattern (bytes, str, re.Pattern): Regular expression. A
+        :code:`str` pattern is encoded in UTF-8.
+
+      chunk_size (int): Number of bytes read at a time.
+
+      overlap (int): Number of bytes kept from a chunk to look for
+        matches crossing into the next one, at least 1. Matches
+        longer than :code:`overlap` crossing a chunk boundary may be
+        missed or cut short.
+
+    Return:
+
+      iterator: Iterator of :code:`(offset, data)` tuples of the
+      non-empty matches, ordered by offset.
+
+    Examples:
+
+      >>> import io
+      >>> f = io.BytesIO(b'abc-needle-abc-needle')
+      >>> list(scan(f.read, b'needle', chunk_size=4, overlap=8))
+      [(4, b'needle'), (15, b'needle')]
+
+    """
+    _check_overlap(overlap)
+    regex = _compile(pattern)
+    buffer = b''
+    base = 0
+    next_start = 0
+    while True:
+        chunk = read(chunk_size)
+        eof = not chunk
+        buffer = buffer + chunk if buffer else chunk
+        # matches starting after the cutoff are searched again with
+        # the next chunk, which may extend them
+        cutoff = len(buffer) if eof else len(buffer) - overlap
+        if cutoff > 0:
+            for m in regex.finditer(buffer, max(next_start - base, 0)):
+                if not eof and (m.start() >= cutoff or
+                                m.end() == len(buffer)):
+                    cutoff = m.start()
+                    break
+                if m.end() > m.start():
+                    yield base + m.start(), m.group()
+                    next_start = base + m.end()
+        if eof:
+            return
+        keep = max(cutoff, 0)
+        buffer = buffer[keep:]
+        base += keep
+
+
+class _NullLock(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+
+def _search_member(archive, name, regex, chunk_size, overlap, lock):
+    with lock:
+        f = archive.open_member(name, 'rb')
+
+    def read(n):
+        with lock:
+            return f.read(n)
+    try:
+        return [(name, offset, data) for offset, data in
+                scan(read, regex, chunk_size, overlap)]
+    finally:
+        f.close()
+
+
+def search_archive(archive, pattern, members=None, workers=2,
+                   chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_OVERLAP):
+    """Search the members of an opened archive, see
+    :meth:`arlib.Archive.search`
+    """
+    _check_overlap(overlap)
+    regex = _compile(pattern)
+    if members is None:
+        members = [x for x in archive.member_names if not x.endswith('/')]
+    else:
+        members = [archive.validate_member_name(x) for x in members]
+    lock = archive._member_read_lock() or _NullLock()
+    if archive._is_solid():
+        # members of a compressed stream are decoded in archive order
+        workers = 1
+    if workers <= 1:
+        for name in members:
+            for match in _search_member(archive, name, regex, chunk_size,
+                                        overlap, lock):
+                yield match
+        return
+    import concurrent.futures
+    pool = concurrent.futures.ThreadPoolExecutor(workers)
+    pending = collections.deque()
+    members = iter(members)
+    try:
+        for name in members:
+            pending.append(pool.submit(_search_member, archive, name, regex,
+                                       chunk_size, overlap, lock))
+            if len(pending) > 2 * workers:
+                for match in pending.popleft().result():
+                    yield match
+        while pending:
+            for match in pending.popleft().result():
+                yield match
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+
+def _search_path(path, pattern, members, chunk_size, overlap):
+    # Search one archive, in a worker thread or process
+    import arlib
+    with arlib.open(path) as ar:
+        return list(search_archive(ar, pattern, members, 1, chunk_size,
+                                   overlap))
+
+
+def search_paths(paths, pattern, members=None, workers=4, processes=False,
+                 chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_OVERLAP):
+    """Search the members of several archives, see :func:`arlib.search`
+    """
+    _check_overlap(overlap)
+    regex = _compile(pattern)
+    import concurrent.futures
+    if processes:
+        pool = concurrent.futures.ProcessPoolExecutor(max(workers, 1))
+    else:
+        pool = concurrent.futures.ThreadPoolExecutor(max(workers, 1))
+    pending = collections.deque()
+    try:
+        for path in paths:
+            pending.append((path, pool.submit(_search_path, path, regex,
+                                              members, chunk_size, overlap)))
+            if len(pending) > 2 * workers:
+                path, future = pending.popleft()
+                for match in future.result():
+                    yield (path,) + match
+        while pending:
+            path, future = pending.popleft()
+            for match in future.result():
+                yield (path,) + match
+    finally:
+        for _, future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
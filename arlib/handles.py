@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""Process-wide cache of opened archives
+
+When a cache is installed with :func:`set_handle_cache`, archives
+opened for reading by path with :func:`arlib.open` are kept open after
+being closed, and opening the same path again returns an archive
+sharing the state of the first one, skipping engine determination,
+opening of the file and parsing of the member index. Archives are
+keyed by the identity of the file (real path, size and modification
+time), the engine and the keyword arguments, so a rewritten archive
+is opened again.
+
+The number of open archives is bounded: when it exceeds
+:code:`max_open`, the least recently used archives not in use are
+closed.
+
+"""
+
+import os
+import threading
+import collections
+
+
+_handle_cache = None
+
+
+def set_handle_cache(cache):
+    """Install the process-wide archive handle cache
+
+    Args:
+
+      cache (HandleCache, NoneType): The cache to use, or None to
+        disable caching.
+
+    Return:
+
+      HandleCache, NoneType: The previously installed cache.
+    """
+    global _handle_cache
+    previous = _handle_cache
+    _handle_cache = cache
+    return previous
+
+
+def get_handle_cache():
+    """Get the process-wide archive handle cache
+
+    Return:
+
+      HandleCache, NoneType: The installed cache, or None if caching is
+      disabled.
+    """
+    return _handle_cache
+
+
+class HandleCache(object):
+    """LRU cache of opened archives bounded by the number of open files
+
+    Every archive returned by :meth:`acquire` is a distinct object
+    leased to the caller until its :meth:`~arlib.Archive.close` method
+    is called; closing it again has no effect. Only archives without
+    leases are closed on eviction, so the number of open archives
+    exceeds :code:`max_open` only while more archives than that are
+    in use.
+
+    Note that a cached archive is shared by all the callers opening
+    the same path, so members of the same archive should not be read
+    concurrently from several threads unless the engine supports it.
+
+    Args:
+
+      max_open (int): Maximum number of open archives.
+
+    Examples:
+
+      >>> import arlib
+      >>> path = os.path.dirname(arlib.__file__)
+      >>> cache = HandleCache(max_open=2)
+      >>> previous = set_handle_cache(cache)
+      >>> with arlib.open(path) as ar:
+      ...     pass
+      >>> with arlib.open(path) as ar2:
+      ...     ar2._file is ar._file
+      True
+      >>> cache.hits, cache.misses
+      (1, 1)
+      >>> _ = set_handle_cache(previous)
+      >>> cache.clear()
+
+    """
+    def __init__(self, max_open=128):
+        self.max_open = max_open
+        self._lock = threading.Lock()
+        # key -> archive, whose _handle_leases maps the id of every
+        # leased handle to the handle
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(path, engine=None, kwargs=None):
+        """Build the key of an archive
+
+        Args:
+
+          path (path-like): Path of the archive.
+
+          engine (type, NoneType): Engine the archive is opened with.
+
+          kwargs (dict): Keyword arguments of the engine.
+
+        Return:
+
+          tuple, NoneType: Hashable key, or None if the archive cannot
+          be cached, e.g. if a keyword argument is not hashable.
+        """
+        try:
+            st = os.stat(path)
+            key = (os.path.realpath(path), st.st_size, st.st_mtime, engine,
+                   frozenset((kwargs or {}).items()))
+            hash(key)
+        except (OSError, TypeError, ValueError):
+            return None
+        return key
+
+    def stats(self):
+        """Get the counters of the cache
+
+        Return:
+
+          dict: Numbers of hits, misses and evictions, and numbers of
+          open archives and of archives in use.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'open': len(self),
+                    'in_use': sum(1 for x in self._entries.values()
+                                  if x._handle_leases)}
+
+    def acquire(self, key, opener):
+        """Get the archive of :code:`key`, opening it if needed
+
+        Args:
+
+          key (tuple): Key built by :meth:`key`.
+
+          opener (callable): Callable without arguments opening the
+            archive. It is called without holding the lock of the
+            cache, so archives are opened in parallel by concurrent
+            callers.
+
+        Return:
+
+          Archive: A handle of the archive, which must be released by
+          calling its :meth:`~arlib.Archive.close` method.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._lease(entry)
+        archive = opener()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = archive
+                archive._handle_cache = self
+                archive._handle_key = key
+                archive._handle_leases = {}
+                self.misses += 1
+                archive = None
+            else:
+                # opened concurrently by another caller
+                self._entries.move_to_end(key)
+                self.hits += 1
+            handle = self._lease(entry)
+            evicted = self._trim()
+        if archive is not None:
+            archive.close()
+        self._close_all(evicted)
+        return handle
+
+    @staticmethod
+    def _lease(archive):
+        # a distinct object sharing the attributes of the archive, so
+        # that the lease of every caller is released at most once
+        handle = object.__new__(type(archive))
+        handle.__dict__ = archive.__dict__
+        archive._handle_leases[id(handle)] = handle
+        return handle
+
+    def release(self, archive):
+        """Return an archive obtained from :meth:`acquire`
+
+        Releasing the same archive again has no effect.
+        """
+        with self._lock:
+            leases = archive.__dict__.get('_handle_leases', {})
+            if leases.pop(id(archive), None) is not archive:
+                # released already
+                return
+            entry = self._entries.get(archive._handle_key)
+            if entry is not None and entry.__dict__ is archive.__dict__:
+                evicted = self._trim()
+            elif leases:
+                # dropped by clear() but still in use
+                evicted = []
+            else:
+                evicted = [archive]
+        self._close_all(evicted)
+
+    def _trim(self):
+        evicted = []
+        if len(self._entries) <= self.max_open:
+            return evicted
+        for key, archive in list(self._entries.items()):
+            if len(self._entries) <= self.max_open:
+                break
+            if not archive._handle_leases:
+                del self._entries[key]
+                evicted.append(archive)
+                self.evictions += 1
+        return evicted
+
+    def _close_all(self, archives):
+        for archive in archives:
+            archive._handle_cache = None
+            archive.close()
+
+    def clear(self):
+        """Close the archives not in use and forget all archives
+
+        Archives in use are closed when they are released.
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        idle = []
+        for archive in entries:
+            if not archive._handle_leases:
+                idle.append(archive)
+            else:
+                archive._handle_key = None
+        self._close_all(idle)
@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""Engine descriptors and discovery of engine plugins
+
+An :class:`EngineDescriptor` declares cheap facts about an engine:
+magic numbers, file name extensions, supported modes and
+capabilities. :func:`arlib.auto_engine` probes the file once and only
+calls the engine determination functions of descriptors whose facts
+match, and the engine class itself is imported only when the
+descriptor is selected.
+
+Third-party packages publish descriptors through the
+:code:`arlib.engines` entry point group, e.g. in *setup.py*:
+
+.. code-block:: python
+
+   setup(...,
+         entry_points={'arlib.engines': [
+             'sevenzip = arlib_7z.descriptor:DESCRIPTOR']})
+
+where :code:`arlib_7z/descriptor.py` is a light module defining
+
+.. code-block:: python
+
+   DESCRIPTOR = arlib.EngineDescriptor(
+       'sevenzip', 'arlib_7z.engine:SevenZipArchive',
+       magic=[b'7z\\xbc\\xaf\\x27\\x1c'], extensions=['.7z'])
+
+"""
+
+import io
+import os
+import sys
+import importlib
+
+from ._compat import builtins, _path_classes
+
+
+ENTRY_POINT_GROUP = 'arlib.engines'
+
+
+def _resolve(target):
+    # Resolve a 'module:attribute' string
+    if not isinstance(target, str):
+        return target
+    module, _, attr = target.partition(':')
+    obj = importlib.import_module(module)
+    for name in attr.split('.'):
+        obj = getattr(obj, name)
+    return obj
+
+
+def _tar_header_ok(block):
+    """Check the checksum of a tar header block"""
+    if len(block) < 512:
+        return False
+    # the checksum of a tar header is the sum of its bytes with the
+    # checksum field taken as spaces
+    try:
+        chksum = int(block[148:156].replace(b'\x00', b' ').strip() or b'-1',
+                     8)
+    except ValueError:
+        return False
+    return chksum == sum(bytearray(block[:148] + b' '*8 + block[156:512]))
+
+
+def _buffer_format(buffer):
+    """Get the format of an archive held in a buffer from its magic
+    numbers
+
+    Args:
+
+      buffer (bytes-like): The content of the archive.
+
+    Return:
+
+      str, NoneType: :code:`'zip'`, :code:`'tar'` (possibly
+      compressed) or None.
+    """
+    view = memoryview(buffer)
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    head = view[:512].tobytes()
+    if head[:4] == b'PK\x03\x04':
+        return 'zip'
+    # a tar file may end with a zip member, so the header of a tar file
+    # is checked before the end of central directory of a zip file
+    if (head[:2] == b'\x1f\x8b' or head[:3] == b'BZh' or
+        head[:6] == b'\xfd7zXZ\x00' or head[257:262] == b'ustar' or
+        _tar_header_ok(head)):
+        return 'tar'
+    if b'PK\x05\x06' in view[-65557:].tobytes():
+        return 'zip'
+    return None
+
+
+def _is_buffer_archive(obj):
+    # bytes are also paths: they hold an archive only if they start
+    # with a magic number and contain a NUL byte, which paths cannot
+    if isinstance(obj, bytes):
+        return b'\x00' in obj and _buffer_format(obj) is not None
+    mmap = sys.modules.get('mmap')
+    if (isinstance(obj, (bytearray, memoryview)) or
+        mmap is not None and isinstance(obj, mmap.mmap)):
+        return _buffer_format(obj) is not None
+    return False
+
+
+class _Probe(object):
+    """Properties of the archive argument, computed at most once"""
+
+    def __init__(self, path):
+        self.path = path
+        self._head = None
+        self._tail = None
+        if isinstance(path, bytes) and _is_buffer_archive(path):
+            self.kind = 'object'
+            self.name = None
+        elif isinstance(path, _path_classes):
+            if os.path.isdir(path):
+                self.kind = 'dir'
+            elif os.path.isfile(path):
+                self.kind = 'file'
+            else:
+                self.kind = 'missing'
+            self.name = os.fsdecode(path)
+        elif isinstance(path, io.IOBase):
+            self.kind = 'fileobj' if path.seekable() else 'stream'
+            self.name = None
+        else:
+            self.kind = 'object'
+            self.name = None
+
+    def _read(self, f, head, tail):
+        f.seek(0)
+        first = f.read(head)
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size-tail))
+        return first, f.read(tail)
+
+    def _load(self):
+        if self._head is not None:
+            return
+        self._head, self._tail = b'', b''
+        try:
+            if self.kind == 'file':
+                with builtins.open(self.path, 'rb') as f:
+                    self._head, self._tail = self._read(f, 512, 65557)
+            elif self.kind == 'fileobj' and self.path.readable():
+                pos = self.path.tell()
+                try:
+                    self._head, self._tail = self._read(self.path, 512,
+                                                        65557)
+                finally:
+                    self.path.seek(pos)
+        except (IOError, OSError): #pragma no cover
+            pass
+
+    @property
+    def head(self):
+        """First 512 bytes of the file"""
+        self._load()
+        return self._head
+
+    @property
+    def tail(self):
+        """Last 64 KiB of the file"""
+        self._load()
+        return self._tail
+
+
+class EngineDescriptor(object):
+    """Cheap description of an engine used by :func:`arlib.auto_engine`
+
+    Args:
+
+      name (str): Name of the engine.
+
+      engine (type, str): The engine class, or a
+        :code:`'module:attribute'` string which is imported only when
+        the descriptor is selected.
+
+      detect (callable, str, NoneType): Engine determination function
+        with the signature :code:`detect(path, mode)`, or a
+        :code:`'module:attribute'` string. It is called to confirm a
+        match and should return the engine class or None. If None,
+        matching the descriptor is enough to select the engine.
+
+      magic (Seq): Magic numbers, either :code:`bytes` found at the
+        beginning of the file, or :code:`(offset, bytes)` tuples with
+        :code:`offset` below 512.
+
+      tail_magic (Seq[bytes]): Byte strings searched for in the last
+        64 KiB of the file, e.g. the end of central directory
+        signature of zip files.
+
+      sniff (callable, NoneType): Function taking the first 512 bytes
+        of the file and returning whether it may be a match, for
+        formats without a fixed magic number.
+
+      extensions (Seq[str]): File name extensions, used to select the
+        engine for paths opened in write mode.
+
+      mode_suffixes (bool): Whether write modes with a suffix after
+        :code:`':'` or :code:`'|'`, e.g. the compression of
+        :code:`'w:gz'` in :mod:`tarfile`, select the engine whatever
+        the extension of the path.
+
+      modes (str): Supported archive modes among :code:`'rwax'`.
+
+      object_types (Seq[str]): :code:`'module:Class'` names of objects
+        accepted directly, e.g. :code:`'zipfile:ZipFile'`. The check
+        never imports :code:`module`.
+
+      directory (bool): Whether the engine opens directories.
+
+      streaming (bool): Whether the engine can read from and write to
+        non-seekable file objects.
+
+      random_access (bool): Whether single members can be read
+        without decoding the archive from the beginning.
+
+      priority (int, float): Priority used when the descriptor is
+        loaded from an entry point, see :func:`register_engine`.
+
+    """
+    def __init__(self, name, engine, detect=None, magic=(), tail_magic=(),
+                 sniff=None, extensions=(), modes='r', object_types=(),
+                 directory=False, streaming=False, random_access=True,
+                 priority=50, mode_suffixes=False):
+        self.name = name
+        self._engine = engine
+        self._detect = detect
+        self.magic = [x if isinstance(x, tuple) else (0, x) for x in magic]
+        self.tail_magic = list(tail_magic)
+        self.sniff = sniff
+        self.extensions = list(extensions)
+        self.mode_suffixes = mode_suffixes
+        self.modes = modes
+        self.object_types = list(object_types)
+        self.directory = directory
+        self.streaming = streaming
+        self.random_access = random_access
+        self.priority = priority
+
+    def __repr__(self):
+        return 'EngineDescriptor({!r})'.format(self.name)
+
+    @property
+    def engine(self):
+        """The engine class, imported on first access"""
+        self._engine = _resolve(self._engine)
+        return self._engine
+
+    def _instance_of_object_type(self, obj):
+        for target in self.object_types:
+            module, _, cls = target.partition(':')
+            module = sys.modules.get(module)
+            if module is not None and isinstance(obj, getattr(module, cls)):
+                return True
+        return False
+
+    def _magic_matches(self, probe):
+        if not (self.magic or self.tail_magic or self.sniff):
+            return True
+        head = probe.head
+        if any(head[offset:offset+len(x)] == x for offset, x in self.magic):
+            return True
+        if any(x in probe.tail for x in self.tail_magic):
+            return True
+        return self.sniff is not None and self.sniff(head)
+
+    def may_match(self, probe, mode):
+        """Check whether the engine may open the probed archive
+
+        Args:
+
+          probe (_Probe): Properties of the archive argument.
+
+          mode (str): Mode to open the archive.
+
+        Return:
+
+          bool: False if the engine certainly cannot open the
+          archive, True otherwise.
+        """
+        kind = probe.kind
+        if kind == 'object':
+            return self._instance_of_object_type(probe.path)
+        if kind == 'dir':
+            return self.directory
+        if not any(x in self.modes for x in mode if x in 'rwax'):
+            return False
+        if self.directory:
+            return False
+        if 'r' in mode:
+            if kind == 'stream':
+                return self.streaming
+            if kind == 'missing':
+                return False
+            if kind == 'fileobj' and not probe.path.readable():
+                # let the determination function report the error
+                return True
+            return self._magic_matches(probe)
+        if self.mode_suffixes and len(mode) > 1 and mode[1] in ':|':
+            return True
+        if probe.name is not None and self.extensions:
+            return any(probe.name.endswith(x) for x in self.extensions)
+        return kind != 'fileobj' or self.streaming
+
+    def __call__(self, path, mode):
+        if self._detect is None:
+            return self.engine
+        self._detect = _resolve(self._detect)
+        return self._detect(path, mode)
+
+
+def _read_entry_points(path, group):
+    # Minimal parser of entry_points.txt, see
+    # https://packaging.python.org/specifications/entry-points/
+    entries = []
+    section = None
+    with builtins.open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line[0] in '#;':
+                continue
+            if line.startswith('[') and line.endswith(']'):
+                section = line[1:-1].strip()
+            elif section == group and '=' in line:
+                name, _, value = line.partition('=')
+                entries.append((name.strip(), value.split('[')[0].strip()))
+    return entries
+
+
+def iter_entry_points(group=ENTRY_POINT_GROUP):
+    """Find entry points of installed distributions
+
+    Metadata files are read directly from the directories on
+    :data:`sys.path`, instead of through :mod:`importlib.metadata`
+    which is much more expensive to import than the lookup itself.
+
+    Args:
+
+      group (str): Entry point group.
+
+    Return:
+
+      iterator: Iterator of :code:`(name, 'module:attribute')`
+      tuples.
+    """
+    for entry in sys.path:
+        if not entry or not os.path.isdir(entry):
+            continue
+        try:
+            names = os.listdir(entry)
+        except OSError: #pragma no cover
+            continue
+        for name in sorted(names):
+            if not name.endswith(('.dist-info', '.egg-info')):
+                continue
+            path = os.path.join(entry, name, 'entry_points.txt')
+            if os.path.isfile(path):
+                for item in _read_entry_points(path, group):
+                    yield item
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""Seekable file objects over HTTP range requests
+
+:class:`HTTPRangeFile` lets the engines read archives stored behind
+an HTTP server, e.g. an object store, without downloading them: only
+the byte ranges actually read are requested. For a zip file this is
+the end of the file holding the central directory, and the local
+header and data of the members opened.
+
+.. code-block:: python
+
+   with arlib.open(arlib.HTTPRangeFile(url)) as ar:
+       data = ar.open_member('a.txt', 'rb').read()
+
+"""
+
+import io
+import os
+import sys
+import threading
+import collections
+
+if sys.version_info[0] == 2: #pragma no cover
+    import httplib
+    from urlparse import urlsplit
+else: #pragma no cover
+    import http.client as httplib
+    from urllib.parse import urlsplit
+
+
+DEFAULT_BLOCK_SIZE = 256 * 1024
+
+
+class HTTPRangeFile(io.RawIOBase):
+    """Read-only seekable file object reading a URL with range requests
+
+    The file is handled in blocks of :code:`block_size` bytes.
+    Recently read blocks are kept in memory, and a read spanning
+    several missing blocks fetches them in a single request.
+
+    Args:
+
+      url (str): The :code:`http://` or :code:`https://` URL of the
+        file. The server must support range requests.
+
+      block_size (int): Size of the blocks requested from the server.
+
+      cache_blocks (int): Number of blocks kept in memory when
+        :code:`cache` is None.
+
+      max_request_blocks (int): Maximum number of blocks fetched by a
+        single request.
+
+      headers (dict): Additional headers sent with every request, e.g.
+        :code:`Authorization`.
+
+      timeout (float): Timeout of the requests in seconds.
+
+      cache (BlockCache, NoneType): Shared cache to look blocks up in,
+        see :mod:`arlib.cache`.
+
+    Attributes:
+
+      requests (int): Number of requests sent.
+
+      bytes_fetched (int): Number of bytes received.
+
+    """
+    def __init__(self, url, block_size=DEFAULT_BLOCK_SIZE, cache_blocks=64,
+                 max_request_blocks=64, headers=None, timeout=30.0,
+                 cache=None):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError('unsupported URL scheme: '+repr(parts.scheme))
+        self.url = url
+        self.name = url
+        self._scheme = parts.scheme
+        self._netloc = parts.netloc
+        self._target = parts.path or '/'
+        if parts.query:
+            self._target += '?' + parts.query
+        self._block_size = block_size
+        self._cache_blocks = cache_blocks
+        self._max_request_blocks = max(max_request_blocks, 1)
+        self._headers = dict(headers or {})
+        self._timeout = timeout
+        self._cache = cache
+        self._blocks = collections.OrderedDict()
+        self._lock = threading.RLock()
+        self._conn = None
+        self._pos = 0
+        self._size = None
+        self._validator = None
+        self.requests = 0
+        self.bytes_fetched = 0
+        # the first request also tells the size of the file
+        self._fetch(0, 0)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            pos = offset
+        elif whence == os.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == os.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError('invalid whence ({}, should be 0, 1 or 2)'
+                             .format(whence))
+        if pos < 0:
+            raise ValueError('negative seek position {}'.format(pos))
+        self._pos = pos
+        return pos
+
+    @property
+    def size(self):
+        """Size of the remote file in bytes"""
+        return self._size
+
+    def _connection(self):
+        if self._conn is None:
+            if self._scheme == 'https':
+                cls = httplib.HTTPSConnection
+            else:
+                cls = httplib.HTTPConnection
+            self._conn = cls(self._netloc, timeout=self._timeout)
+        return self._conn
+
+    def _request(self, begin, end):
+        headers = dict(self._headers)
+        headers['Range'] = 'bytes={}-{}'.format(begin, end)
+        if self._validator is not None:
+            headers['If-Range'] = self._validator
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request('GET', self._target, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (httplib.HTTPException, IOError, OSError):
+                # the server may have closed a kept-alive connection
+                conn.close()
+                self._conn = None
+                if attempt:
+                    raise
+        self.requests += 1
+        self.bytes_fetched += len(data)
+        if response.status == 416 and self._size is None:
+            # empty file
+            data = b''
+        elif response.status != 206:
+            if self._validator is not None and response.status == 200:
+                raise IOError('{} changed while being read'.format(self.url))
+            raise IOError('range request to {} failed with status {} {}'
+                          .format(self.url, response.status,
+                                  response.reason))
+        if self._size is None:
+            content_range = response.getheader('Content-Range', '')
+            total = content_range.rpartition('/')[2]
+            if not total.isdigit():
+                raise IOError('size of {} is unknown'.format(self.url))
+            self._size = int(total)
+            self._validator = response.getheader('ETag')
+        return data
+
+    def _key(self, i):
+        return ('http', self.url, self._size, self._validator,
+                self._block_size, i)
+
+    def _get_block(self, i):
+        if self._cache is not None:
+            return self._cache.get(self._key(i))
+        data = self._blocks.get(i)
+        if data is not None:
+            self._blocks.move_to_end(i)
+        return data
+
+    def _put_block(self, i, data):
+        if self._cache is not None:
+            self._cache.put(self._key(i), data)
+            return
+        self._blocks[i] = data
+        while len(self._blocks) > self._cache_blocks:
+            self._blocks.popitem(last=False)
+
+    def _fetch(self, first, last):
+        # Fetch blocks [first, last] with one request
+        begin = first * self._block_size
+        end = (last + 1) * self._block_size
+        if self._size is not None:
+            end = min(end, self._size)
+        data = self._request(begin, end - 1)
+        blocks = {}
+        for i in range(first, last + 1):
+            offset = (i - first) * self._block_size
+            blocks[i] = data[offset:offset+self._block_size]
+            self._put_block(i, blocks[i])
+        return blocks
+
+    def _read_blocks(self, first, last):
+        blocks = {}
+        missing = []
+        for i in range(first, last + 1):
+            data = self._get_block(i)
+            if data is None:
+                missing.append(i)
+            else:
+                blocks[i] = data
+        # coalesce runs of consecutive missing blocks
+        start = 0
+        while start < len(missing):
+            stop = start + 1
+            while (stop < len(missing) and
+                   missing[stop] == missing[stop-1] + 1 and
+                   stop - start < self._max_request_blocks):
+                stop += 1
+            blocks.update(self._fetch(missing[start], missing[stop-1]))
+            start = stop
+        return [blocks[i] for i in range(first, last + 1)]
+
+    def read(self, n=-1):
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+        end = self._size
+        if n is not None and n >= 0:
+            end = min(end, self._pos + n)
+        if end <= self._pos:
+            return b''
+        first = self._pos // self._block_size
+        last = (end - 1) // self._block_size
+        with self._lock:
+            blocks = self._read_blocks(first, last)
+        skip = self._pos - first * self._block_size
+        data = b''.join(blocks)[skip:skip+end-self._pos]
+        self._pos += len(data)
+        return data
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        n = len(data)
+        b[:n] = data
+        return n
+
+    def close(self):
+        if not self.closed:
+            with self._lock:
+                self._blocks.clear()
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+        super(HTTPRangeFile, self).close()
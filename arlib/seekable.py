@@ -0,0 +1,474 @@
+# -*- coding: utf-8 -*-
+"""Random-access readers for compressed archive members
+
+The readers in this module decode a member sequentially, but remember
+enough of the decoder state along the way (*checkpoints*) so that a
+later backward seek restarts from the closest checkpoint instead of
+from the beginning of the member or archive. Decoded data is handled
+in fixed size blocks, and recently used blocks are kept in memory so
+that small back-and-forth seeks do not touch the decoder at all.
+
+"""
+
+import io
+import os
+import zlib
+import bisect
+import collections
+
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+DEFAULT_CHECKPOINT_INTERVAL = 1024 * 1024
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class _FileRange(object):
+    """Positional reads from a (possibly shared) binary file object
+
+    Args:
+
+      fileobj (file-like): Opened binary file object supporting
+        :code:`seek` and :code:`read`.
+
+      close (bool): Whether to close :code:`fileobj` when this object
+        is closed.
+
+      lock (lock-like): Optional lock guarding :code:`fileobj` when it
+        is shared with other readers.
+
+      restore (bool): Whether to restore the position of
+        :code:`fileobj` after every read, for readers such as
+        :class:`gzip.GzipFile` which expect it unchanged.
+
+    """
+    def __init__(self, fileobj, close=False, lock=None, restore=False):
+        self._file = fileobj
+        self._close = close
+        self._lock = lock
+        self._restore = restore
+
+    def _read_at(self, offset, n):
+        if not self._restore:
+            self._file.seek(offset)
+            return self._file.read(n)
+        pos = self._file.tell()
+        try:
+            self._file.seek(offset)
+            return self._file.read(n)
+        finally:
+            self._file.seek(pos)
+
+    def read_at(self, offset, n):
+        if self._lock is None:
+            return self._read_at(offset, n)
+        with self._lock:
+            return self._read_at(offset, n)
+
+    def close(self):
+        if self._close:
+            self._file.close()
+
+
+class SliceDecoder(object):
+    """Decoder for data stored without compression
+
+    The member occupies :code:`length` bytes starting at
+    :code:`offset` of the underlying file, so any position can be
+    reached directly.
+
+    Args:
+
+      source (_FileRange): Underlying file.
+
+      offset (int): Offset of the first byte of the member.
+
+      length (int): Length of the member in bytes.
+
+    """
+    random_access = True
+
+    def __init__(self, source, offset, length):
+        self._source = source
+        self._offset = offset
+        self._length = length
+        self._pos = 0
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos):
+        self._pos = pos
+
+    def read(self, n):
+        n = max(0, min(n, self._length - self._pos))
+        if n == 0:
+            return b''
+        data = self._source.read_at(self._offset + self._pos, n)
+        self._pos += len(data)
+        return data
+
+    def reset(self):
+        self._pos = 0
+
+    def checkpoint(self):
+        return self._pos
+
+    def restore(self, state):
+        self._pos = state
+
+    def close(self):
+        self._source.close()
+
+
+class ZlibDecoder(object):
+    """Decoder for deflate, zlib and gzip streams supporting checkpoints
+
+    Checkpoints are snapshots of the :mod:`zlib` decompressor made
+    with :meth:`zlib.Decompress.copy`, together with the position of
+    the compressed input, so decoding can resume at any recorded
+    point.
+
+    Args:
+
+      source (_FileRange): Underlying file.
+
+      offset (int): Offset of the first compressed byte.
+
+      length (int, NoneType): Number of compressed bytes, or None if
+        the stream extends to the end of the file.
+
+      wbits (int): The :code:`wbits` argument of
+        :func:`zlib.decompressobj`, e.g. -15 for raw deflate data
+        and 31 for gzip. Concatenated gzip members are decoded as a
+        single stream.
+
+    """
+    random_access = False
+
+    def __init__(self, source, offset, length, wbits):
+        self._source = source
+        self._offset = offset
+        self._length = length
+        self._wbits = wbits
+        self.reset()
+
+    def _fetch(self):
+        n = _CHUNK_SIZE
+        if self._length is not None:
+            n = min(n, self._length - self._in)
+        if n <= 0:
+            return b''
+        data = self._source.read_at(self._offset + self._in, n)
+        self._in += len(data)
+        return data
+
+    def _next_gzip_member(self):
+        while len(self._tail) < 2:
+            data = self._fetch()
+            if not data:
+                break
+            self._tail += data
+        return self._tail[:2] == b'\x1f\x8b'
+
+    def tell(self):
+        return self._pos
+
+    def reset(self):
+        self._decomp = zlib.decompressobj(self._wbits)
+        self._in = 0
+        self._tail = b''
+        self._pos = 0
+        self._eof = False
+
+    def checkpoint(self):
+        return (self._pos, self._in, self._decomp.copy(), self._tail,
+                self._eof)
+
+    def restore(self, state):
+        self._pos, self._in, decomp, self._tail, self._eof = state
+        self._decomp = decomp.copy()
+
+    def read(self, n):
+        chunks = []
+        while n > 0 and not self._eof:
+            if not self._tail:
+                self._tail = self._fetch()
+                if not self._tail:
+                    raise EOFError('Compressed stream ended before the '
+                                   'end-of-stream marker was reached')
+            data = self._decomp.decompress(self._tail, n)
+            self._tail = self._decomp.unconsumed_tail
+            if self._decomp.eof:
+                self._tail = self._decomp.unused_data
+                if self._wbits > 15 and self._next_gzip_member():
+                    self._decomp = zlib.decompressobj(self._wbits)
+                else:
+                    self._eof = True
+            chunks.append(data)
+            n -= len(data)
+            self._pos += len(data)
+        return b''.join(chunks)
+
+    def close(self):
+        self._source.close()
+
+
+class StreamDecoder(object):
+    """Decoder over an arbitrary sequential file object
+
+    Used when the compression method offers no way to snapshot the
+    decoder state. Going backward reopens the stream by calling
+    :code:`opener` and skips forward from the beginning.
+
+    Args:
+
+      opener (callable): Callable without arguments returning a new
+        binary file object positioned at the beginning of the data.
+
+    """
+    random_access = False
+
+    def __init__(self, opener):
+        self._opener = opener
+        self._file = None
+        self._pos = 0
+
+    def tell(self):
+        return self._pos
+
+    def reset(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._pos = 0
+
+    def checkpoint(self):
+        return None
+
+    def restore(self, state): #pragma no cover
+        raise ValueError('StreamDecoder does not support checkpoints')
+
+    def read(self, n):
+        if self._file is None:
+            self._file = self._opener()
+        data = self._file.read(n)
+        self._pos += len(data)
+        return data
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class CheckpointIndex(object):
+    """Sorted collection of decoder checkpoints
+
+    The index only stores opaque decoder states keyed by the
+    decoded offset they correspond to, so it can be shared by every
+    reader decoding the same stream, e.g. all members of a
+    *.tar.gz* archive.
+    """
+    def __init__(self):
+        self._offsets = []
+        self._states = []
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def add(self, offset, state):
+        i = bisect.bisect_left(self._offsets, offset)
+        if i < len(self._offsets) and self._offsets[i] == offset:
+            return
+        self._offsets.insert(i, offset)
+        self._states.insert(i, state)
+
+    def find(self, offset):
+        """Find the last checkpoint at or before :code:`offset`
+
+        Return:
+
+          tuple: :code:`(offset, state)` of the checkpoint, or
+          :code:`(0, None)` if there is none.
+        """
+        i = bisect.bisect_right(self._offsets, offset)
+        if i == 0:
+            return 0, None
+        return self._offsets[i-1], self._states[i-1]
+
+
+class IndexedReader(io.RawIOBase):
+    """Seekable binary file object over a decoder
+
+    The member is the range :code:`[start, start+size)` of the data
+    produced by :code:`decoder`.
+
+    Args:
+
+      decoder: One of :class:`SliceDecoder`, :class:`ZlibDecoder` or
+        :class:`StreamDecoder`.
+
+      start (int): Decoded offset of the first byte of the member.
+
+      size (int, NoneType): Size of the member, or None if unknown.
+
+      block_size (int): Size of the blocks decoded data is handled in.
+
+      checkpoints (CheckpointIndex): Index to record checkpoints in
+        and to look them up from. A private index is created if None.
+
+      checkpoint_interval (int): Minimal distance in decoded bytes
+        between two recorded checkpoints.
+
+      cache_blocks (int): Number of recently used blocks kept in
+        memory when :code:`cache` is None.
+
+      cache (BlockCache, NoneType): Shared cache to look blocks up in
+        before decoding them, see :mod:`arlib.cache`.
+
+      cache_key (tuple): Key identifying the member in :code:`cache`.
+        The block index is appended to it to form the key of a block.
+
+    """
+    def __init__(self, decoder, start=0, size=None,
+                 block_size=DEFAULT_BLOCK_SIZE, checkpoints=None,
+                 checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL,
+                 cache_blocks=16, cache=None, cache_key=None):
+        self._decoder = decoder
+        self._start = start
+        self._size = size
+        self._block_size = block_size
+        if checkpoints is None:
+            checkpoints = CheckpointIndex()
+        self._checkpoints = checkpoints
+        self._checkpoint_interval = checkpoint_interval
+        self._blocks = collections.OrderedDict()
+        self._cache_blocks = cache_blocks
+        self._cache = cache
+        self._cache_key = tuple(cache_key or ()) + (block_size,)
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            pos = offset
+        elif whence == os.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == os.SEEK_END:
+            pos = self._get_size() + offset
+        else:
+            raise ValueError('invalid whence ({}, should be 0, 1 or 2)'
+                             .format(whence))
+        if pos < 0:
+            raise ValueError('negative seek position {}'.format(pos))
+        self._pos = pos
+        return pos
+
+    def _get_size(self):
+        if self._size is None:
+            i = self._pos // self._block_size
+            while len(self._block(i)) == self._block_size:
+                i += 1
+        return self._size
+
+    def _maybe_checkpoint(self):
+        pos = self._decoder.tell()
+        last, _ = self._checkpoints.find(pos)
+        if pos - last >= self._checkpoint_interval:
+            state = self._decoder.checkpoint()
+            if state is not None:
+                self._checkpoints.add(pos, state)
+
+    def _seek_decoder(self, target):
+        decoder = self._decoder
+        if decoder.random_access:
+            decoder.seek(target)
+            return
+        current = decoder.tell()
+        if current == target:
+            return
+        offset, state = self._checkpoints.find(target)
+        if current > target or offset > current:
+            if state is None:
+                decoder.reset()
+            else:
+                decoder.restore(state)
+        while decoder.tell() < target:
+            n = min(self._block_size, target - decoder.tell())
+            if not decoder.read(n):
+                break
+            self._maybe_checkpoint()
+
+    def _decode_block(self, i):
+        begin = i * self._block_size
+        n = self._block_size
+        if self._size is not None:
+            n = max(0, min(n, self._size - begin))
+            if n == 0:
+                return b''
+        self._seek_decoder(self._start + begin)
+        data = self._decoder.read(n)
+        if not self._decoder.random_access:
+            self._maybe_checkpoint()
+        return data
+
+    def _block(self, i):
+        if self._cache is not None:
+            key = self._cache_key + (i,)
+            data = self._cache.get(key)
+            if data is None:
+                data = self._decode_block(i)
+                self._cache.put(key, data)
+        else:
+            data = self._blocks.get(i)
+            if data is None:
+                data = self._decode_block(i)
+                self._blocks[i] = data
+                if len(self._blocks) > self._cache_blocks:
+                    self._blocks.popitem(last=False)
+            else:
+                self._blocks.move_to_end(i)
+        if len(data) < self._block_size and self._size is None:
+            self._size = i * self._block_size + len(data)
+        return data
+
+    def read(self, n=-1):
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+        if n is None or n < 0:
+            n = self._get_size() - self._pos
+        chunks = []
+        while n > 0:
+            i, skip = divmod(self._pos, self._block_size)
+            data = self._block(i)[skip:skip+n]
+            if not data:
+                break
+            chunks.append(data)
+            self._pos += len(data)
+            n -= len(data)
+        return b''.join(chunks)
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        n = len(data)
+        b[:n] = data
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._blocks.clear()
+            self._decoder.close()
+        super(IndexedReader, self).close()
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""Columnar table of member metadata
+
+:class:`MemberTable` stores the metadata of all members of an archive
+in a few contiguous buffers instead of one Python object per member:
+the names are concatenated in a single UTF-8 buffer indexed by an
+offsets array, and every other field is a typed array. Columns are
+returned as NumPy arrays (without copying) if NumPy is installed, so
+members can be filtered, sorted and sharded with vectorized
+operations.
+
+"""
+
+import array
+
+
+COLUMNS = (('size', 'q'), ('compressed_size', 'q'), ('offset', 'q'),
+           ('data_offset', 'q'), ('mtime', 'd'), ('is_dir', 'B'))
+
+_dtypes = {'q': 'int64', 'd': 'float64', 'B': 'bool'}
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _encode(name):
+    return name.encode('utf-8', 'surrogateescape')
+
+
+class MemberTable(object):
+    """Columnar metadata of archive members
+
+    Columns (fields not provided by an engine are -1, or NaN for
+    :code:`mtime`):
+
+    * :code:`size`: size of the member in bytes
+
+    * :code:`compressed_size`: size of the member as stored in the
+      archive
+
+    * :code:`offset`: offset of the member header, e.g. the local
+      header of a zip member or the tar header. For compressed tar
+      files, offsets are positions in the decompressed stream.
+
+    * :code:`data_offset`: offset of the member data
+
+    * :code:`mtime`: modification time as a POSIX timestamp
+
+    * :code:`is_dir`: whether the member is a directory
+
+    Args:
+
+      names_buffer (bytes): UTF-8 encoded names, concatenated.
+
+      name_offsets (array.array): :code:`len(table)+1` offsets, name
+        :code:`i` is :code:`names_buffer[name_offsets[i]:name_offsets[i+1]]`.
+
+      columns (dict): Maps column names to :class:`array.array`
+        objects.
+
+    Examples:
+
+      >>> table = MemberTable.from_records([
+      ...     ('a.txt', 10, 5, 0, 30, 0.0, False),
+      ...     ('dir/', 0, 0, 40, 70, 0.0, True)])
+      >>> len(table), table.name(1)
+      (2, 'dir/')
+      >>> table.select([not x for x in table['is_dir']]).names()
+      ['a.txt']
+
+    """
+    def __init__(self, names_buffer, name_offsets, columns):
+        self.names_buffer = names_buffer
+        self.name_offsets = name_offsets
+        self._columns = columns
+
+    @classmethod
+    def from_records(cls, records):
+        """Build a table from an iterable of records
+
+        Args:
+
+          records (Iterable[tuple]): Tuples of :code:`(name, size,
+            compressed_size, offset, data_offset, mtime, is_dir)`.
+
+        Return:
+
+          MemberTable: The table.
+        """
+        names = bytearray()
+        offsets = array.array('q', [0])
+        columns = [array.array(code) for _, code in COLUMNS]
+        for record in records:
+            names += _encode(record[0])
+            offsets.append(len(names))
+            for column, value in zip(columns, record[1:]):
+                column.append(value)
+        return cls(bytes(names), offsets,
+                   dict((name, column) for (name, _), column in
+                        zip(COLUMNS, columns)))
+
+    def __len__(self):
+        return len(self.name_offsets) - 1
+
+    def __getitem__(self, column):
+        """Get a column
+
+        Return:
+
+          numpy.ndarray, array.array: The column as a NumPy array
+          sharing memory with the table if NumPy is available,
+          otherwise the underlying :class:`array.array`.
+        """
+        data = self._columns[column]
+        np = _numpy()
+        if np is None:
+            return data
+        return np.frombuffer(data, dtype=_dtypes[data.typecode])
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name not in self.__dict__.get(
+                '_columns', {}):
+            raise AttributeError(name)
+        return self[name]
+
+    @property
+    def columns(self):
+        """Names of the columns"""
+        return [name for name, _ in COLUMNS]
+
+    def name(self, i):
+        """Get the name of the member at row :code:`i`"""
+        begin, end = self.name_offsets[i], self.name_offsets[i+1]
+        return self.names_buffer[begin:end].decode('utf-8',
+                                                   'surrogateescape')
+
+    def names(self):
+        """Get the names of all members
+
+        Return:
+
+          list[str]: The names, in the order of the rows.
+        """
+        return [self.name(i) for i in range(len(self))]
+
+    def take(self, indices):
+        """Build a table from a subset of rows
+
+        Args:
+
+          indices (Seq[int]): Row indices, e.g. the result of
+            :code:`numpy.argsort` on a column.
+
+        Return:
+
+          MemberTable: The new table.
+        """
+        indices = [int(i) for i in indices]
+        np = _numpy()
+        chunks = []
+        offsets = array.array('q', [0])
+        n = 0
+        for i in indices:
+            begin, end = self.name_offsets[i], self.name_offsets[i+1]
+            chunks.append(self.names_buffer[begin:end])
+            n += end - begin
+            offsets.append(n)
+        columns = {}
+        for name, data in self._columns.items():
+            if np is None:
+                columns[name] = array.array(data.typecode,
+                                            [data[i] for i in indices])
+            else:
+                selected = np.frombuffer(data, dtype=_dtypes[
+                    data.typecode])[np.asarray(indices, dtype='int64')]
+                columns[name] = array.array(
+                    data.typecode, selected.astype(data.typecode).tobytes())
+        return MemberTable(b''.join(chunks), offsets, columns)
+
+    def select(self, mask):
+        """Build a table from the rows where :code:`mask` is true
+
+        Args:
+
+          mask (Seq[bool]): One boolean per row.
+
+        Return:
+
+          MemberTable: The new table.
+        """
+        np = _numpy()
+        if np is not None:
+            return self.take(np.flatnonzero(np.asarray(mask)))
+        return self.take([i for i, x in enumerate(mask) if x])
+
+    def to_arrow(self):
+        """Convert the table to a :class:`pyarrow.Table` without copying
+        the names
+
+        Return:
+
+          pyarrow.Table: Table with a :code:`name` column of type
+          :code:`large_string` followed by the other columns.
+        """
+        import pyarrow as pa
+        names = pa.Array.from_buffers(
+            pa.large_string(), len(self),
+            [None, pa.py_buffer(self.name_offsets),
+             pa.py_buffer(self.names_buffer)])
+        arrays = [names]
+        types = {'q': pa.int64(), 'd': pa.float64()}
+        for name, code in COLUMNS:
+            data = self._columns[name]
+            if code == 'B':
+                arrays.append(pa.array([bool(x) for x in data],
+                                       pa.bool_()))
+            else:
+                arrays.append(pa.Array.from_buffers(
+                    types[code], len(self), [None, pa.py_buffer(data)]))
+        return pa.Table.from_arrays(arrays, names=['name']+self.columns)
+
@@ -0,0 +1,599 @@
+# -*- coding: utf-8 -*-
+"""Engine for tar files using the :mod:`tarfile` module
+"""
+
+import io
+import os
+import sys
+import copy
+import time
+import tarfile
+import threading
+
+from ._compat import builtins
+from .archive import (Archive, _check_seekable, _file_identity,
+                      _extract_chunk_size, _match_member_name, _COPY_CHUNK,
+                      _SPOOL_SIZE)
+from .cache import get_block_cache
+from .seekable import (IndexedReader, CheckpointIndex, SliceDecoder,
+                       ZlibDecoder, StreamDecoder, _FileRange)
+
+
+class TarArchive(Archive):
+    """Archive engine for *tar* files using the `tarfile` module
+
+    Args:
+
+      path (path-like): Path to the archive
+
+      mode (str): The mode to open the member, same as in
+        :func:`open`. Modes of :func:`tarfile.open` such as
+        :code:`'w:gz'` or :code:`'w|gz'` are also accepted. Modes
+        with :code:`'|'` read or write a stream of tar blocks
+        without seeking, which non-seekable file objects use
+        automatically. Members of a stream opened for reading can
+        only be read in archive order by :meth:`read_members` and
+        :meth:`extract`: :meth:`open_member` raises
+        :class:`io.UnsupportedOperation`, and listing the members
+        consumes the stream.
+
+      index (path-like): Path of a sidecar file of the member index.
+        The index maps the member names to the offsets of their
+        headers, so that opening a member of an uncompressed tar file
+        reads its header directly instead of scanning all the headers
+        of the archive. It is loaded from the file if it matches the
+        archive, otherwise built by scanning the archive and written
+        to the file. Only used in read mode.
+
+      kwargs : Other keyword arguments that will be passed to the
+        underlying function.
+
+    Note:
+
+      Tar headers hold the size of the member before its data, so
+      members of unknown size written by :meth:`~Archive.add_members`
+      are spooled to a temporary file first, keeping at most 16 MiB
+      in memory. Pass the size along with the content to avoid it.
+
+    """
+    def __init__(self, path, mode='r', index=None, **kwargs):
+        self._need_close = True
+        self._fileobj = None
+        self._checkpoints = CheckpointIndex()
+        self._compression_type = None
+        # reentrant: members are opened while reading under the lock
+        self._read_lock = threading.RLock()
+        self._index_path = index
+        self._index_lock = threading.Lock()
+        self._index = None
+        self._index_names = None
+        self._offsets = None
+        self._infos = None
+        self._stream = '|' in mode
+        if isinstance(path, tarfile.TarFile):
+            self._file = path
+            self._need_close = False
+        elif (isinstance(path, io.IOBase) or
+              sys.version_info[0] == 2 and isinstance(path, file)):
+            self._fileobj = path
+            self._fileobj_offset = path.tell() if path.seekable() else 0
+            if not path.seekable() and '|' not in mode:
+                if mode in ('r', 'r:*'):
+                    # 'r|' would only read uncompressed streams
+                    mode = 'r|*'
+                else:
+                    # e.g. 'w:gz' -> 'w|gz'
+                    mode = mode[0] + '|' + mode[2:]
+                self._stream = True
+            self._file = tarfile.open(fileobj=path, mode=mode, **kwargs)
+        else:
+            self._file = tarfile.open(name=path, mode=mode, **kwargs)
+
+    @property
+    def member_names(self):
+        index = self._member_index()
+        if index is not None:
+            return [x[0] for x in index]
+        # normalize names so that name of members which are
+        # directories will be appended with a '/'
+        return [x.name+'/' if x.isdir() else x.name
+                for x in self._file.getmembers()]
+
+
+    def validate_member_name(self, name):
+        index = self._member_index()
+        if index is None:
+            return super(TarArchive, self).validate_member_name(name)
+        return _match_member_name(name, self._index_names)
+
+
+    def _member_index(self):
+        """Get the index of the members, in read mode only
+
+        Return:
+
+          list[tuple], NoneType: :meth:`_iter_member_info` tuples of
+          the members in archive order, or None if the archive is
+          opened for writing.
+        """
+        if self._index is not None or self._file.mode != 'r':
+            return self._index
+        with self._index_lock:
+            if self._index is None:
+                index = self._read_index_file()
+                if index is None:
+                    infos = self._file.getmembers()
+                    index = list(self._scan_member_info())
+                    self._infos = dict((x.name, x) for x in infos)
+                    self._write_index_file(index)
+                self._index_names = set(x[0] for x in index)
+                self._offsets = dict((x[0][:-1] if x[6] else x[0], x[3])
+                                     for x in index)
+                self._index = index
+        return self._index
+
+
+    def _index_identity(self):
+        # size and modification time of the archive file, checked when
+        # loading a sidecar index
+        name = self._file.name
+        if self._fileobj is None and name is not None and os.path.isfile(name):
+            st = os.stat(name)
+            return [st.st_size, st.st_mtime]
+        raw = self._raw_source()
+        if raw is None: #pragma no cover
+            return None
+        fileobj = raw[0]._file
+        pos = fileobj.tell()
+        size = fileobj.seek(0, os.SEEK_END)
+        fileobj.seek(pos)
+        return [size, None]
+
+
+    def _read_index_file(self):
+        import json
+        path = self._index_path
+        if path is None or not os.path.isfile(path):
+            return None
+        try:
+            with io.open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if (data.get('version') != 1 or
+                data.get('archive') != self._index_identity()):
+                return None
+            return [tuple(x) for x in data['members']]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            # not an index file, it is rebuilt
+            return None
+
+
+    def _write_index_file(self, index):
+        import json
+        path = self._index_path
+        if path is None:
+            return
+        data = {'version': 1, 'archive': self._index_identity(),
+                'members': index}
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        try:
+            with io.open(tmp, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(data))
+            os.replace(tmp, path)
+        except OSError: #pragma no cover
+            # the index only speeds up later opens
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+    def _member_info(self, name):
+        """Get the :class:`tarfile.TarInfo` of a member
+
+        Headers of uncompressed archives whose index was loaded from a
+        sidecar file are read at their offset, other archives look
+        the member up in the headers scanned by :mod:`tarfile`.
+
+        Args:
+
+          name (str): Name of the member, as returned by
+            :meth:`validate_member_name`.
+
+        Return:
+
+          tarfile.TarInfo: Header of the member.
+        """
+        if name.endswith('/'):
+            name = name[:-1]
+        if self._member_index() is None:
+            return self._file.getmember(name)
+        if self._infos is None and self._compression() == '':
+            with self._read_lock:
+                # fromtarfile advances the position of the TarFile,
+                # which would make its next scan skip members
+                offset = self._file.offset
+                try:
+                    self._file.fileobj.seek(self._offsets[name])
+                    return tarfile.TarInfo.fromtarfile(self._file)
+                finally:
+                    self._file.offset = offset
+        if self._infos is None:
+            with self._index_lock:
+                self._infos = dict((x.name, x)
+                                   for x in self._file.getmembers())
+        return self._infos[name]
+
+
+    def open_member(self, name, mode='r', seekable=None):
+        """Open member file contained in the tar archive
+
+        Args:
+
+          name (str): Name of the member to open
+
+          mode (str): The mode argument to open. Same as in :func:`open`.
+
+          seekable (str, bool, NoneType): None, False or
+            :code:`'indexed'`. See :meth:`Archive.open_member`.
+            Members of uncompressed tar files are read directly from
+            the archive file, and members of *.tar.gz* files share
+            the decoder checkpoints of the whole archive.
+
+        Return:
+
+          file-like: The opened file object associated with the member
+          file.
+
+        Note:
+
+          Members of tar archive cannot be opened in write mode.
+        """
+        mode = mode.lower()
+        if 'r' not in mode: #pragma no cover
+            raise ValueError('members of tar archive can not be opened in'
+                             ' write mode')
+        if self._stream:
+            raise io.UnsupportedOperation(
+                'members of a tar stream can only be read in archive order'
+                ' by read_members or extract')
+        if self.member_is_dir(name):
+            raise ValueError('directory member cannot be opened.')
+        _check_seekable(seekable, mode)
+        if (seekable == 'indexed' or seekable is None and
+            self._block_cache_options(name) is not None):
+            return self._open_indexed(name, mode)
+
+        info = self._member_info(self.validate_member_name(name))
+        if info.islnk():
+            info = self._member_info(info.linkname)
+        with self._read_lock:
+            f = self._file.extractfile(info)
+        if 'b' not in mode:
+            if sys.version_info[0] >= 3:
+                f = io.TextIOWrapper(f)
+            else: #pragma no cover
+                raise ValueError('I do not know how to wrap binary file'
+                                 ' object to text io.')
+        return f
+
+
+    def extract(self, path=None, members=None, chunk_size=None,
+                max_memory=None):
+        """Extract members to a location
+
+        Members of compressed tar files are extracted in one forward
+        pass over the archive, in archive order whatever the order of
+        :code:`members`, so the archive is decompressed at most once.
+        Members of traced archives are extracted one at a time, each
+        recorded as one event, see :mod:`arlib.trace`.
+
+        Args:
+
+          path (path-like): Location of the extracted files.
+
+          members (Seq[str]): Members to extract, specified by a list
+            of names.
+
+          chunk_size (int): Size of the chunks copied at a time,
+            default to a size adapted to the largest member and the
+            destination file system, see :meth:`Archive.extract`.
+
+          max_memory (int): Upper bound of the chunk size.
+
+        """
+        if path is None: #pragma no cover
+            path = '.'
+        # tarfile copies members with one buffer of copybufsize bytes
+        previous = getattr(self._file, 'copybufsize', None)
+        try:
+            if (members is not None and self._is_solid() or self._stream or
+                self.__dict__.get('_tracer') is not None):
+                self._extract_solid(path, members, chunk_size, max_memory)
+                return
+            if members is not None:
+                members = [self._member_info(self.validate_member_name(x))
+                           for x in members]
+            size = max([x.size for x in (members or self._file.getmembers())
+                        if x.isreg()] or [0])
+            self._file.copybufsize = _extract_chunk_size(
+                size, path, chunk_size, max_memory)
+            self._file.extractall(path, members)
+        finally:
+            self._file.copybufsize = previous
+
+
+    def _extract_solid(self, path, members, chunk_size, max_memory):
+        tracer = self.__dict__.get('_tracer')
+        dirs = []
+        for info in self._iter_solid(members):
+            if info.isdir():
+                dirs.append(info)
+                continue
+            with self._read_lock:
+                self._file.copybufsize = _extract_chunk_size(
+                    info.size, path, chunk_size, max_memory)
+                if tracer is None:
+                    self._file.extract(info, path)
+                else:
+                    from .trace import _record_call
+                    _record_call(tracer, info.name, info.size,
+                                 self._file.extract, info, path)
+        if dirs:
+            # like extractall, directory attributes are set after the
+            # files are written
+            self._file.extractall(path, dirs)
+
+
+    def _single_pass(self):
+        # the single pass reads members without open_member, so it is
+        # not used when the block cache or a trace has to see the reads,
+        # except for streams which cannot be read otherwise
+        if self._stream:
+            return True
+        return (self._is_solid() and
+                (get_block_cache() is None or
+                 self._archive_identity() is None) and
+                self.__dict__.get('_tracer') is None)
+
+
+    def _iter_solid(self, names=None, seen=None):
+        """Find members in one forward pass over the archive
+
+        Headers are read in archive order, skipping the data of the
+        other members, and the pass stops after the last member
+        requested.
+
+        Args:
+
+          names (Iterable[str]): Names of the members, default to all
+            members.
+
+          seen (dict): Filled with the headers read, by name, to
+            resolve hard links without scanning the archive.
+
+        Return:
+
+          iterator: Iterator of the :class:`tarfile.TarInfo` of the
+          members, in archive order.
+        """
+        wanted = None
+        if names is not None:
+            wanted = set(x[:-1] if x.endswith('/') else x for x in names)
+        headers = iter(self._file)
+        while wanted is None or wanted:
+            with self._read_lock:
+                info = next(headers, None)
+            if info is None:
+                break
+            if seen is not None:
+                seen[info.name] = info
+            if wanted is None:
+                yield info
+            elif info.name in wanted:
+                wanted.discard(info.name)
+                yield info
+        if wanted:
+            raise ValueError(sorted(wanted)[0]+' is not a valid member name.')
+
+
+    def read_members(self, names=None):
+        """Read the content of members
+
+        Members of compressed tar files are read in one forward pass
+        over the archive and yielded in archive order, see
+        :meth:`Archive.read_members`, unless a block cache is
+        installed or the archive is traced: members then go through
+        :meth:`open_member`.
+        """
+        if not self._single_pass():
+            for item in super(TarArchive, self).read_members(names):
+                yield item
+            return
+        seen = {}
+        for info in self._iter_solid(names, seen):
+            if names is None and not (info.isreg() or info.islnk()):
+                continue
+            if info.isdir():
+                raise ValueError('directory member cannot be opened.')
+            source = info
+            if info.islnk():
+                source = seen.get(info.linkname) or self._member_info(
+                    info.linkname)
+            with self._read_lock:
+                f = self._file.extractfile(source)
+                try:
+                    data = f.read()
+                finally:
+                    f.close()
+            yield info.name, data
+
+
+    def _write_member(self, name, fileobj, size):
+        info = tarfile.TarInfo(name)
+        info.mtime = time.time()
+        spool = None
+        if size is None:
+            # the size is written in the header before the data
+            import shutil, tempfile
+            spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE)
+            shutil.copyfileobj(fileobj, spool, _COPY_CHUNK)
+            size = spool.tell()
+            spool.seek(0)
+            fileobj = spool
+        info.size = size
+        try:
+            self._file.addfile(info, fileobj)
+        finally:
+            if spool is not None:
+                spool.close()
+
+
+    def _write_dir(self, name):
+        info = tarfile.TarInfo(name.rstrip('/'))
+        info.type = tarfile.DIRTYPE
+        info.mode = 0o755
+        info.mtime = time.time()
+        self._file.addfile(info)
+
+
+    def _write_duplicate(self, name, original, source):
+        info = tarfile.TarInfo(name)
+        info.type = tarfile.LNKTYPE
+        info.linkname = original
+        info.mtime = time.time()
+        self._file.addfile(info)
+
+
+    def _copy_member(self, dest, name, size, recompress=False):
+        # the stream of dest compresses the copied data
+        if not isinstance(dest, TarArchive):
+            return super(TarArchive, self)._copy_member(dest, name, size)
+        info = source = self._member_info(name)
+        if info.islnk():
+            source = self._member_info(info.linkname)
+            info = copy.copy(info)
+            info.type = tarfile.REGTYPE
+            info.linkname = ''
+            info.size = source.size
+        with self._read_lock:
+            f = self._file.extractfile(source) if info.isfile() else None
+            try:
+                dest._file.addfile(info, f)
+            finally:
+                if f is not None:
+                    f.close()
+
+
+    def _raw_source(self):
+        # Return (source, offset) for the raw bytes of the archive file,
+        # or None if they are not accessible.
+        if self._fileobj is not None:
+            if not self._fileobj.seekable(): #pragma no cover
+                return None
+            # shared with tarfile, which reads it sequentially
+            return (_FileRange(self._fileobj, lock=self._read_lock,
+                               restore=True), self._fileobj_offset)
+        name = self._file.name
+        if name is not None and os.path.isfile(name):
+            return _FileRange(builtins.open(name, 'rb'), close=True), 0
+        return None #pragma no cover
+
+
+    def _read_member_data(self, name):
+        # TarFile shares one file object between all members
+        with self._read_lock:
+            return super(TarArchive, self)._read_member_data(name)
+
+
+    def _member_read_lock(self):
+        return self._read_lock
+
+
+    def _is_solid(self):
+        # streams are read in one pass whatever their compression
+        return self._stream or self._compression() != ''
+
+
+    def _archive_identity(self):
+        name = self._file.name
+        if name is not None and os.path.isfile(name):
+            return _file_identity(name)
+        return None
+
+
+    def _compression(self):
+        """Get the compression of the archive file from its magic number
+
+        Return:
+
+          str, NoneType: One of :code:`'gz'`, :code:`'bz2'`,
+          :code:`'xz'`, :code:`''` for an uncompressed archive, or
+          None if the archive file is not accessible.
+        """
+        if self._compression_type is not None:
+            return self._compression_type
+        raw = self._raw_source()
+        if raw is None: #pragma no cover
+            return None
+        source, offset = raw
+        try:
+            magic = source.read_at(offset, 6)
+        finally:
+            source.close()
+        if magic[:2] == b'\x1f\x8b':
+            self._compression_type = 'gz'
+        elif magic[:3] == b'BZh':
+            self._compression_type = 'bz2'
+        elif magic == b'\xfd7zXZ\x00':
+            self._compression_type = 'xz'
+        else:
+            self._compression_type = ''
+        return self._compression_type
+
+
+    def _iter_member_info(self):
+        index = self._member_index()
+        if index is not None:
+            return iter(index)
+        return self._scan_member_info()
+
+
+    def _scan_member_info(self):
+        plain = self._compression() == ''
+        for info in self._file.getmembers():
+            name = info.name + '/' if info.isdir() else info.name
+            size = info.size
+            if info.islnk():
+                size = self._file.getmember(info.linkname).size
+            yield (name, size, info.size if plain else -1, info.offset,
+                   info.offset_data, info.mtime, info.isdir())
+
+
+    def _indexed_reader(self, name, **kwargs):
+        info = self._member_info(name)
+        if info.islnk():
+            info = self._member_info(info.linkname)
+        raw = None
+        if info.isreg() and not info.issparse():
+            raw = self._raw_source()
+        if raw is None:
+            return IndexedReader(StreamDecoder(
+                lambda: self._file.extractfile(info)), size=info.size,
+                                 **kwargs)
+        compression = self._compression()
+        source, offset = raw
+        if compression == 'gz':
+            decoder = ZlibDecoder(source, offset, None, 31)
+            return IndexedReader(decoder, start=info.offset_data,
+                                 size=info.size,
+                                 checkpoints=self._checkpoints, **kwargs)
+        if compression != '':
+            source.close()
+            return IndexedReader(StreamDecoder(
+                lambda: self._file.extractfile(info)), size=info.size,
+                                 **kwargs)
+        decoder = SliceDecoder(source, offset+info.offset_data, info.size)
+        return IndexedReader(decoder, size=info.size, **kwargs)
+
+    
+    def _close(self):
+        if self._need_close:
+            self._file.close()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""Helpers for testing code which uses arlib
+
+:class:`HTTPTestServer` serves a local directory over HTTP with
+support of range requests, standing in for an object store when
+testing :class:`~arlib.remote.HTTPRangeFile`:
+
+.. code-block:: python
+
+   with HTTPTestServer(directory) as server:
+       with arlib.open(arlib.HTTPRangeFile(server.url('a.zip'))) as ar:
+           ...
+       print(server.requests)
+
+"""
+
+import os
+import re
+import sys
+import threading
+
+if sys.version_info[0] == 2: #pragma no cover
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from urllib import quote, unquote
+    from urlparse import urlsplit
+else: #pragma no cover
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from urllib.parse import quote, unquote, urlsplit
+
+from ._compat import builtins
+
+
+_range_pattern = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _RangeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(False)
+
+    def do_GET(self):
+        self._serve(True)
+
+    def _serve(self, send_body):
+        owner = self.server.owner
+        name = unquote(urlsplit(self.path).path).lstrip('/')
+        path = os.path.abspath(os.path.join(owner.directory, name))
+        header = self.headers.get('Range')
+        owner._log(self.command, name, header)
+        if not path.startswith(os.path.join(owner.directory, '')):
+            # e.g. '/../file', only the directory is served
+            self.send_error(403)
+            return
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        st = os.stat(path)
+        size = st.st_size
+        etag = '"{:x}-{:x}"'.format(int(st.st_mtime * 1e6), size)
+        begin, end = 0, size - 1
+        status = 200
+        if header is not None and self.headers.get('If-Range',
+                                                   etag) == etag:
+            match = _range_pattern.match(header.strip())
+            if match is None or match.groups() == ('', ''):
+                self._unsatisfiable(size)
+                return
+            first, last = match.groups()
+            if first:
+                begin = int(first)
+                if last:
+                    end = min(int(last), size - 1)
+            else:
+                begin = max(size - int(last), 0)
+            if begin >= size or begin > end:
+                self._unsatisfiable(size)
+                return
+            status = 206
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(end - begin + 1))
+        if status == 206:
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                begin, end, size))
+        self.end_headers()
+        if send_body:
+            with builtins.open(path, 'rb') as f:
+                f.seek(begin)
+                data = f.read(end - begin + 1)
+            self.wfile.write(data)
+            owner._sent(len(data))
+
+    def _unsatisfiable(self, size):
+        self.send_response(416)
+        self.send_header('Content-Range', 'bytes */{}'.format(size))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class HTTPTestServer(object):
+    """HTTP server of a local directory supporting range requests
+
+    The server listens on a free port of the loopback interface and
+    runs in a background thread while used as a context manager.
+
+    Args:
+
+      directory (path-like): Directory of the files to serve.
+
+    Attributes:
+
+      requests (list[tuple]): :code:`(method, name, range)` of every
+        request received, :code:`range` is the value of the
+        :code:`Range` header or None.
+
+      bytes_sent (int): Number of body bytes sent.
+
+    """
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        self.requests = []
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def _log(self, method, name, header):
+        with self._lock:
+            self.requests.append((method, name, header))
+
+    def _sent(self, n):
+        with self._lock:
+            self.bytes_sent += n
+
+    def url(self, name):
+        """Get the URL of a file relative to the served directory"""
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}/{}'.format(host, port, quote(name))
+
+    def start(self):
+        """Start serving in a background thread"""
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0),
+                                            _RangeRequestHandler)
+        self._server.owner = self
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the server"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.stop()
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""Per-member cost traces of archive reads
+
+:code:`arlib.open(path, trace='trace.json')` records one event per
+member read, from the opening to the closing of the member file, and
+one event for the opening of the archive. Events hold the bytes read
+from the archive file (*bytes_in*), the bytes of member content
+returned (*bytes_out*), the time spent waiting for the archive file
+(*io_wait_us*), the rest of the time spent reading the member, mostly
+decompression (*decompress_us*; parsing of the index for the opening
+event), and the thread. The trace is written
+when the archive is closed, in the JSON format of Chrome tracing,
+which also loads into Perfetto (https://ui.perfetto.dev).
+
+Members are traced when they are read through
+:meth:`~arlib.Archive.open_member`, which also serves
+:meth:`~arlib.Archive.read_members`, :meth:`~arlib.Archive.prefetch`,
+:meth:`~arlib.Archive.search`, :meth:`~arlib.Archive.verify` and
+:meth:`~arlib.Archive.extract`, and when they are extracted by
+:meth:`arlib.TarArchive.extract`, with one event per member.
+:meth:`arlib.DirArchive.extract` copies files without reading them
+and records no event.
+
+The archive file is wrapped by a file object timing its reads with
+thread-local counters, so the overhead is a few clock reads per read
+call. As the engine does not see the path of the archive file, the
+block cache is not used by traced archives.
+
+"""
+
+import io
+import os
+import json
+import time
+import threading
+import functools
+
+from ._compat import builtins, _path_classes
+
+
+class Tracer(object):
+    """Collector of trace events written in the Chrome tracing format
+
+    Args:
+
+      path (path-like): Path of the JSON file written by :meth:`close`.
+
+    Attributes:
+
+      events (list[dict]): Events recorded so far.
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self.events = []
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+        self._threads = {}
+        self._files = []
+        self._closed = False
+
+    def counters(self):
+        """Get the I/O counters of the calling thread
+
+        Return:
+
+          tuple: :code:`(bytes, seconds)` read from the archive file by
+          the thread so far.
+        """
+        local = self._local
+        return getattr(local, 'bytes', 0), getattr(local, 'seconds', 0.0)
+
+    def _count(self, n, seconds):
+        local = self._local
+        local.bytes = getattr(local, 'bytes', 0) + n
+        local.seconds = getattr(local, 'seconds', 0.0) + seconds
+
+    def record(self, name, cat, start, end, bytes_in, bytes_out, io_wait,
+               busy=None):
+        """Record a complete event of the calling thread
+
+        Args:
+
+          name (str): Name of the event, e.g. the member name.
+
+          cat (str): Category of the event.
+
+          start (float): :func:`time.perf_counter` at the beginning.
+
+          end (float): :func:`time.perf_counter` at the end.
+
+          bytes_in (int): Bytes read from the archive file.
+
+          bytes_out (int): Bytes of content produced.
+
+          io_wait (float): Seconds spent reading the archive file.
+
+          busy (float): Seconds spent working on the event, default to
+            its duration. The time not waiting for I/O is reported as
+            decompression time.
+        """
+        thread = threading.current_thread()
+        tid = thread.ident
+        if tid not in self._threads:
+            self._threads[tid] = thread.name
+        if busy is None:
+            busy = end - start
+        self.events.append({
+            'name': name, 'cat': cat, 'ph': 'X', 'pid': os.getpid(),
+            'tid': tid, 'ts': round((start - self._origin) * 1e6, 1),
+            'dur': round((end - start) * 1e6, 1),
+            'args': {'bytes_in': bytes_in, 'bytes_out': bytes_out,
+                     'io_wait_us': round(io_wait * 1e6, 1),
+                     'decompress_us': round(max(busy - io_wait, 0) * 1e6,
+                                            1)}})
+
+    def wrap(self, fileobj, close=False):
+        """Wrap a binary file object so that its reads are counted
+
+        Args:
+
+          fileobj (file-like): The archive file.
+
+          close (bool): Whether to close :code:`fileobj` when the
+            tracer is closed.
+
+        Return:
+
+          file-like: Binary file object reading :code:`fileobj`.
+        """
+        f = _TimedFile(fileobj, self)
+        if close:
+            self._files.append(f)
+        return f
+
+    def close(self):
+        """Write the trace file and close the wrapped files"""
+        if self._closed:
+            return
+        self._closed = True
+        for f in self._files:
+            f.close()
+        pid = os.getpid()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid,
+                   'tid': tid, 'args': {'name': name}}
+                  for tid, name in sorted(self._threads.items())]
+        with io.open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'traceEvents': events + self.events,
+                                'displayTimeUnit': 'ms'},
+                               separators=(',', ':')))
+
+
+class _TimedFile(io.RawIOBase):
+    """Binary file object counting the bytes and time of reads"""
+
+    def __init__(self, fileobj, tracer):
+        self._file = fileobj
+        self._tracer = tracer
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self._file.seekable()
+
+    def tell(self):
+        return self._file.tell()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        start = time.perf_counter()
+        pos = self._file.seek(offset, whence)
+        self._tracer._count(0, time.perf_counter() - start)
+        return pos
+
+    def read(self, n=-1):
+        start = time.perf_counter()
+        data = self._file.read(n)
+        self._tracer._count(len(data), time.perf_counter() - start)
+        return data
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        n = len(data)
+        b[:n] = data
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super(_TimedFile, self).close()
+
+
+class _TracedMember(io.RawIOBase):
+    """Binary member file object recording one event when closed"""
+
+    def __init__(self, fileobj, name, tracer):
+        self._file = fileobj
+        self._name = name
+        self._tracer = tracer
+        self._start = self._end = time.perf_counter()
+        self._busy = 0.0
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._io_wait = 0.0
+
+    def _call(self, func, *args):
+        before = self._tracer.counters()
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._end = time.perf_counter()
+            after = self._tracer.counters()
+            self._busy += self._end - start
+            self._bytes_in += after[0] - before[0]
+            self._io_wait += after[1] - before[1]
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self._file.seekable()
+
+    def tell(self):
+        return self._file.tell()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self._call(self._file.seek, offset, whence)
+
+    def read(self, n=-1):
+        data = self._call(self._file.read, n)
+        self._bytes_out += len(data)
+        return data
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        n = len(data)
+        b[:n] = data
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+            self._tracer.record(self._name, 'member', self._start, self._end,
+                                self._bytes_in, self._bytes_out,
+                                self._io_wait, self._busy)
+        super(_TracedMember, self).close()
+
+
+def _open_member(open_member, tracer, name, mode='r', *args, **kwargs):
+    # open_member of a traced archive
+    if 'r' not in mode:
+        return open_member(name, mode, *args, **kwargs)
+    before = tracer.counters()
+    start = time.perf_counter()
+    f = open_member(name, mode.replace('t', '').replace('b', '') + 'b',
+                    *args, **kwargs)
+    f = _TracedMember(f, name, tracer)
+    after = tracer.counters()
+    # the time to locate the member counts as part of the read
+    f._start = start
+    f._busy = f._end - start
+    f._bytes_in = after[0] - before[0]
+    f._io_wait = after[1] - before[1]
+    if 'b' not in mode:
+        return io.TextIOWrapper(io.BufferedReader(f))
+    return f
+
+
+def _record_call(tracer, name, size, func, *args):
+    # call func(*args) reading member name of the given size, e.g.
+    # to extract it, and record the call as the read of the member
+    before = tracer.counters()
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        after = tracer.counters()
+        tracer.record(name, 'member', start, time.perf_counter(),
+                      after[0] - before[0], size, after[1] - before[1])
+
+
+def open_traced(path, mode, engine, trace, *args, **kwargs):
+    """Open an archive recording a trace, see :func:`arlib.open`
+
+    Args:
+
+      path (path-like, file-like): The archive.
+
+      mode (str): A read mode.
+
+      engine (type, NoneType): Engine of the archive, determined from
+        :code:`path` if None.
+
+      trace (path-like): Path of the trace file written when the
+        archive is closed.
+
+      args, kwargs: Additional arguments passed to the engine
+        constructor.
+
+    Return:
+
+      Archive: The opened archive.
+    """
+    import arlib
+    if 'r' not in mode:
+        raise ValueError('archives can only be traced in read mode')
+    if engine is None:
+        engine = arlib.auto_engine(path, mode)
+        if engine is None:
+            raise RuntimeError('Cannot automatically determine engine for '
+                               'path:', path, ' mode:', mode)
+    tracer = Tracer(trace)
+    source = path
+    if isinstance(path, _path_classes) and os.path.isfile(path):
+        source = tracer.wrap(builtins.open(path, 'rb'), close=True)
+    elif isinstance(path, io.IOBase) and path.readable():
+        source = tracer.wrap(path)
+    before = tracer.counters()
+    start = time.perf_counter()
+    try:
+        archive = engine(source, mode, *args, **kwargs)
+    except BaseException:
+        tracer.close()
+        raise
+    after = tracer.counters()
+    tracer.record('open', 'archive', start, time.perf_counter(),
+                  after[0] - before[0], 0, after[1] - before[1])
+    archive._tracer = tracer
+    archive.open_member = functools.partial(_open_member,
+                                            archive.open_member, tracer)
+    return archive
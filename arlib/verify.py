@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""Integrity check of archive members
+
+:meth:`arlib.Archive.verify` reads every member once, in chunks, and
+feeds the chunks to all the checks of the member: the CRC-32 recorded
+by the format (zip files) and the digest listed in a manifest, e.g. a
+file written by :code:`sha256sum`. Members are checked in parallel by
+a thread pool, since :mod:`zlib`, :mod:`hashlib` and the decompressors
+release the GIL on large buffers.
+
+"""
+
+import time
+import zlib
+import hashlib
+import collections
+
+from ._compat import builtins, _path_classes
+from .grep import _NullLock
+
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def _normalize(name):
+    while name.startswith('./'):
+        name = name[2:]
+    return name
+
+
+def read_manifest(manifest):
+    """Parse a manifest of digests
+
+    The format is the output of :code:`sha256sum` and similar tools:
+    one :code:`<hex digest> <name>` line per file, where the name may
+    be preceded by :code:`'*'` (binary mode) and blank lines and lines
+    starting with :code:`'#'` are ignored.
+
+    Args:
+
+      manifest (path-like, file-like, Iterable[str]): Path of the
+        manifest, an opened text file, or its lines.
+
+    Return:
+
+      dict: Maps member names to lower case hexadecimal digests.
+    """
+    if isinstance(manifest, _path_classes):
+        with builtins.open(manifest) as f:
+            return read_manifest(f)
+    digests = {}
+    for line in manifest:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        digest, _, name = line.partition(' ')
+        name = name.strip()
+        if name.startswith('*'):
+            name = name[1:]
+        if not name:
+            raise ValueError('invalid manifest line: '+repr(line))
+        digests[_normalize(name)] = digest.lower()
+    return digests
+
+
+class VerifyReport(object):
+    """Result of :meth:`arlib.Archive.verify`
+
+    Attributes:
+
+      failures (list[tuple]): :code:`(name, reason)` of every member
+        which failed a check, in the order of the members checked.
+        Names listed in the manifest but missing from the archive are
+        reported with the reason :code:`'missing'`.
+
+      members (int): Number of members checked.
+
+      bytes (int): Total size of the members checked.
+
+      seconds (float): Wall time of the check.
+
+    """
+    def __init__(self, failures, members, nbytes, seconds):
+        self.failures = failures
+        self.members = members
+        self.bytes = nbytes
+        self.seconds = seconds
+
+    @property
+    def ok(self):
+        """Whether all members passed the checks"""
+        return not self.failures
+
+    @property
+    def throughput(self):
+        """Bytes of member content checked per second"""
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    def __bool__(self):
+        return self.ok
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return ('VerifyReport(members={}, failures={}, bytes={}, '
+                'throughput={:.1f} MB/s)'.format(
+                    self.members, len(self.failures), self.bytes,
+                    self.throughput / 1e6))
+
+
+def _check_member(archive, name, digest, algorithm, lock):
+    # Return (size, reason or None)
+    crc = archive._member_crc(name)
+    h = hashlib.new(algorithm) if digest is not None else None
+    value = 0
+    size = 0
+    try:
+        with lock:
+            f = archive.open_member(name, 'rb', seekable=False)
+        try:
+            while True:
+                with lock:
+                    chunk = f.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if crc is not None:
+                    value = zlib.crc32(chunk, value)
+                if h is not None:
+                    h.update(chunk)
+        finally:
+            f.close()
+    except Exception as e:
+        return size, '{}: {}'.format(type(e).__name__, e)
+    if crc is not None and value & 0xffffffff != crc:
+        return size, 'CRC-32 mismatch: {:08x} != {:08x}'.format(
+            value & 0xffffffff, crc)
+    if h is not None and h.hexdigest() != digest:
+        return size, '{} mismatch: {} != {}'.format(
+            algorithm, h.hexdigest(), digest)
+    return size, None
+
+
+def verify_archive(archive, members=None, workers=2, digests=None,
+                   algorithm='sha256'):
+    """Check the members of an opened archive, see
+    :meth:`arlib.Archive.verify`
+    """
+    start = time.time()
+    if digests is not None and not isinstance(digests, dict):
+        digests = read_manifest(digests)
+    if digests is not None:
+        digests = dict((_normalize(k), v.lower())
+                       for k, v in digests.items())
+    names = [x for x in archive.member_names if not x.endswith('/')]
+    failures = []
+    if members is not None:
+        members = [archive.validate_member_name(x) for x in members]
+        names = [x for x in members if not x.endswith('/')]
+    elif digests is not None:
+        present = set(names)
+        failures += [(x, 'missing') for x in sorted(digests)
+                     if x not in present]
+    get = (digests or {}).get
+    lock = archive._member_read_lock() or _NullLock()
+    if archive._is_solid():
+        workers = 1
+    total = 0
+    for name, (size, reason) in _map_members(
+            names, workers, _check_member, archive, get, algorithm, lock):
+        total += size
+        if reason is not None:
+            failures.append((name, reason))
+    return VerifyReport(failures, len(names), total, time.time() - start)
+
+
+def _map_members(names, workers, func, archive, get, algorithm, lock):
+    # Yield (name, func(...)) in order, computed by a thread pool
+    if workers <= 1:
+        for name in names:
+            yield name, func(archive, name, get(name), algorithm, lock)
+        return
+    import concurrent.futures
+    pool = concurrent.futures.ThreadPoolExecutor(workers)
+    pending = collections.deque()
+    try:
+        for name in names:
+            pending.append((name, pool.submit(func, archive, name, get(name),
+                                              algorithm, lock)))
+            if len(pending) > 2 * workers:
+                name, future = pending.popleft()
+                yield name, future.result()
+        while pending:
+            name, future = pending.popleft()
+            yield name, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""Engine for zip files using the :mod:`zipfile` module
+"""
+
+import io
+import os
+import time
+import itertools
+import zlib
+import struct
+import zipfile
+
+from ._compat import builtins
+from .archive import (Archive, _check_seekable, _file_identity,
+                      _match_member_name, _COPY_CHUNK)
+from .seekable import IndexedReader, SliceDecoder, ZlibDecoder, _FileRange
+
+
+# Private attributes of zipfile.ZipFile used by ZipArchive._write_raw,
+# which writes already compressed data the way ZipFile.open(..., 'w')
+# writes members. They are not part of the API of zipfile, so raw
+# writes are only used when they are all present, and members are
+# otherwise decompressed and compressed again.
+_RAW_WRITE_ATTRS = ('_lock', '_writing', '_writecheck', '_didModify',
+                    'start_dir', '_seekable', 'fp', 'filelist',
+                    'NameToInfo')
+
+
+def _strip_zip64_extra(extra):
+    # Remove the zip64 extra field, which zipfile writes itself when
+    # needed
+    fields = []
+    i = 0
+    while i + 4 <= len(extra):
+        tag, n = struct.unpack('<HH', extra[i:i+4])
+        if tag != 1:
+            fields.append(extra[i:i+4+n])
+        i += 4 + n
+    return b''.join(fields)
+
+
+def _copy_info(name, info):
+    # ZipInfo of a new member storing the compressed data of info
+    zinfo = zipfile.ZipInfo(name, info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.create_system = info.create_system
+    zinfo.external_attr = info.external_attr
+    zinfo.internal_attr = info.internal_attr
+    zinfo.comment = info.comment
+    zinfo.extra = _strip_zip64_extra(info.extra)
+    # sizes are written in the local header, not in a data descriptor
+    zinfo.flag_bits = info.flag_bits & ~0x08
+    zinfo.CRC = info.CRC
+    zinfo.compress_size = info.compress_size
+    zinfo.file_size = info.file_size
+    return zinfo
+
+
+def _iter_range(source, offset, length):
+    while length > 0:
+        data = source.read_at(offset, min(_COPY_CHUNK, length))
+        if not data:
+            raise EOFError('Archive file ended before the end of the '
+                           'member data')
+        offset += len(data)
+        length -= len(data)
+        yield data
+
+
+class _CrcCheckedReader(io.RawIOBase):
+    """Binary member file object checking the CRC-32 of the content
+
+    The content read in order from the beginning is hashed, and the
+    CRC-32 is compared with the one of the central directory once the
+    end of the member is reached, as :class:`zipfile.ZipExtFile`
+    does. Reads after seeking past the hashed content are not
+    checked until reading gets back to it.
+    """
+
+    def __init__(self, fileobj, info):
+        self._file = fileobj
+        self._info = info
+        self._crc = 0
+        self._hashed = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._file.tell()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def read(self, n=-1):
+        pos = self._file.tell()
+        data = self._file.read(n)
+        if pos <= self._hashed < pos + len(data):
+            self._crc = zlib.crc32(data[self._hashed-pos:], self._crc)
+            self._hashed = pos + len(data)
+            info = self._info
+            if (self._hashed == info.file_size and
+                self._crc & 0xffffffff != info.CRC):
+                raise zipfile.BadZipFile('Bad CRC-32 for file {!r}'
+                                         .format(info.filename))
+        return data
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        n = len(data)
+        b[:n] = data
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super(_CrcCheckedReader, self).close()
+
+
+class ZipArchive(Archive):
+    """Archive engine for *zip* files using the `zipfile` module
+
+    In write mode the archive may be a non-seekable file object, e.g.
+    a socket or the body of an HTTP response: the sizes and CRC of
+    members are then written in data descriptors after their data,
+    and members of unknown size written by
+    :meth:`~Archive.add_members` use ZIP64 extensions.
+    """
+
+    def __init__(self, path, *args, **kwargs):
+        self._need_close = True
+        if isinstance(path, zipfile.ZipFile):
+            self._file = path
+            self._need_close = False
+        else:
+            self._file = zipfile.ZipFile(path, *args, **kwargs)
+
+    @property
+    def member_names(self):
+        names = self._file.namelist()
+        return names
+
+
+    def validate_member_name(self, name):
+        return _match_member_name(name, self._file.NameToInfo)
+
+
+    def open_member(self, name, mode='r', seekable=None, **kwargs):
+        """Open a member file in the zip archive
+
+        Args:
+
+          name (str): Name of the member file
+
+          mode (str): The mode argument to open. Same as in :func:`open`.
+
+          seekable (str, bool, NoneType): None, False or
+            :code:`'indexed'`. See :meth:`Archive.open_member`. Stored
+            and deflated members are decoded directly from the archive
+            file. Their CRC is checked once they are read to the end
+            in order, like members opened by :mod:`zipfile`.
+
+          kwargs: Additional keyword arguments that will be passed
+            to :func:`zipfile.ZipFile.open`, e.g. :code:`pwd`. Members
+            opened with keyword arguments do not use the block cache.
+
+        
+        Return:
+
+          file-like: The opened file object associated with the member
+          file.
+        """
+        if 'r' in mode:
+            name = self.validate_member_name(name)
+            if name.endswith('/'):
+                raise ValueError('Directory member cannot be opened in'
+                                 ' read mode.')
+        _check_seekable(seekable, mode)
+        if (seekable == 'indexed' or seekable is None and 'r' in mode and
+            not kwargs and self._block_cache_options(name) is not None):
+            return self._open_indexed(name, mode)
+        assert 'r' in mode or 'w' in mode
+        mode2 = 'r' if 'r' in mode else 'w'
+        f = self._file.open(name, mode2, **kwargs)
+        if 'b' not in mode:
+            f = io.TextIOWrapper(f)
+        return f
+
+
+    def _raw_source(self):
+        name = self._file.filename
+        if isinstance(name, str) and os.path.isfile(name):
+            return _FileRange(builtins.open(name, 'rb'), close=True)
+        return _FileRange(self._file.fp, lock=getattr(self._file, '_lock',
+                                                      None))
+
+
+    def _archive_identity(self):
+        name = self._file.filename
+        if isinstance(name, str) and os.path.isfile(name):
+            return _file_identity(name)
+        return None
+
+
+    def _member_crc(self, name):
+        return self._file.getinfo(name).CRC
+
+
+    def _iter_member_info(self):
+        for info in self._file.infolist():
+            mtime = time.mktime(info.date_time + (0, 0, -1))
+            yield (info.filename, info.file_size, info.compress_size,
+                   info.header_offset, -1, mtime,
+                   info.filename.endswith('/'))
+
+
+    def _data_offset(self, source, info):
+        # Offset of the compressed data, after the local header
+        header = source.read_at(info.header_offset, 30)
+        if len(header) != 30 or header[:4] != b'PK\x03\x04':
+            raise zipfile.BadZipFile('Bad magic number for file header')
+        n, m = struct.unpack('<HH', header[26:30])
+        return info.header_offset + 30 + n + m
+
+
+    def _indexed_reader(self, name, **kwargs):
+        info = self._file.getinfo(name)
+        if (info.flag_bits & 0x1 or info.compress_type not in
+            (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)):
+            return super(ZipArchive, self)._indexed_reader(name, **kwargs)
+        source = self._raw_source()
+        try:
+            offset = self._data_offset(source, info)
+        except zipfile.BadZipFile:
+            source.close()
+            raise
+        if info.compress_type == zipfile.ZIP_STORED:
+            decoder = SliceDecoder(source, offset, info.file_size)
+        else:
+            decoder = ZlibDecoder(source, offset, info.compress_size, -15)
+        return _CrcCheckedReader(
+            IndexedReader(decoder, size=info.file_size, **kwargs), info)
+
+
+    def _write_member(self, name, fileobj, size):
+        import shutil
+        zf = self._file
+        info = zipfile.ZipInfo(name, time.localtime(time.time())[:6])
+        info.compress_type = zf.compression
+        if getattr(zf, 'compresslevel', None) is not None:
+            info._compresslevel = zf.compresslevel
+        info.external_attr = 0o600 << 16
+        force_zip64 = size is None
+        if size is not None:
+            info.file_size = size
+        with zf.open(info, 'w', force_zip64=force_zip64) as f:
+            shutil.copyfileobj(fileobj, f, _COPY_CHUNK)
+
+
+    def _write_dir(self, name):
+        info = zipfile.ZipInfo(name, time.localtime(time.time())[:6])
+        info.external_attr = 0o40755 << 16 | 0x10
+        self._file.writestr(info, b'')
+
+
+    def _can_write_raw(self):
+        """Whether :meth:`_write_raw` is supported by :mod:`zipfile`"""
+        return (all(hasattr(self._file, x) for x in _RAW_WRITE_ATTRS) and
+                hasattr(zipfile.ZipInfo, 'FileHeader'))
+
+
+    def _write_raw(self, zinfo, chunks):
+        """Write a member from its already compressed data
+
+        It relies on private attributes of :class:`zipfile.ZipFile`,
+        so callers check :meth:`_can_write_raw` first.
+
+        Args:
+
+          zinfo (zipfile.ZipInfo): Information of the member, with
+            the CRC, compressed size and size of the data.
+
+          chunks (Iterable[bytes]): The compressed data. If the
+            archive file is seekable, its position is restored before
+            every write, so :code:`chunks` may read from the archive
+            itself.
+        """
+        zf = self._file
+        with zf._lock:
+            if not zf.fp:
+                raise ValueError('Attempt to write to ZIP archive that '
+                                 'was already closed')
+            if zf._writing:
+                raise ValueError("Can't write to the ZIP file while there "
+                                 "is an open writing handle on it.")
+            zf._writecheck(zinfo)
+            zf._didModify = True
+            zinfo.header_offset = zf.start_dir
+            zip64 = max(zinfo.file_size,
+                        zinfo.compress_size) > zipfile.ZIP64_LIMIT
+            pos = zinfo.header_offset
+            for data in itertools.chain([zinfo.FileHeader(zip64)], chunks):
+                if zf._seekable:
+                    zf.fp.seek(pos)
+                zf.fp.write(data)
+                pos += len(data)
+            if zf._seekable:
+                zf.fp.seek(pos)
+            zf.filelist.append(zinfo)
+            zf.NameToInfo[zinfo.filename] = zinfo
+            zf.start_dir = pos
+
+
+    def _write_duplicate(self, name, original, source):
+        # copy the compressed data back from the archive being written
+        zf = self._file
+        fp = zf.fp
+        if not (self._can_write_raw() and zf._seekable and fp is not None
+                and fp.readable()):
+            return super(ZipArchive, self)._write_duplicate(
+                name, original, source)
+        info = zf.getinfo(original)
+        reader = _FileRange(fp, lock=zf._lock)
+        with zf._lock:
+            offset = self._data_offset(reader, info)
+            self._write_raw(_copy_info(name, info),
+                            _iter_range(reader, offset, info.compress_size))
+
+
+    def _can_copy_raw(self, dest, recompress=False):
+        if not (isinstance(dest, ZipArchive) and dest._can_write_raw()):
+            return False
+        return not recompress or all(
+            self._compressed_as(dest, x) for x in self._file.infolist()
+            if not x.filename.endswith('/'))
+
+
+    def _compressed_as(self, dest, info):
+        # the compression level is not recorded in the archive, so
+        # members are compressed again when dest has an explicit level
+        zf = dest._file
+        return (info.compress_type == zf.compression and
+                getattr(zf, 'compresslevel', None) is None)
+
+
+    def _prepare_member(self, name, data):
+        # compress in the worker thread, zlib releases the GIL
+        zf = self._file
+        if (zf.compression not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+            or not self._can_write_raw()):
+            return super(ZipArchive, self)._prepare_member(name, data)
+        info = zipfile.ZipInfo(name, time.localtime(time.time())[:6])
+        info.compress_type = zf.compression
+        info.external_attr = 0o600 << 16
+        info.file_size = len(data)
+        info.CRC = zlib.crc32(data) & 0xffffffff
+        if zf.compression == zipfile.ZIP_DEFLATED:
+            level = getattr(zf, 'compresslevel', None)
+            if level is None:
+                level = zlib.Z_DEFAULT_COMPRESSION
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+            data = compressor.compress(data) + compressor.flush()
+        info.compress_size = len(data)
+        return info, data
+
+
+    def _write_prepared(self, prepared):
+        info, data = prepared
+        if not isinstance(info, zipfile.ZipInfo):
+            return super(ZipArchive, self)._write_prepared(prepared)
+        self._write_raw(info, [data])
+
+
+    def _copy_member(self, dest, name, size, recompress=False):
+        info = self._file.getinfo(name)
+        # the password check of encrypted members with a data
+        # descriptor depends on the flag, which is cleared by copying
+        if (not self._can_copy_raw(dest) or name.endswith('/') or
+            info.flag_bits & 0x09 == 0x09 or
+            recompress and not self._compressed_as(dest, info)):
+            return super(ZipArchive, self)._copy_member(dest, name, size)
+        source = self._raw_source()
+        try:
+            offset = self._data_offset(source, info)
+            dest._write_raw(_copy_info(name, info),
+                            _iter_range(source, offset, info.compress_size))
+        finally:
+            source.close()
+
+
+    def _close(self):
+        if self._need_close:
+            self._file.close()
@@ -2,7 +2,7 @@ import os, codecs, re
 from setuptools import setup
 
 with open('requirements.txt') as f:
-    reqs = list(f.read().strip().split('\n'))
+    reqs = [x for x in f.read().strip().split('\n') if x]
 
 with open('README.md', 'r') as f:
     long_description = f.read()
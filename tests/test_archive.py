@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import uuid
-import unittest, os, sys, zipfile, tarfile, tempfile, pytest
+import unittest, io, os, sys, zipfile, tarfile, tempfile, pytest
 import shutil
 import arlib
 
@@ -28,11 +28,25 @@ def test_arlib_read(fname):
 @pytest.mark.parametrize('fname, mode, res', [
     ('x.zip', 'w', arlib.ZipArchive),
     ('x.tar.gz', 'w', arlib.TarArchive),
+    ('x.bin', 'w:gz', arlib.TarArchive),
+    ('x.bin', 'w|bz2', arlib.TarArchive),
+    ('x.bin', 'w', None),
     ])
 def test_auto_engine(fname, mode, res):
     assert arlib.auto_engine(fname, mode) is res
 
 
+def test_open_tar_compression_mode(tmp_path):
+    fname = str(tmp_path / 'out.bin')
+    with arlib.open(fname, 'w:gz') as ar:
+        assert isinstance(ar, arlib.TarArchive)
+        ar.add_members({'a.txt': b'a'})
+    with open(fname, 'rb') as f:
+        assert f.read(2) == b'\x1f\x8b'
+    with arlib.open(fname) as ar:
+        assert dict(ar.read_members()) == {'a.txt': b'a'}
+
+
     
 def test_zip_in_tar():
     fname = os.path.join(data_path, 'zip_in_tar.tar')
@@ -153,7 +167,141 @@ def test_extract(fname, members):
                 if ar1.member_is_file(name):
                     assert ar1.open_member(name,'rb').read() == ar2.open_member(name, 'rb').read()
     shutil.rmtree(dst)
-                
+
+
+
+def test_extract_chunked():
+    from arlib.archive import _extract_chunk_size
+    dst = tempfile.mkdtemp()
+    assert _extract_chunk_size(0, dst) == 64 * 1024
+    assert _extract_chunk_size(1 << 40, dst) == 16 * 1024 * 1024
+    assert _extract_chunk_size(1 << 40, dst, max_memory=1000) == 1000
+    assert _extract_chunk_size(-1, dst, chunk_size=123) == 123
+    data = os.urandom(300000)
+    zname = os.path.join(dst, 'x.zip')
+    with zipfile.ZipFile(zname, 'w', zipfile.ZIP_DEFLATED) as f:
+        f.writestr('big.bin', data)
+        f.writestr('../escape.txt', b'x')
+        f.writestr('empty', b'')
+    tname = os.path.join(dst, 'x.tar')
+    with tarfile.open(tname, 'w') as f:
+        info = tarfile.TarInfo('big.bin')
+        info.size = len(data)
+        f.addfile(info, io.BytesIO(data))
+    for fname in [zname, tname]:
+        out = os.path.join(dst, 'out' + fname[-4:])
+        with arlib.open(fname) as ar:
+            ar.extract(out, max_memory=4096)
+            if fname == tname:
+                assert ar._file.copybufsize is None
+        with open(os.path.join(out, 'big.bin'), 'rb') as f:
+            assert f.read() == data
+    # parent components are dropped
+    assert open(os.path.join(dst, 'out.zip', 'escape.txt'), 'rb').read() == b'x'
+    assert os.path.getsize(os.path.join(dst, 'out.zip', 'empty')) == 0
+    assert not os.path.exists(os.path.join(dst, 'escape.txt'))
+    shutil.rmtree(dst)
+
+
+def test_tar_index_sidecar():
+    dst = tempfile.mkdtemp()
+    fname = os.path.join(dst, 'x.tar')
+    index = os.path.join(dst, 'x.tar.idx')
+    with tarfile.open(fname, 'w', format=tarfile.GNU_FORMAT) as f:
+        for i in range(50):
+            data = ('member %d' % i).encode()
+            info = tarfile.TarInfo('dir/' + 'x' * 120 + str(i))
+            info.size = len(data)
+            f.addfile(info, io.BytesIO(data))
+        info = tarfile.TarInfo('link')
+        info.type = tarfile.LNKTYPE
+        info.linkname = 'dir/' + 'x' * 120 + '7'
+        f.addfile(info)
+    with arlib.open(fname, index=index) as ar:
+        names = ar.member_names
+        table = ar.member_table()
+    assert os.path.isfile(index)
+    with arlib.open(fname, index=index) as ar:
+        assert ar.member_names == names
+        name = 'dir/' + 'x' * 120 + '42'
+        with ar.open_member(name, 'rb') as f:
+            assert f.read() == b'member 42'
+        with ar.open_member('link') as f:
+            assert f.read() == 'member 7'
+        with ar.open_member(name, 'rb', seekable='indexed') as f:
+            f.seek(7)
+            assert f.read() == b'42'
+        assert list(ar.member_table()['offset']) == list(table['offset'])
+        # members were opened without scanning the headers
+        assert not ar._file._loaded and ar._infos is None
+    # opening a member does not hide the members before it
+    with arlib.open(fname, index=index) as ar:
+        with ar.open_member(name, 'rb') as f:
+            f.read()
+        out = os.path.join(dst, 'out')
+        ar.extract(out)
+        assert len(ar._file.getmembers()) == 51
+    assert len(os.listdir(os.path.join(out, 'dir'))) == 50
+    # a stale index is rebuilt
+    with tarfile.open(fname, 'a') as f:
+        info = tarfile.TarInfo('new')
+        f.addfile(info, io.BytesIO())
+    with arlib.open(fname, index=index) as ar:
+        assert ar.member_names == names + ['new']
+    with arlib.open(fname, index=index) as ar:
+        assert ar.member_names == names + ['new']
+        assert ar._infos is None
+    shutil.rmtree(dst)
+
+
+class _CountingFile(io.BytesIO):
+    bytes_read = 0
+
+    def read(self, n=-1):
+        data = super(_CountingFile, self).read(n)
+        self.bytes_read += len(data)
+        return data
+
+
+def test_tar_solid_single_pass():
+    members = dict(('m%02d' % i, os.urandom(50000)) for i in range(20))
+    f = io.BytesIO()
+    with tarfile.open(fileobj=f, mode='w:gz') as t:
+        info = tarfile.TarInfo('dir')
+        info.type = tarfile.DIRTYPE
+        t.addfile(info)
+        for name, data in sorted(members.items()):
+            info = tarfile.TarInfo('dir/' + name)
+            info.size = len(data)
+            t.addfile(info, io.BytesIO(data))
+        info = tarfile.TarInfo('link')
+        info.type = tarfile.LNKTYPE
+        info.linkname = 'dir/m03'
+        t.addfile(info)
+    size = len(f.getvalue())
+    raw = _CountingFile(f.getvalue())
+    with arlib.open(raw) as ar:
+        assert ar._is_solid()
+        result = list(ar.read_members(['dir/m15', 'dir/m02', 'dir/m09']))
+        # in archive order, decompressing the archive once
+        assert [x[0] for x in result] == ['dir/m02', 'dir/m09', 'dir/m15']
+        assert result[2][1] == members['m15']
+        assert raw.bytes_read < size * 1.1
+        assert dict(ar.read_members(['link']))['link'] == members['m03']
+        with pytest.raises(ValueError):
+            list(ar.read_members(['missing']))
+    raw = _CountingFile(f.getvalue())
+    dst = tempfile.mkdtemp()
+    with arlib.open(raw) as ar:
+        ar.extract(dst, ['dir/m15', 'dir/m02', 'dir'])
+        assert raw.bytes_read < size * 1.1
+    assert sorted(os.listdir(os.path.join(dst, 'dir'))) == ['m02', 'm15']
+    with open(os.path.join(dst, 'dir', 'm15'), 'rb') as f2:
+        assert f2.read() == members['m15']
+    shutil.rmtree(dst)
+    with arlib.open(_CountingFile(f.getvalue())) as ar:
+        assert len(list(ar.read_members())) == 21
+
 
 def test_tar_archive_fileobj():
     with open(os.path.join(data_path, 'tarfile.tar.gz'), 'rb') as f:
@@ -163,3 +311,393 @@ def test_tar_archive_fileobj():
         with pytest.raises(Exception):
             arlib.TarArchive(f)
     
+
+
+@pytest.mark.parametrize('fname', ['member_check', 'member_check.zip',
+                                   'member_check.tar'])
+def test_member_table(fname):
+    with arlib.open(os.path.join(data_path, fname)) as ar:
+        table = ar.member_table()
+        assert len(table) == len(ar.member_names)
+        assert table.names() == ar.member_names
+        for i, name in enumerate(table.names()):
+            assert bool(table['is_dir'][i]) == ar.member_is_dir(name)
+            if not table['is_dir'][i]:
+                with ar.open_member(name, 'rb') as f:
+                    assert table.size[i] == len(f.read())
+        files = table.select([not x for x in table['is_dir']])
+        assert sorted(files.names()) == ['a.txt', 'dir/b.txt']
+        assert files.take([1, 0]).names() == files.names()[::-1]
+
+
+def test_member_table_offsets():
+    with arlib.open(os.path.join(data_path, 'member_check.tar')) as ar:
+        table = ar.member_table()
+        assert list(table.compressed_size) == list(table.size)
+        offsets = list(table.data_offset)
+        assert offsets == sorted(offsets) and offsets[0] == 512
+
+
+@pytest.mark.parametrize('by', ['count', 'bytes'])
+def test_shard(by):
+    dst = tempfile.mkdtemp()
+    fname = os.path.join(dst, 'shard.zip')
+    sizes = [(i * 37) % 1000 + 1 for i in range(50)]
+    with zipfile.ZipFile(fname, 'w') as f:
+        f.writestr('dir/', b'')
+        for i, size in enumerate(sizes):
+            f.writestr('m%02d' % i, b'x' * size)
+    with arlib.open(fname) as ar:
+        shards = [ar.shard(4, k, by=by) for k in range(4)]
+        assert sum(shards, []) == ['m%02d' % i for i in range(50)]
+        if by == 'count':
+            assert [len(x) for x in shards] == [12, 13, 12, 13]
+        else:
+            totals = [sum(sizes[int(x[1:])] for x in shard)
+                      for shard in shards]
+            assert max(totals) - min(totals) < 2 * max(sizes)
+        with pytest.raises(ValueError):
+            ar.shard(4, 4)
+        with pytest.raises(ValueError):
+            ar.shard(4, 0, by='size')
+    shutil.rmtree(dst)
+
+
+@pytest.mark.parametrize('fname', ['member_check', 'member_check.zip',
+                                   'member_check.tar'])
+def test_prefetch(fname):
+    with arlib.open(os.path.join(data_path, fname)) as ar:
+        names = ['dir/b.txt', 'a.txt', 'dir/b.txt']
+        expected = [(x, ar.open_member(x, 'rb').read()) for x in names]
+        assert list(ar.prefetch(names, depth=2, workers=2)) == expected
+        assert list(ar.prefetch(names, max_bytes=1)) == expected
+        assert sorted(x for x, _ in ar.prefetch()) == ['a.txt', 'dir/b.txt']
+        it = ar.prefetch(names)
+        assert next(it) == expected[0]
+        it.close()
+
+
+def test_prefetch_solid():
+    members = dict(('m%02d' % i, os.urandom(20000)) for i in range(50))
+    f = io.BytesIO()
+    with tarfile.open(fileobj=f, mode='w:gz') as t:
+        for name, data in sorted(members.items()):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            t.addfile(info, io.BytesIO(data))
+    size = len(f.getvalue())
+    raw = _CountingFile(f.getvalue())
+    with arlib.open(raw) as ar:
+        assert len(ar.member_names) == 50
+        raw.bytes_read = 0
+        # the stream is decompressed once even with several workers
+        assert dict(ar.prefetch(workers=4)) == members
+        assert raw.bytes_read < size * 1.1
+
+
+@pytest.mark.parametrize('fname', ['dedup', 'dedup.zip', 'dedup.tar.gz'])
+def test_add_members_dedup(fname):
+    dst = tempfile.mkdtemp()
+    path = os.path.join(dst, fname)
+    payload = os.urandom(1000) * 50
+    with open(os.path.join(dst, 'src.bin'), 'wb') as f:
+        f.write(payload)
+    members = [('d/', None), ('d/a.bin', payload),
+               ('b.bin', os.path.join(dst, 'src.bin')),
+               ('c.txt', b'c'), ('d/e.bin', io.BufferedReader(
+                   io.BytesIO(payload))),
+               ('g.bin', (payload[i:i+4096]
+                          for i in range(0, len(payload), 4096)))]
+    kwargs = {}
+    if fname.endswith('.zip'):
+        kwargs['compression'] = zipfile.ZIP_DEFLATED
+    elif '.' not in fname:
+        kwargs['engine'] = arlib.DirArchive
+    with arlib.open(path, 'w', **kwargs) as ar:
+        duplicates = ar.add_members(members, dedup=True, workers=2)
+    assert duplicates == {'b.bin': 'd/a.bin', 'd/e.bin': 'd/a.bin',
+                          'g.bin': 'd/a.bin'}
+    with arlib.open(path) as ar:
+        assert ar.member_is_dir('d/')
+        assert dict(ar.read_members()) == {
+            'd/a.bin': payload, 'b.bin': payload, 'd/e.bin': payload,
+            'g.bin': payload, 'c.txt': b'c'}
+    if fname.endswith('.zip'):
+        with zipfile.ZipFile(path) as f:
+            assert f.testzip() is None
+            a, b = f.getinfo('d/a.bin'), f.getinfo('b.bin')
+            assert a.compress_size == b.compress_size < len(payload)
+    elif fname.endswith('.tar.gz'):
+        with tarfile.open(path) as f:
+            assert f.getmember('b.bin').islnk()
+    else:
+        assert os.path.samefile(os.path.join(path, 'b.bin'),
+                                os.path.join(path, 'd/a.bin'))
+    shutil.rmtree(dst)
+
+
+def test_add_members_dedup_window(monkeypatch):
+    written = []
+    ahead = []
+
+    def members():
+        for i in range(50):
+            ahead.append(i - len(written))
+            yield 'm%02d' % i, _Pipe(b'%d' % (i % 5) * 1000)
+
+    def counted(write):
+        def wrapper(name, *args):
+            written.append(name)
+            return write(name, *args)
+        return wrapper
+
+    with arlib.open(io.BytesIO(), 'w', engine=arlib.ZipArchive) as ar:
+        for method in ['_write_member', '_write_duplicate']:
+            monkeypatch.setattr(ar, method, counted(getattr(ar, method)))
+        duplicates = ar.add_members(members(), dedup=True, workers=2)
+    assert len(duplicates) == 45 and len(written) == 50
+    # the members are hashed in a window of 2 * workers
+    assert max(ahead) == 2 * 2
+
+
+def test_copy_members_zip_raw(monkeypatch):
+    dst = tempfile.mkdtemp()
+    src = os.path.join(dst, 'src.zip')
+    payload = os.urandom(100) * 100
+    with zipfile.ZipFile(src, 'w') as f:
+        f.writestr('dir/', b'')
+        f.writestr('dir/a.bin', payload, zipfile.ZIP_DEFLATED)
+        f.writestr('b.txt', b'b')
+    with arlib.open(src) as ar, arlib.open(os.path.join(dst, 'x.zip'),
+                                          'w') as out:
+        def fail(*args, **kwargs):
+            raise AssertionError('member decompressed')
+        monkeypatch.setattr(ar._file, 'open', fail)
+        ar.copy_members(out, ['dir', 'dir/a.bin'])
+    with zipfile.ZipFile(os.path.join(dst, 'x.zip')) as f:
+        assert f.testzip() is None
+        assert f.namelist() == ['dir/', 'dir/a.bin']
+        info = f.getinfo('dir/a.bin')
+        assert info.compress_type == zipfile.ZIP_DEFLATED
+        assert f.read('dir/a.bin') == payload
+    shutil.rmtree(dst)
+
+
+def test_zip_raw_write_fallback(monkeypatch):
+    # zipfile without the private attributes used to write raw data
+    import arlib.zip
+    monkeypatch.setattr(arlib.zip, '_RAW_WRITE_ATTRS',
+                        arlib.zip._RAW_WRITE_ATTRS + ('_no_such_attr',))
+
+    def fail(*args):
+        raise AssertionError('raw data written')
+    monkeypatch.setattr(arlib.ZipArchive, '_write_raw', fail)
+    dst = tempfile.mkdtemp()
+    src = os.path.join(dst, 'src.zip')
+    payload = os.urandom(100) * 100
+    with arlib.open(src, 'w', compression=zipfile.ZIP_DEFLATED) as ar:
+        assert ar.add_members([('a.bin', payload), ('b.bin', payload),
+                               ('c.txt', b'c')], dedup=True) == {
+                                   'b.bin': 'a.bin'}
+    with arlib.open(src) as ar, arlib.open(os.path.join(dst, 'x.zip'),
+                                          'w') as out:
+        ar.copy_members(out)
+    arlib.convert(src, os.path.join(dst, 'y.zip'),
+                  compression=zipfile.ZIP_DEFLATED)
+    for fname in ['src.zip', 'x.zip', 'y.zip']:
+        with zipfile.ZipFile(os.path.join(dst, fname)) as f:
+            assert f.testzip() is None
+            assert f.read('b.bin') == payload and f.read('c.txt') == b'c'
+    shutil.rmtree(dst)
+
+
+@pytest.mark.parametrize('src, out', [('member_check.tar', 'x.tar.gz'),
+                                      ('member_check.tar', 'x.zip'),
+                                      ('member_check.zip', 'x.tar'),
+                                      ('member_check', 'x.zip')])
+def test_copy_members(src, out):
+    dst = tempfile.mkdtemp()
+    with arlib.open(os.path.join(data_path, src)) as ar:
+        with arlib.open(os.path.join(dst, out), 'w') as ar2:
+            ar.copy_members(ar2)
+        expected = dict(ar.read_members())
+    with arlib.open(os.path.join(dst, out)) as ar:
+        assert sorted(ar.member_names) == ['a.txt', 'dir/', 'dir/b.txt']
+        assert dict(ar.read_members()) == expected
+    shutil.rmtree(dst)
+
+
+def test_copy_members_tar_hardlink():
+    dst = tempfile.mkdtemp()
+    src = os.path.join(dst, 'src.tar')
+    with arlib.open(src, 'w') as ar:
+        ar.add_members([('a.bin', b'abc'), ('b.bin', b'abc')], dedup=True)
+    with arlib.open(src) as ar:
+        assert list(ar.member_table()['size']) == [3, 3]
+        with arlib.open(os.path.join(dst, 'x.tar'), 'w') as ar2:
+            ar.copy_members(ar2, ['b.bin'])
+    with tarfile.open(os.path.join(dst, 'x.tar')) as f:
+        assert f.getmember('b.bin').isfile()
+        assert f.extractfile('b.bin').read() == b'abc'
+    shutil.rmtree(dst)
+
+
+@pytest.mark.parametrize('src, out', [('x.tar.gz', 'y.zip'),
+                                      ('x.zip', 'y.tar.gz'),
+                                      ('x.zip', 'y.zip'),
+                                      ('x.tar.gz', 'y.tar.xz')])
+def test_convert(src, out):
+    dst = tempfile.mkdtemp()
+    members = dict(('m%02d' % i, os.urandom(10) * (i * 100))
+                   for i in range(20))
+    kwargs = {}
+    if src.endswith('.zip'):
+        kwargs['compression'] = zipfile.ZIP_DEFLATED
+    with arlib.open(os.path.join(dst, src), 'w', **kwargs) as ar:
+        ar.add_members([('dir/', None)] + sorted(members.items()))
+    kwargs = {}
+    if out.endswith('.zip'):
+        kwargs['compression'] = zipfile.ZIP_DEFLATED
+    arlib.convert(os.path.join(dst, src), os.path.join(dst, out),
+                  workers=3, max_bytes=20000, **kwargs)
+    with arlib.open(os.path.join(dst, out)) as ar:
+        assert ar.member_names == ['dir/'] + sorted(members)
+        assert dict(ar.read_members()) == members
+    if out.endswith('.zip'):
+        with zipfile.ZipFile(os.path.join(dst, out)) as f:
+            assert f.testzip() is None
+            assert f.getinfo('m10').compress_type == zipfile.ZIP_DEFLATED
+    shutil.rmtree(dst)
+
+
+class _Sink(io.RawIOBase):
+    # non-seekable writable file object, e.g. a socket
+    def __init__(self):
+        self.data = io.BytesIO()
+    def writable(self):
+        return True
+    def write(self, b):
+        return self.data.write(b)
+
+
+def _chunks(n, seed):
+    for i in range(n):
+        yield bytes([(seed + i) % 256]) * 1000
+
+
+@pytest.mark.parametrize('mode, engine', [('w', arlib.ZipArchive),
+                                          ('w', arlib.TarArchive),
+                                          ('w|gz', None),
+                                          ('w:xz', arlib.TarArchive)])
+def test_streaming_write(mode, engine):
+    sink = _Sink()
+    expected = {'a.bin': b''.join(_chunks(300, 1)),
+                'b.bin': b''.join(_chunks(50, 2)), 'c.txt': b'c'}
+    with arlib.open(sink, mode, engine=engine) as ar:
+        ar.add_members([('dir/', None), ('a.bin', _chunks(300, 1)),
+                        ('b.bin', _chunks(50, 2), 50000),
+                        ('c.txt', b'c')])
+        if engine is arlib.ZipArchive:
+            with ar.open_member('d.txt', 'wb', force_zip64=True) as f:
+                f.write(b'd')
+            expected['d.txt'] = b'd'
+    sink.data.seek(0)
+    with arlib.open(sink.data, engine=engine or arlib.TarArchive) as ar:
+        assert ar.member_is_dir('dir')
+        assert dict(ar.read_members()) == expected
+    if engine is arlib.ZipArchive:
+        with zipfile.ZipFile(sink.data) as f:
+            assert f.testzip() is None
+            assert f.getinfo('a.bin').flag_bits & 0x08
+
+
+class _Pipe(io.RawIOBase):
+    # non-seekable readable file object, e.g. a pipe
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+    def readable(self):
+        return True
+    def readinto(self, b):
+        return self.data.readinto(b)
+
+
+@pytest.mark.parametrize('fname', ['tarfile.tar.gz', 'tarfile.tar.xz',
+                                   'member_check.tar'])
+def test_streaming_read(fname):
+    fname = os.path.join(data_path, fname)
+    with tarfile.open(fname) as t:
+        expected = dict((x.name, t.extractfile(x).read())
+                        for x in t.getmembers() if x.isfile())
+    with open(fname, 'rb') as f:
+        pipe = _Pipe(f.read())
+    with arlib.TarArchive(pipe) as ar:
+        assert dict(ar.read_members()) == expected
+    with arlib.TarArchive(_Pipe(pipe.data.getvalue())) as ar:
+        with pytest.raises(io.UnsupportedOperation):
+            ar.open_member(sorted(expected)[0], 'rb')
+    dst = tempfile.mkdtemp()
+    with arlib.TarArchive(_Pipe(pipe.data.getvalue())) as ar:
+        ar.extract(dst)
+    for name, data in expected.items():
+        with open(os.path.join(dst, name), 'rb') as f:
+            assert f.read() == data
+    shutil.rmtree(dst)
+
+
+@pytest.mark.parametrize('src, out', [
+    (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED),
+    (zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED),
+    (zipfile.ZIP_DEFLATED, zipfile.ZIP_DEFLATED)])
+def test_convert_zip_compression(src, out):
+    dst = tempfile.mkdtemp()
+    members = {'a.txt': b'a' * 100, 'big.bin': b'big' * 20000}
+    with zipfile.ZipFile(os.path.join(dst, 'x.zip'), 'w', src) as f:
+        f.writestr('dir/', b'')
+        for name, data in sorted(members.items()):
+            f.writestr(name, data)
+    # big.bin is larger than half of max_bytes and copied on its own
+    arlib.convert(os.path.join(dst, 'x.zip'), os.path.join(dst, 'y.zip'),
+                  max_bytes=50000, compression=out)
+    with zipfile.ZipFile(os.path.join(dst, 'y.zip')) as f:
+        assert f.testzip() is None
+        for name, data in members.items():
+            assert f.getinfo(name).compress_type == out
+            assert f.read(name) == data
+    arlib.convert(os.path.join(dst, 'x.zip'), os.path.join(dst, 'z.zip'),
+                  compression=src, compresslevel=1)
+    with zipfile.ZipFile(os.path.join(dst, 'z.zip')) as f:
+        assert dict((x, f.read(x)) for x in members) == members
+    shutil.rmtree(dst)
+
+
+def test_convert_solid():
+    members = dict(('m%02d' % i, os.urandom(20000)) for i in range(50))
+    f = io.BytesIO()
+    with tarfile.open(fileobj=f, mode='w:gz') as t:
+        for name, data in sorted(members.items()):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            t.addfile(info, io.BytesIO(data))
+    size = len(f.getvalue())
+    raw = _CountingFile(f.getvalue())
+    out = io.BytesIO()
+    with arlib.open(raw) as ar:
+        assert len(ar.member_names) == 50
+        raw.bytes_read = 0
+        arlib.convert(ar, out, engine=arlib.ZipArchive, workers=4,
+                      compression=zipfile.ZIP_DEFLATED)
+        # the source is decompressed once, only compression is parallel
+        assert raw.bytes_read < size * 1.1
+    with zipfile.ZipFile(out) as zf:
+        assert dict((x, zf.read(x)) for x in zf.namelist()) == members
+
+
+def test_convert_to_stream():
+    sink = _Sink()
+    fname = os.path.join(data_path, 'member_check.tar')
+    arlib.convert(fname, sink, engine=arlib.ZipArchive,
+                  compression=zipfile.ZIP_DEFLATED)
+    sink.data.seek(0)
+    with zipfile.ZipFile(sink.data) as f, tarfile.open(fname) as t:
+        assert f.testzip() is None
+        assert f.read('dir/b.txt') == t.extractfile('dir/b.txt').read()
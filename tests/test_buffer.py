@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import io, os, mmap, tarfile, zipfile, tempfile, shutil, pytest
+import arlib
+
+data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+members = {'a.txt': b'hello world\n', 'dir/b.bin': os.urandom(100000)}
+
+
+def make_zip(compression):
+    f = io.BytesIO()
+    with zipfile.ZipFile(f, 'w', compression) as zf:
+        zf.writestr('dir/', b'')
+        for name, data in sorted(members.items()):
+            zf.writestr(name, data)
+    return f.getvalue()
+
+
+def make_tar(mode):
+    f = io.BytesIO()
+    with tarfile.open(fileobj=f, mode=mode) as tf:
+        for name, data in sorted(members.items()):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+        info = tarfile.TarInfo('link')
+        info.type = tarfile.LNKTYPE
+        info.linkname = 'a.txt'
+        tf.addfile(info)
+    return f.getvalue()
+
+
+@pytest.mark.parametrize('data,stored', [
+    (make_zip(zipfile.ZIP_STORED), True),
+    (make_zip(zipfile.ZIP_DEFLATED), False),
+    (make_tar('w'), True),
+    (make_tar('w:gz'), False)], ids=['zip', 'zip-deflated', 'tar', 'tgz'])
+@pytest.mark.parametrize('wrap', [bytes, bytearray, memoryview])
+def test_buffer_archive(data, stored, wrap):
+    buffer = wrap(data)
+    assert arlib.is_archive(buffer)
+    with arlib.open(buffer) as ar:
+        assert isinstance(ar, arlib.BufferArchive)
+        assert set(members) <= set(ar.member_names)
+        for name, content in members.items():
+            with ar.open_member(name, 'rb') as f:
+                assert f.read() == content
+            with ar.open_member(name, 'rb', seekable='indexed') as f:
+                f.seek(5)
+                assert f.read(3) == content[5:8]
+        with ar.open_member('a.txt') as f:
+            assert f.read() == 'hello world\n'
+        read = dict(ar.read_members())
+        for name, content in members.items():
+            assert read[name] == content
+        if stored:
+            view = ar.member_view('dir/b.bin')
+            assert view.readonly and view.tobytes() == members['dir/b.bin']
+            # the view points into the buffer, no copy was made
+            assert view.obj is not None and len(view.obj) == len(data)
+            view.release()
+        else:
+            with pytest.raises(ValueError):
+                ar.member_view('a.txt')
+        if 'link' in ar.member_names:
+            with ar.open_member('link', 'rb') as f:
+                assert f.read() == members['a.txt']
+
+
+@pytest.mark.parametrize('fname,names', [
+    ('zip_in_tar.tar', ['a/', 'a/a.zip', 'b.zip']),
+    ('member_check.zip', None),
+    ('tarfile.tar.xz', None)])
+def test_buffer_archive_detection(fname, names):
+    fname = os.path.join(data_path, fname)
+    with open(fname, 'rb') as f:
+        data = f.read()
+    with arlib.open(fname) as ar:
+        expected = ar.member_names
+        engine = type(ar)
+    with arlib.open(data) as ar:
+        assert isinstance(ar, engine)
+        assert ar.member_names == (names or expected)
+
+
+def test_buffer_archive_mmap():
+    dst = tempfile.mkdtemp()
+    fname = os.path.join(dst, 'x.zip')
+    with open(fname, 'wb') as f:
+        f.write(make_zip(zipfile.ZIP_STORED))
+    with open(fname, 'rb') as f:
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with arlib.open(m) as ar:
+        assert bytes(ar.member_view('a.txt')) == members['a.txt']
+    m.close()
+    shutil.rmtree(dst)
+
+
+def test_buffer_archive_errors():
+    with pytest.raises(ValueError):
+        arlib.BufferArchive(b'\x00' * 1024)
+    with pytest.raises(ValueError):
+        arlib.BufferArchive(bytearray(make_zip(zipfile.ZIP_STORED)), 'w')
+    assert not arlib.is_archive(bytearray(1024))
+
+
+def test_tar_file_object_auto_engine():
+    for mode in ['w', 'w:gz', 'w:bz2']:
+        with arlib.open(io.BytesIO(make_tar(mode))) as ar:
+            assert isinstance(ar, arlib.TarArchive)
+            assert set(members) <= set(ar.member_names)
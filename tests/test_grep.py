@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import os, io, re, random, zipfile, tarfile, tempfile, shutil, pytest
+import arlib
+from arlib.grep import scan
+
+
+def test_scan_chunk_boundaries():
+    rnd = random.Random(0)
+    data = bytes(rnd.choice(b'abn') for _ in range(20000))
+    pattern = re.compile(b'ab+n|nna')
+    expected = [(m.start(), m.group()) for m in pattern.finditer(data)]
+    assert expected
+    for chunk_size in [1, 7, 64, 4096]:
+        f = io.BytesIO(data)
+        assert list(scan(f.read, pattern, chunk_size, overlap=64)) == expected
+    # str patterns are encoded, empty matches are skipped
+    assert list(scan(io.BytesIO(u'xé'.encode('utf-8')).read, u'é|z*')) == [
+        (1, u'é'.encode('utf-8'))]
+
+
+def test_scan_small_overlap():
+    rnd = random.Random(1)
+    data = bytes(rnd.choice(b'ab') for _ in range(2000))
+    for pattern in [b'b.a', b'a{1,4}b']:
+        expected = [(m.start(), m.group())
+                    for m in re.finditer(pattern, data)]
+        size = max(len(x) for _, x in expected)
+        for chunk_size in [1, 2, 5, 6, 7]:
+            # matches cross chunk boundaries
+            assert any(x // chunk_size != (x + len(m) - 1) // chunk_size
+                       for x, m in expected)
+            f = io.BytesIO(data)
+            assert list(scan(f.read, pattern, chunk_size, size)) == expected
+    with pytest.raises(ValueError):
+        list(scan(io.BytesIO(data).read, b'b.a', 6, overlap=0))
+    with pytest.raises(ValueError):
+        list(arlib.search([], b'b.a', overlap=0))
+
+
+@pytest.fixture(scope='module')
+def archives():
+    dst = tempfile.mkdtemp()
+    members = {}
+    for i in range(12):
+        data = os.urandom(50000).replace(b'needle', b'')
+        if i % 3 == 0:
+            data = data[:1000*i] + b'needle' + data[1000*i:]
+        members['m%02d' % i] = data
+    with zipfile.ZipFile(os.path.join(dst, 'x.zip'), 'w',
+                         zipfile.ZIP_DEFLATED) as f:
+        for name, data in sorted(members.items()):
+            f.writestr(name, data)
+    with tarfile.open(os.path.join(dst, 'x.tar.gz'), 'w:gz') as f:
+        for name, data in sorted(members.items()):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            f.addfile(info, io.BytesIO(data))
+    yield dst, members
+    shutil.rmtree(dst)
+
+
+@pytest.mark.parametrize('fname', ['x.zip', 'x.tar.gz'])
+def test_archive_search(archives, fname):
+    dst, members = archives
+    expected = [('m%02d' % i, 1000*i, b'needle') for i in range(0, 12, 3)]
+    with arlib.open(os.path.join(dst, fname)) as ar:
+        assert list(ar.search(b'needle', workers=3, chunk_size=4000,
+                              overlap=100)) == expected
+        assert list(ar.search('need+le', ['m03', 'm04'])) == expected[1:2]
+
+
+@pytest.mark.parametrize('processes', [False, True])
+def test_search_many(archives, processes):
+    dst, _ = archives
+    paths = [os.path.join(dst, x) for x in ['x.zip', 'x.tar.gz']]
+    matches = list(arlib.search(paths, re.compile(b'needle'), members=['m06'],
+                                workers=2, processes=processes))
+    assert matches == [(paths[0], 'm06', 6000, b'needle'),
+                       (paths[1], 'm06', 6000, b'needle')]
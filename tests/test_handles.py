@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import os, zipfile, tempfile, shutil, pytest
+import arlib
+
+data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+@pytest.fixture
+def cache():
+    cache = arlib.HandleCache(max_open=2)
+    previous = arlib.set_handle_cache(cache)
+    yield cache
+    arlib.set_handle_cache(previous)
+    cache.clear()
+
+
+def test_handle_cache_reuse(cache):
+    fname = os.path.join(data_path, 'member_check.zip')
+    with arlib.open(fname) as ar:
+        assert ar.member_names
+    with arlib.open(fname) as ar2:
+        # a handle sharing the opened zip file
+        assert ar2 is not ar and ar2._file is ar._file
+        assert not ar._file.fp is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    # other modes and file objects are not cached
+    with open(fname, 'rb') as f:
+        with arlib.open(f) as ar3:
+            assert ar3 is not ar
+    assert len(cache) == 1
+
+
+def test_handle_cache_eviction(cache):
+    names = ['member_check.zip', 'member_check.tar', 'zipfile.zip']
+    opened = [arlib.open(os.path.join(data_path, x)) for x in names]
+    # all archives are in use
+    assert cache.stats()['open'] == 3
+    opened[1].close()
+    assert cache.stats() == {'hits': 0, 'misses': 3, 'evictions': 1,
+                             'open': 2, 'in_use': 2}
+    assert opened[1]._file.closed
+    opened[0].close()
+    opened[2].close()
+    assert opened[0]._file.fp is not None
+    with arlib.open(os.path.join(data_path, names[1])) as ar:
+        assert ar._file is not opened[1]._file
+    assert opened[0]._file.fp is None
+
+
+def test_handle_cache_double_release(cache):
+    fname = os.path.join(data_path, 'member_check.zip')
+    ar = arlib.open(fname)
+    ar2 = arlib.open(fname)
+    assert cache.stats()['in_use'] == 1
+    ar.close()
+    ar.close()
+    # the lease of ar2 is kept
+    assert cache.stats()['in_use'] == 1
+    cache.clear()
+    assert ar2._file.fp is not None
+    assert sorted(ar2.member_names) == ['a.txt', 'dir/', 'dir/b.txt']
+    ar2.close()
+    assert ar2._file.fp is None
+    ar2.close()
+
+
+def test_handle_cache_rewritten_file(cache):
+    dst = tempfile.mkdtemp()
+    fname = os.path.join(dst, 'x.zip')
+    with zipfile.ZipFile(fname, 'w') as f:
+        f.writestr('a', b'a')
+    with arlib.open(fname) as ar:
+        assert ar.member_names == ['a']
+    with zipfile.ZipFile(fname, 'w') as f:
+        f.writestr('a', b'a')
+        f.writestr('b', b'b')
+    os.utime(fname, (0, 0))
+    with arlib.open(fname) as ar2:
+        assert ar2 is not ar and ar2.member_names == ['a', 'b']
+    cache.clear()
+    assert len(cache) == 0
+    shutil.rmtree(dst)
+
+
+def test_open_many(cache):
+    names = ['member_check.zip', 'member_check.tar', 'member_check',
+             'member_check.zip', 'tarfile.tar.gz']
+    paths = [os.path.join(data_path, x) for x in names]
+    archives = []
+    for ar in arlib.open_many(paths, workers=2):
+        archives.append((type(ar), sorted(ar.member_names)))
+        ar.close()
+    assert [x for x, _ in archives] == [
+        arlib.ZipArchive, arlib.TarArchive, arlib.DirArchive,
+        arlib.ZipArchive, arlib.TarArchive]
+    assert archives[0][1] == ['a.txt', 'dir/', 'dir/b.txt']
+    assert cache.stats()['open'] <= 2
+    it = arlib.open_many(paths, workers=1)
+    next(it).close()
+    it.close()
+    assert cache.stats()['in_use'] == 0
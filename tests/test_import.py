@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import os, sys, subprocess, pytest
+
+data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+heavy_modules = ['tarfile', 'zipfile', 'shutil', 'fnmatch', 'decoutils',
+                 'concurrent.futures', 'logging', 'hashlib', 'arlib.tar',
+                 'arlib.zip', 'arlib.directory', 'arlib.archive',
+                 'arlib.trace', 'json']
+
+
+def imported_modules(code):
+    script = (code + '\nimport sys\nprint(" ".join(m for m in %r if m in '
+              'sys.modules))' % heavy_modules)
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join([root, env.get('PYTHONPATH', '')])
+    out = subprocess.check_output([sys.executable, '-c', script], env=env)
+    return out.decode().split()
+
+
+def test_import_is_lazy():
+    assert imported_modules('import arlib') == []
+
+
+@pytest.mark.parametrize('fname, unexpected', [
+    ('zipfile.zip', ['tarfile', 'arlib.tar']),
+    ('tarfile.tar.gz', ['zipfile', 'arlib.zip', 'arlib.trace', 'json']),
+    ('dir', ['tarfile', 'zipfile', 'arlib.tar', 'arlib.zip']),
+    ])
+def test_detection_imports_only_matching_engine(fname, unexpected):
+    code = 'import arlib\narlib.open(%r).close()' % os.path.join(data_path,
+                                                                 fname)
+    modules = imported_modules(code)
+    assert not set(unexpected) & set(modules)
+
+
+def test_lazy_attributes():
+    import arlib
+    assert arlib.TarArchive.__module__ == 'arlib.tar'
+    assert 'ZipArchive' in dir(arlib)
+    assert arlib.auto_engine_zip('x.zip', 'w') is arlib.ZipArchive
+    with pytest.raises(AttributeError):
+        arlib.NoSuchEngine
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import os, sys, textwrap, pytest
+import arlib
+
+data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+@pytest.fixture
+def registry():
+    saved = list(arlib._auto_engine)
+    yield
+    arlib._auto_engine[:] = saved
+
+
+@pytest.fixture
+def plugin_dir(tmp_path, monkeypatch):
+    pkg = tmp_path / 'arlib_fake'
+    pkg.mkdir()
+    (pkg / '__init__.py').write_text('')
+    (pkg / 'descriptor.py').write_text(textwrap.dedent('''
+        import arlib
+        DESCRIPTOR = arlib.EngineDescriptor(
+            'fake', 'arlib_fake.engine:FakeArchive',
+            magic=[b'FAKE'], extensions=['.fake'], modes='rw',
+            priority=10)
+        '''))
+    (pkg / 'engine.py').write_text(textwrap.dedent('''
+        import arlib
+        class FakeArchive(arlib.DirArchive):
+            pass
+        '''))
+    info = tmp_path / 'arlib_fake-1.0.dist-info'
+    info.mkdir()
+    (info / 'entry_points.txt').write_text(
+        '[console_scripts]\nfake = arlib_fake:main\n\n'
+        '[arlib.engines]\nfake = arlib_fake.descriptor:DESCRIPTOR\n')
+    (tmp_path / 'a.fake').write_bytes(b'FAKE archive')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield tmp_path
+    for name in ['arlib_fake', 'arlib_fake.descriptor', 'arlib_fake.engine']:
+        sys.modules.pop(name, None)
+
+
+def test_entry_point_plugin(registry, plugin_dir):
+    arlib.load_plugins(force=True)
+    names = [x.name for x in arlib.engine_descriptors()]
+    assert names[0] == 'fake' and 'zip' in names
+    assert 'arlib_fake.engine' not in sys.modules
+    assert arlib.auto_engine(os.path.join(data_path, 'zipfile.zip')) \
+        is arlib.ZipArchive
+    assert 'arlib_fake.engine' not in sys.modules
+    engine = arlib.auto_engine(str(plugin_dir / 'a.fake'))
+    assert engine.__name__ == 'FakeArchive'
+    assert arlib.auto_engine('b.fake', 'w') is engine
+    arlib.load_plugins(force=True)
+    assert names == [x.name for x in arlib.engine_descriptors()]
+
+
+def test_descriptor_skips_detection(registry):
+    calls = []
+    def detect(path, mode):
+        calls.append(path)
+        return arlib.DirArchive
+    arlib.register_engine(arlib.EngineDescriptor(
+        'custom', arlib.DirArchive, detect=detect, magic=[(2, b'XY')],
+        extensions=['.xy'], modes='rw'), priority=0)
+    assert arlib.auto_engine(os.path.join(data_path, 'zipfile.zip')) \
+        is arlib.ZipArchive
+    assert arlib.auto_engine('a.tar.gz', 'w') is arlib.TarArchive
+    assert calls == []
+    assert arlib.auto_engine('a.xy', 'w') is arlib.DirArchive
+    assert calls == ['a.xy']
+
+
+def test_legacy_function_always_called(registry):
+    calls = []
+    @arlib.register_auto_engine(priority=0)
+    def func(path, mode):
+        calls.append(path)
+    assert arlib.auto_engine('a.zip', 'w') is arlib.ZipArchive
+    assert calls == ['a.zip']
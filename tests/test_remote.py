@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import os, zipfile, tempfile, shutil, pytest
+import arlib
+from arlib.testing import HTTPTestServer
+
+
+@pytest.fixture(scope='module')
+def server():
+    dst = tempfile.mkdtemp()
+    members = dict(('m%02d' % i, os.urandom(64 * 1024)) for i in range(40))
+    with zipfile.ZipFile(os.path.join(dst, 'x.zip'), 'w') as f:
+        for name, data in sorted(members.items()):
+            f.writestr(name, data)
+    with open(os.path.join(dst, 'empty.bin'), 'wb'):
+        pass
+    with HTTPTestServer(dst) as server:
+        yield server, members
+    shutil.rmtree(dst)
+
+
+def test_http_range_file(server):
+    server, _ = server
+    path = os.path.join(server.directory, 'x.zip')
+    with open(path, 'rb') as f:
+        data = f.read()
+    with arlib.HTTPRangeFile(server.url('x.zip'), block_size=1000,
+                             cache_blocks=8) as f:
+        assert f.size == len(data) and f.requests == 1
+        f.seek(123456)
+        assert f.read(5000) == data[123456:128456]
+        # the 6 missing blocks are fetched with one request
+        assert f.requests == 2
+        f.seek(123456)
+        assert f.read(10) == data[123456:123466]
+        assert f.requests == 2
+        f.seek(-10, os.SEEK_END)
+        assert f.read() == data[-10:]
+        assert f.read() == b''
+    with arlib.HTTPRangeFile(server.url('empty.bin')) as f:
+        assert f.size == 0 and f.read() == b''
+    with pytest.raises(IOError):
+        arlib.HTTPRangeFile(server.url('missing.zip'))
+    with pytest.raises(ValueError):
+        arlib.HTTPRangeFile('ftp://localhost/x.zip')
+
+
+def test_http_server_directory(server):
+    server, _ = server
+    parent = os.path.dirname(server.directory)
+    name = os.path.basename(server.directory)
+    url = server.url('x.zip').rsplit('/', 1)[0]
+    # only the served directory is reachable, not e.g. its parent
+    for path in ['/../' + name + '/x.zip', '/%2e%2e/' + name + '/x.zip']:
+        with arlib.HTTPRangeFile(url + path) as f:
+            assert f.size == os.path.getsize(
+                os.path.join(server.directory, 'x.zip'))
+    with tempfile.NamedTemporaryFile(dir=parent) as f:
+        outside = os.path.basename(f.name)
+        for path in ['/../' + outside, '/%2e%2e/' + outside,
+                     '/sub/../../' + outside]:
+            with pytest.raises(IOError):
+                arlib.HTTPRangeFile(url + path)
+
+
+def test_http_zip_reads_only_needed_bytes(server):
+    server, members = server
+    del server.requests[:]
+    with arlib.open(arlib.HTTPRangeFile(server.url('x.zip'),
+                                        block_size=16*1024)) as ar:
+        assert ar.member_names == sorted(members)
+        with ar.open_member('m17', 'rb') as f:
+            assert f.read() == members['m17']
+        fetched = ar._file.fp.bytes_fetched
+    total = os.path.getsize(os.path.join(server.directory, 'x.zip'))
+    assert fetched < total // 10
+    assert all(x[2] is not None for x in server.requests)
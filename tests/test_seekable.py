@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+import os, io, random, tarfile, zipfile, tempfile, shutil, pytest
+import arlib
+from arlib.seekable import (IndexedReader, ZlibDecoder, StreamDecoder,
+                            CheckpointIndex, _FileRange)
+
+data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+def make_data(size, seed=0):
+    rnd = random.Random(seed)
+    words = [b'alpha', b'beta', b'gamma', b'delta', b'\n']
+    out = []
+    n = 0
+    while n < size:
+        w = rnd.choice(words)
+        out.append(w)
+        n += len(w)
+    return b''.join(out)[:size]
+
+
+@pytest.fixture(scope='module')
+def archives():
+    dst = tempfile.mkdtemp()
+    members = {'a.bin': make_data(300000, 1), 'b.bin': make_data(200000, 2)}
+    with zipfile.ZipFile(os.path.join(dst, 'x.zip'), 'w',
+                         zipfile.ZIP_DEFLATED) as f:
+        for name, data in sorted(members.items()):
+            f.writestr(name, data)
+    with zipfile.ZipFile(os.path.join(dst, 'stored.zip'), 'w') as f:
+        for name, data in sorted(members.items()):
+            f.writestr(name, data)
+    for ext in ['tar', 'tar.gz', 'tar.xz']:
+        mode = 'w' if ext == 'tar' else 'w:'+ext.split('.')[1]
+        with tarfile.open(os.path.join(dst, 'x.'+ext), mode) as f:
+            for name, data in sorted(members.items()):
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                f.addfile(info, io.BytesIO(data))
+    yield dst, members
+    shutil.rmtree(dst)
+
+
+@pytest.mark.parametrize('fname', ['x.zip', 'stored.zip', 'x.tar',
+                                   'x.tar.gz', 'x.tar.xz'])
+def test_indexed_random_access(archives, fname):
+    dst, members = archives
+    rnd = random.Random(3)
+    with arlib.open(os.path.join(dst, fname)) as ar:
+        for name, data in sorted(members.items()):
+            with ar.open_member(name, 'rb', seekable='indexed') as f:
+                assert f.seekable()
+                assert f.seek(0, os.SEEK_END) == len(data)
+                for _ in range(20):
+                    pos = rnd.randrange(len(data))
+                    n = rnd.randrange(1, 70000)
+                    f.seek(pos)
+                    assert f.read(n) == data[pos:pos+n]
+                    assert f.tell() == min(pos+n, len(data))
+                f.seek(-10, os.SEEK_END)
+                assert f.read() == data[-10:]
+
+
+def test_indexed_text_mode(archives):
+    dst, members = archives
+    with arlib.open(os.path.join(dst, 'x.zip')) as ar:
+        with ar.open_member('a.bin', 'r', seekable='indexed') as f:
+            assert f.read() == members['a.bin'].decode()
+    with arlib.open(os.path.join(data_path, 'dir')) as ar:
+        with ar.open_member('a.txt', seekable='indexed') as f:
+            assert f.read() == 'a'
+
+
+def test_indexed_invalid_argument(archives):
+    dst, _ = archives
+    with arlib.open(os.path.join(dst, 'x.zip')) as ar:
+        with pytest.raises(ValueError):
+            ar.open_member('a.bin', 'rb', seekable='yes')
+
+
+def test_checkpoints_reused(archives):
+    dst, members = archives
+    data = members['a.bin']
+    with open(os.path.join(dst, 'x.tar.gz'), 'rb') as raw:
+        decoder = ZlibDecoder(_FileRange(raw), 0, None, 31)
+        checkpoints = CheckpointIndex()
+        reader = IndexedReader(decoder, block_size=4096,
+                               checkpoint_interval=16384,
+                               checkpoints=checkpoints, cache_blocks=2)
+        total = reader.seek(0, os.SEEK_END)
+        assert len(checkpoints) >= total // 16384 - 1
+        resets = []
+        decoder.reset = lambda: resets.append(1)
+        # a.bin is the first member, its data follows one header block
+        reader.seek(200000)
+        block = reader.read(100)
+        assert block == data[200000-512:200100-512]
+        reader.seek(100000)
+        assert reader.read(100) == data[100000-512:100100-512]
+        reader.seek(200000)
+        assert reader.read(100) == block
+        assert resets == []
+
+
+def test_stream_decoder_reopens():
+    data = make_data(50000)
+    opened = []
+    def opener():
+        opened.append(1)
+        return io.BytesIO(data)
+    reader = IndexedReader(StreamDecoder(opener), block_size=1024,
+                           cache_blocks=1)
+    assert reader.seek(0, os.SEEK_END) == len(data)
+    reader.seek(100)
+    assert reader.read(10) == data[100:110]
+    assert len(opened) == 2
+
+
+
+@pytest.mark.parametrize('policy', ['lru', 'arc'])
+def test_block_cache_eviction(policy):
+    cache = arlib.BlockCache(max_bytes=30, policy=policy)
+    for i in range(5):
+        cache.put(('k', i), b'x'*10)
+    assert cache.nbytes <= 30
+    assert cache.get(('k', 0)) is None
+    assert cache.get(('k', 4)) == b'x'*10
+    stats = cache.stats()
+    assert stats['evictions'] == 2
+    assert (stats['hits'], stats['misses']) == (1, 1)
+    cache.clear()
+    assert len(cache) == 0 and cache.hits == 0
+
+
+def test_block_cache_arc_keeps_frequent_blocks():
+    cache = arlib.BlockCache(max_bytes=40, policy='arc')
+    for i in range(2):
+        cache.put(('hot', i), b'x'*10)
+        cache.get(('hot', i))
+    for i in range(10):
+        cache.put(('scan', i), b'y'*10)
+    assert cache.get(('hot', 0)) is not None
+    assert cache.get(('hot', 1)) is not None
+
+
+def test_block_cache_spill(tmp_path):
+    cache = arlib.BlockCache(max_bytes=10, spill_dir=str(tmp_path/'spill'))
+    cache.put('a', b'a'*10)
+    cache.put('b', b'b'*10)
+    assert cache.stats()['disk_blocks'] == 1
+    assert cache.get('a') == b'a'*10
+    assert cache.disk_hits == 1
+    with pytest.raises(ValueError):
+        arlib.BlockCache(policy='fifo')
+
+
+@pytest.mark.parametrize('fname', ['x.zip', 'x.tar.gz', 'x.tar.xz'])
+def test_block_cache_shared_across_opens(archives, fname):
+    dst, members = archives
+    cache = arlib.BlockCache(max_bytes=4*1024*1024)
+    previous = arlib.set_block_cache(cache)
+    try:
+        for epoch in range(2):
+            with arlib.open(os.path.join(dst, fname)) as ar:
+                assert dict(ar.read_members()) == members
+            if epoch == 0:
+                misses = cache.misses
+                assert misses > 0 and cache.hits == 0
+        assert cache.misses == misses
+        assert cache.hits == misses
+    finally:
+        arlib.set_block_cache(previous)
+    assert arlib.get_block_cache() is previous
+
+
+def test_block_cache_zip_write(tmp_path):
+    fname = str(tmp_path / 'x.zip')
+    with zipfile.ZipFile(fname, 'w') as f:
+        f.writestr('a', b'a')
+    cache = arlib.BlockCache(max_bytes=1024*1024)
+    previous = arlib.set_block_cache(cache)
+    try:
+        with arlib.open(fname, 'a') as ar:
+            with ar.open_member('b', 'wb') as f:
+                f.write(b'b')
+        with arlib.open(fname) as ar:
+            assert dict(ar.read_members()) == {'a': b'a', 'b': b'b'}
+    finally:
+        arlib.set_block_cache(previous)
+
+
+@pytest.mark.parametrize('compression', [zipfile.ZIP_STORED,
+                                         zipfile.ZIP_DEFLATED])
+def test_block_cache_zip_crc(tmp_path, compression):
+    fname = str(tmp_path / 'x.zip')
+    data = make_data(100000)
+    with zipfile.ZipFile(fname, 'w', compression) as f:
+        f.writestr('a', b'a' * 1000)
+        f.writestr('b', data)
+    with zipfile.ZipFile(fname) as f:
+        info = f.getinfo('b')
+    with open(fname, 'r+b') as f:
+        # flip a byte of the content of b, stored after the 30 bytes of
+        # the fixed part of its local header and the name
+        f.seek(info.header_offset + 31 + 5000)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 1]))
+    cache = arlib.BlockCache(max_bytes=1024*1024)
+    previous = arlib.set_block_cache(cache)
+    try:
+        with arlib.open(fname) as ar:
+            with ar.open_member('a', 'rb') as f:
+                assert f.read() == b'a' * 1000
+            with pytest.raises(zipfile.BadZipFile):
+                with ar.open_member('b', 'rb') as f:
+                    f.read()
+            with pytest.raises(zipfile.BadZipFile):
+                with ar.open_member('b', 'rb', seekable='indexed') as f:
+                    while f.read(4096):
+                        pass
+    finally:
+        arlib.set_block_cache(previous)
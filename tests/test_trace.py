@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import io, os, json, zipfile, tarfile, tempfile, shutil, pytest
+import arlib
+
+
+@pytest.fixture(scope='module')
+def archives():
+    dst = tempfile.mkdtemp()
+    members = {'a.txt': b'a' * 1000000, 'b.bin': os.urandom(100000)}
+    with zipfile.ZipFile(os.path.join(dst, 'x.zip'), 'w',
+                         zipfile.ZIP_DEFLATED) as f:
+        for name, data in sorted(members.items()):
+            f.writestr(name, data)
+    with tarfile.open(os.path.join(dst, 'x.tar.gz'), 'w:gz') as f:
+        for name, data in sorted(members.items()):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            f.addfile(info, io.BytesIO(data))
+    yield dst, members
+    shutil.rmtree(dst)
+
+
+@pytest.mark.parametrize('fname', ['x.zip', 'x.tar.gz'])
+def test_trace(archives, fname):
+    dst, members = archives
+    trace = os.path.join(dst, fname + '.json')
+    with arlib.open(os.path.join(dst, fname), trace=trace) as ar:
+        for name in sorted(members):
+            with ar.open_member(name, 'rb') as f:
+                assert f.read() == members[name]
+        with ar.open_member('a.txt') as f:
+            assert f.read(3) == 'aaa'
+        assert not os.path.exists(trace)
+    with open(trace) as f:
+        events = json.load(f)['traceEvents']
+    assert [x['ph'] for x in events] == ['M', 'X', 'X', 'X', 'X']
+    assert events[0]['args']['name'] == 'MainThread'
+    assert [x['name'] for x in events[1:]] == ['open', 'a.txt', 'b.bin',
+                                               'a.txt']
+    a = events[2]['args']
+    assert a['bytes_out'] == 1000000
+    # highly compressible content
+    assert 0 < a['bytes_in'] < a['bytes_out'] // 5
+    assert a['io_wait_us'] + a['decompress_us'] <= events[2]['dur'] + 1
+    assert events[3]['args']['bytes_out'] == 100000
+    assert all(x['tid'] == events[0]['tid'] for x in events)
+
+
+def test_trace_threads(archives):
+    dst, members = archives
+    trace = os.path.join(dst, 'threads.json')
+    with arlib.open(os.path.join(dst, 'x.zip'), trace=trace) as ar:
+        assert ar.verify(workers=2)
+    with open(trace) as f:
+        events = json.load(f)['traceEvents']
+    threads = dict((x['tid'], x['args']['name']) for x in events
+                   if x['ph'] == 'M')
+    members = [x for x in events if x.get('cat') == 'member']
+    assert sorted(x['name'] for x in members) == ['a.txt', 'b.bin']
+    assert all(threads[x['tid']] != 'MainThread' for x in members)
+
+
+def test_trace_write_mode(archives):
+    dst, _ = archives
+    with pytest.raises(ValueError):
+        arlib.open(os.path.join(dst, 'y.zip'), 'w',
+                   trace=os.path.join(dst, 'y.json'))
+
+
+def test_trace_read_members_solid(archives):
+    dst, members = archives
+    trace = os.path.join(dst, 'solid.json')
+    with arlib.open(os.path.join(dst, 'x.tar.gz'), trace=trace) as ar:
+        assert dict(ar.read_members()) == members
+    with open(trace) as f:
+        events = json.load(f)['traceEvents']
+    assert sorted(x['name'] for x in events if x.get('cat') == 'member') == \
+        sorted(members)
+
+
+@pytest.mark.parametrize('fname', ['x.zip', 'x.tar.gz'])
+def test_trace_extract(archives, fname):
+    dst, members = archives
+    trace = os.path.join(dst, fname + '.extract.json')
+    out = tempfile.mkdtemp()
+    with arlib.open(os.path.join(dst, fname), trace=trace) as ar:
+        ar.extract(out)
+        ar.extract(out, ['b.bin'])
+    with open(os.path.join(out, 'b.bin'), 'rb') as f:
+        assert f.read() == members['b.bin']
+    shutil.rmtree(out)
+    with open(trace) as f:
+        events = json.load(f)['traceEvents']
+    events = [x for x in events if x.get('cat') == 'member']
+    assert [x['name'] for x in events] == ['a.txt', 'b.bin', 'b.bin']
+    assert events[0]['args']['bytes_out'] == 1000000
+    assert 0 < events[0]['args']['bytes_in'] < 1000000 // 5
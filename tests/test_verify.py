@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+import os, io, hashlib, zipfile, tarfile, pytest
+import arlib
+from arlib.verify import read_manifest
+
+data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+@pytest.fixture
+def members():
+    return dict(('d/m%d' % i, os.urandom(3000 * i)) for i in range(1, 8))
+
+
+def test_verify_zip_crc(tmp_path, members):
+    fname = str(tmp_path / 'x.zip')
+    with zipfile.ZipFile(fname, 'w') as f:
+        for name, data in sorted(members.items()):
+            f.writestr(name, data)
+    with arlib.open(fname) as ar:
+        report = ar.verify(workers=3)
+        offset = ar._file.getinfo('d/m4').header_offset + 100
+    assert report.ok and report.members == 7
+    assert report.bytes == sum(len(x) for x in members.values())
+    assert report.throughput > 0
+    with open(fname, 'r+b') as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 1]))
+    with arlib.open(fname) as ar:
+        report = ar.verify(workers=3)
+    assert not report
+    assert [x for x, _ in report.failures] == ['d/m4']
+    assert 'CRC' in report.failures[0][1]
+
+
+@pytest.mark.parametrize('ext', ['tar.gz', 'dir'])
+def test_verify_manifest(tmp_path, members, ext):
+    fname = str(tmp_path / ('x.' + ext))
+    if ext == 'dir':
+        for name, data in members.items():
+            os.makedirs(os.path.dirname(os.path.join(fname, name)),
+                        exist_ok=True)
+            with open(os.path.join(fname, name), 'wb') as f:
+                f.write(data)
+    else:
+        with tarfile.open(fname, 'w:gz') as f:
+            for name, data in sorted(members.items()):
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                f.addfile(info, io.BytesIO(data))
+    digests = dict((k, hashlib.sha256(v).hexdigest())
+                   for k, v in members.items())
+    manifest = str(tmp_path / 'SHA256SUMS')
+    with open(manifest, 'w') as f:
+        f.write('# checksums\n')
+        for name, digest in sorted(digests.items()):
+            f.write('{} *./{}\n'.format(digest, name))
+    assert read_manifest(manifest) == digests
+    with arlib.open(fname) as ar:
+        assert ar.verify(digests=manifest, workers=2).ok
+        digests['d/m2'] = '0' * 64
+        digests['d/missing'] = '0' * 64
+        report = ar.verify(digests=digests)
+        assert report.failures[0] == ('d/missing', 'missing')
+        assert report.failures[1][0] == 'd/m2'
+        assert 'sha256 mismatch' in report.failures[1][1]
+        report = ar.verify(['d/m1', 'd/m2'], digests=digests)
+        assert [x for x, _ in report.failures] == ['d/m2']
+        assert report.members == 2